@@ -5,11 +5,47 @@ import datetime
 import time
 import logging
 import re
+import json
+import asyncio
+from typing import Optional
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 join_burst_cache = {}
+raid_mode_cache = {} # guild_id -> timestamp (time.time()) até quando o modo raid fica ativo
+dirty_raid_state_guilds = set() # Guilds cujo estado mudou desde o último snapshot
+
+RAID_STATE_SNAPSHOT_SECONDS = 15 # Intervalo entre snapshots do estado anti-raid no DB
+RAID_MODE_DURATION_SECONDS = 600 # Duração do modo raid após um burst de entradas
+RAID_STATE_MAX_AGE_SECONDS = 86400 # Timestamps mais antigos que isso são descartados na restauração
+
+DISCORD_EPOCH_MS = 1420070400000 # Epoch dos snowflakes do Discord (2015-01-01 UTC)
+NEW_ACCOUNT_ACTIONS = ("kick", "quarantine", "verify")
+QUARANTINE_CONCURRENCY = 5 # Máximo de chamadas simultâneas à API ao configurar/liberar a quarentena
+
+def is_raid_mode_active(guild_id: int) -> bool:
+    """Retorna True se o modo raid estiver ativo para a guild."""
+    return raid_mode_cache.get(guild_id, 0) > time.time()
+
+def snowflake_age_cutoff(min_age_seconds: int, now: float) -> int:
+    """
+    Retorna o snowflake correspondente a (now - min_age_seconds).
+    Qualquer ID de usuário maior ou igual a esse valor pertence a uma conta mais nova que a idade mínima.
+    """
+    cutoff_ms = int(now * 1000) - min_age_seconds * 1000 - DISCORD_EPOCH_MS
+    return max(0, cutoff_ms) << 22
+
+def snowflake_age_hours(snowflake_id: int, now: float) -> float:
+    """Calcula a idade (em horas) de um snowflake sem criar objetos datetime."""
+    created_ms = (snowflake_id >> 22) + DISCORD_EPOCH_MS
+    return (now * 1000 - created_ms) / 3600000
+
+async def reload_raid_settings(bot: commands.Bot, guild_id: int):
+    """Recarrega o cache de configurações anti-raid da guild após uma alteração no DB."""
+    cog = bot.get_cog("RaidProtectionSystem")
+    if cog:
+        await cog.load_guild_settings(guild_id)
 
 def parse_duration(duration_str: str) -> datetime.timedelta:
     """Converte uma string de duração (ex: '30m', '1h') em um timedelta."""
@@ -114,6 +150,7 @@ class RaidProtectionSettingsModal(ui.Modal, title="Configurações Proteção An
                 # Modificação aqui: chamar uma função na View para recriar e atualizar
                 if hasattr(self, 'view') and isinstance(self.view, RaidProtectionPanelView):
                     await self.view.refresh_panel(interaction.guild.id, interaction.client) # Passa o client (bot)
+                await reload_raid_settings(interaction.client, interaction.guild.id)
             else:
                 await interaction.followup.send("Ocorreu um erro ao salvar as configurações Anti-Raid no banco de dados.", ephemeral=True)
                 logging.error(f"Erro ao salvar configurações Proteção Anti-Raid para guild {interaction.guild.id}.")
@@ -295,6 +332,7 @@ class RaidProtectionPanelView(ui.View):
                 logging.info(f"[enable_button_callback] Chamando refresh_panel para guild {self.guild_id}...")
                 await self.refresh_panel(self.guild_id, interaction.client) # Chamada para o NOVO método
                 logging.info(f"[enable_button_callback] refresh_panel concluído para guild {self.guild_id}.")
+                await reload_raid_settings(interaction.client, self.guild_id)
             else:
                 logging.error(f"[enable_button_callback] Falha ao atualizar status de 'enabled' no DB para guild {self.guild_id}.")
                 await interaction.followup.send("Ocorreu um erro ao ativar a proteção Anti-Raid no banco de dados.", ephemeral=True)
@@ -337,6 +375,7 @@ class RaidProtectionPanelView(ui.View):
                 logging.info(f"[disable_button_callback] Chamando refresh_panel para guild {self.guild_id}...")
                 await self.refresh_panel(self.guild_id, interaction.client) # Chamada para o NOVO método
                 logging.info(f"[disable_button_callback] refresh_panel concluído para guild {self.guild_id}.")
+                await reload_raid_settings(interaction.client, self.guild_id)
             else:
                 logging.error(f"[disable_button_callback] Falha ao atualizar status de 'enabled' no DB para guild {self.guild_id}.")
                 await interaction.followup.send("Ocorreu um erro ao desativar a proteção Anti-Raid no banco de dados.", ephemeral=True)
@@ -376,11 +415,143 @@ class RaidProtectionPanelView(ui.View):
         await interaction.response.send_modal(modal)
 
 class RaidProtectionSystem(commands.Cog):
+    raid_group = app_commands.Group(name="raid", description="Comandos para gerenciar a proteção anti-raid.")
+
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.db = bot.db_connection # Armazena a instância do gerenciador de DB
+        self.settings_cache = {} # guild_id -> dict com as configurações anti-raid
+        self.age_cutoff_cache = {} # guild_id -> (segundo em que foi calculado, snowflake de corte)
         self.bot.loop.create_task(self.ensure_persistent_views())
 
+    async def cog_load(self):
+        # Executado durante o setup_hook (load_extension), antes do bot receber eventos de entrada
+        await self.load_all_settings()
+        await self._restore_raid_state()
+        self.raid_state_snapshot.start()
+
+    SETTINGS_QUERY = """
+        SELECT s.guild_id, s.enabled, s.min_account_age_hours, s.join_burst_threshold, s.join_burst_time_seconds,
+               a.new_account_action, a.quarantine_role_id, a.verification_channel_id, a.raid_mode_action
+        FROM anti_raid_settings s
+        LEFT JOIN anti_raid_action_settings a ON a.guild_id = s.guild_id
+    """
+
+    def _cache_settings_row(self, row):
+        guild_id, enabled, min_age_hours, burst_threshold, burst_time, action, quarantine_role_id, verification_channel_id, raid_mode_action = row
+        self.settings_cache[guild_id] = {
+            'enabled': bool(enabled),
+            'min_account_age_seconds': (min_age_hours if min_age_hours is not None else 24) * 3600,
+            'join_burst_threshold': burst_threshold if burst_threshold is not None else 10,
+            'join_burst_time_seconds': burst_time if burst_time is not None else 60,
+            'new_account_action': action if action in NEW_ACCOUNT_ACTIONS else "kick",
+            'quarantine_role_id': quarantine_role_id,
+            'verification_channel_id': verification_channel_id,
+            'raid_mode_action': bool(raid_mode_action)
+        }
+        self.age_cutoff_cache.pop(guild_id, None)
+
+    async def load_all_settings(self):
+        """Carrega as configurações anti-raid de todas as guilds para o cache."""
+        rows = []
+        try:
+            rows = await self.db.fetch_all(self.SETTINGS_QUERY)
+        except Exception as e:
+            logging.error(f"Erro ao carregar configurações anti-raid do DB para o cache: {e}", exc_info=True)
+            return
+        self.settings_cache.clear()
+        self.age_cutoff_cache.clear()
+        for row in rows:
+            self._cache_settings_row(row)
+        logging.info(f"Configurações anti-raid em cache para {len(self.settings_cache)} guild(s).")
+
+    async def load_guild_settings(self, guild_id: int):
+        """Recarrega as configurações anti-raid de uma guild para o cache."""
+        try:
+            row = await self.db.fetch_one(self.SETTINGS_QUERY + " WHERE s.guild_id = ?", (guild_id,))
+        except Exception as e:
+            logging.error(f"Erro ao recarregar configurações anti-raid do DB para guild {guild_id}: {e}", exc_info=True)
+            return
+        if row:
+            self._cache_settings_row(row)
+        else:
+            self.settings_cache.pop(guild_id, None)
+            self.age_cutoff_cache.pop(guild_id, None)
+
+    def _get_age_cutoff(self, guild_id: int, min_age_seconds: int) -> int:
+        """Retorna o snowflake de corte da guild, recalculado no máximo uma vez por segundo."""
+        second = int(time.time())
+        cached = self.age_cutoff_cache.get(guild_id)
+        if cached and cached[0] == second:
+            return cached[1]
+        cutoff = snowflake_age_cutoff(min_age_seconds, second)
+        self.age_cutoff_cache[guild_id] = (second, cutoff)
+        return cutoff
+
+    async def cog_unload(self):
+        self.raid_state_snapshot.cancel()
+        # Garante que um reload não perca a janela atual
+        await self._flush_raid_state()
+
+    async def _restore_raid_state(self):
+        """Restaura a janela de entradas e o modo raid salvos no DB."""
+        rows = []
+        try:
+            rows = await self.db.fetch_all("SELECT guild_id, join_timestamps_json, raid_mode_until FROM anti_raid_state")
+        except Exception as e:
+            logging.error(f"Erro ao restaurar estado anti-raid do DB: {e}", exc_info=True)
+            return
+
+        now = time.time()
+        for guild_id, join_timestamps_json, raid_mode_until in rows:
+            try:
+                timestamps = json.loads(join_timestamps_json) if join_timestamps_json else []
+            except json.JSONDecodeError:
+                logging.warning(f"Snapshot anti-raid inválido para guild {guild_id}. Ignorando janela de entradas.")
+                timestamps = []
+            timestamps = [t for t in timestamps if now - t < RAID_STATE_MAX_AGE_SECONDS]
+            if timestamps:
+                join_burst_cache[guild_id] = timestamps
+            if raid_mode_until and raid_mode_until > now:
+                raid_mode_cache[guild_id] = raid_mode_until
+                logging.warning(f"Modo raid restaurado para guild {guild_id} (ativo por mais {raid_mode_until - now:.0f}s).")
+        logging.info(f"Estado anti-raid restaurado para {len(rows)} guild(s).")
+
+    async def _flush_raid_state(self):
+        """Grava no DB, em uma única transação, o estado das guilds alteradas desde o último snapshot."""
+        if not dirty_raid_state_guilds:
+            return
+        guild_ids = list(dirty_raid_state_guilds)
+        dirty_raid_state_guilds.clear()
+
+        now = time.time()
+        upserts = []
+        deletes = []
+        for guild_id in guild_ids:
+            timestamps = join_burst_cache.get(guild_id, [])
+            raid_mode_until = raid_mode_cache.get(guild_id)
+            if not timestamps and not (raid_mode_until and raid_mode_until > now):
+                deletes.append((guild_id,))
+            else:
+                upserts.append((guild_id, json.dumps(timestamps), raid_mode_until, now))
+
+        success = True
+        if upserts:
+            success = await self.db.execute_many(
+                "INSERT OR REPLACE INTO anti_raid_state (guild_id, join_timestamps_json, raid_mode_until, updated_at) VALUES (?, ?, ?, ?)",
+                upserts
+            ) and success
+        if deletes:
+            success = await self.db.execute_many("DELETE FROM anti_raid_state WHERE guild_id = ?", deletes) and success
+        if not success:
+            # Tenta novamente no próximo snapshot
+            dirty_raid_state_guilds.update(guild_ids)
+            logging.error(f"Falha ao salvar snapshot do estado anti-raid para {len(guild_ids)} guild(s).")
+
+    @tasks.loop(seconds=RAID_STATE_SNAPSHOT_SECONDS)
+    async def raid_state_snapshot(self):
+        await self._flush_raid_state()
+
     async def ensure_persistent_views(self):
         await self.bot.wait_until_ready()
         logging.info("Tentando carregar painéis Proteção Anti-Raid persistentes...")
@@ -440,6 +611,9 @@ class RaidProtectionSystem(commands.Cog):
         else:
             logging.info("Nenhum painel Proteção Anti-Raid persistente para carregar.")
 
+        # Entradas inválidas podem ter sido removidas acima
+        await self.load_all_settings()
+
 
     # Evento de entrada de membro
     @commands.Cog.listener()
@@ -447,36 +621,24 @@ class RaidProtectionSystem(commands.Cog):
         if member.bot:
             return 
 
-        settings = None
-        try:
-            settings = await self.db.fetch_one(
-                "SELECT enabled, min_account_age_hours, join_burst_threshold, join_burst_time_seconds FROM anti_raid_settings WHERE guild_id = ?",
-                (member.guild.id,)
-            )
-        except Exception as e:
-            logging.error(f"Erro ao buscar configurações anti-raid do DB para guild {member.guild.id} no on_member_join: {e}", exc_info=True)
-            return # Aborta se houver erro no DB
-
-        if not settings or not settings[0]: # Se não houver configurações ou se estiver desativado
+        settings = self.settings_cache.get(member.guild.id)
+        if not settings or not settings['enabled']: # Se não houver configurações ou se estiver desativado
             return
 
-        enabled, min_account_age_hours, join_burst_threshold, join_burst_time_seconds = settings
+        join_burst_threshold = settings['join_burst_threshold']
+        join_burst_time_seconds = settings['join_burst_time_seconds']
 
-        account_age_timedelta = datetime.datetime.now(datetime.timezone.utc) - member.created_at
-        min_account_age_timedelta = datetime.timedelta(hours=min_account_age_hours)
-
-        if account_age_timedelta < min_account_age_timedelta:
-            try:
-                await member.kick(reason=f"Proteção Anti-Raid: Conta muito nova ({account_age_timedelta.total_seconds() / 3600:.2f} horas). Idade mínima configurada: {min_account_age_hours} horas.")
-                logging.info(f"Membro {member.id} ({member.name}) chutado na guild {member.guild.id} por ter conta muito nova.")
-                return 
-            except discord.Forbidden:
-                logging.error(f"Bot sem permissão para chutar {member.name} na guild {member.guild.id} (conta muito nova).")
-            except Exception as e:
-                logging.error(f"Erro ao chutar membro {member.name} na guild {member.guild.id} por conta muito nova: {e}", exc_info=True)
+        # Primeiro filtro: comparação inteira do snowflake com o corte em cache
+        if member.id >= self._get_age_cutoff(member.guild.id, settings['min_account_age_seconds']):
+            await self._handle_new_account(member, settings)
             return
 
         guild_id = member.guild.id
+        # Opt-in (/raid raid_mode_action): durante o modo raid, inclusive o restaurado após um reinício, toda entrada recebe a ação configurada
+        if settings['raid_mode_action'] and is_raid_mode_active(guild_id):
+            await self._handle_new_account(member, settings, raid_mode=True)
+            return
+
         current_time = time.time()
 
         if guild_id not in join_burst_cache:
@@ -487,22 +649,247 @@ class RaidProtectionSystem(commands.Cog):
         ]
         
         join_burst_cache[guild_id].append(current_time)
+        dirty_raid_state_guilds.add(guild_id)
 
         if len(join_burst_cache[guild_id]) >= join_burst_threshold:
             try:
                 logging.warning(f"Possível burst de entradas detectado na guild {member.guild.id}! {len(join_burst_cache[guild_id])} membros em {join_burst_time_seconds} segundos. Disparando ações de proteção...")
-                # Aqui você pode adicionar ações como:
-                # - Ativar lockdown geral (se tiver a função disponível)
-                # - Notificar um canal de log de moderação
-                # - Banir automaticamente membros com contas novas
-                # Por enquanto, apenas limpa o cache para evitar múltiplos disparos imediatos
+                raid_mode_cache[guild_id] = current_time + RAID_MODE_DURATION_SECONDS
+                logging.warning(f"Modo raid ativado na guild {member.guild.id} por {RAID_MODE_DURATION_SECONDS} segundos.")
+                # Limpa a janela para evitar múltiplos disparos imediatos
                 join_burst_cache[guild_id] = []
+                if settings['raid_mode_action']:
+                    await self._handle_new_account(member, settings, raid_mode=True)
             except discord.Forbidden:
                 logging.error(f"Bot sem permissão para agir no burst de entradas na guild {member.guild.id}.")
             except Exception as e:
                 logging.error(f"Erro ao lidar com burst de entradas na guild {member.guild.id}: {e}", exc_info=True)
 
+    async def _handle_new_account(self, member: discord.Member, settings: dict, raid_mode: bool = False):
+        """Aplica a resposta configurada (kick, quarentena ou verificação) a uma conta nova demais ou a qualquer entrada durante o modo raid."""
+        if raid_mode:
+            reason = "Proteção Anti-Raid: entrada durante o modo raid."
+            cause = "entrada durante o modo raid"
+        else:
+            account_age_hours = snowflake_age_hours(member.id, time.time())
+            min_account_age_hours = settings['min_account_age_seconds'] // 3600
+            reason = f"Proteção Anti-Raid: Conta muito nova ({account_age_hours:.2f} horas). Idade mínima configurada: {min_account_age_hours} horas."
+            cause = "conta muito nova"
+        action = settings['new_account_action']
+
+        quarantine_role = None
+        if action in ("quarantine", "verify") and settings['quarantine_role_id']:
+            quarantine_role = member.guild.get_role(settings['quarantine_role_id'])
+
+        verification_channel = None
+        if action == "verify" and settings['verification_channel_id']:
+            verification_channel = member.guild.get_channel(settings['verification_channel_id'])
+
+        if action == "quarantine" and quarantine_role is None:
+            logging.warning(f"Cargo de quarentena não configurado ou não encontrado na guild {member.guild.id}. Usando kick.")
+            action = "kick"
+        elif action == "verify" and not isinstance(verification_channel, discord.TextChannel):
+            logging.warning(f"Canal de verificação não configurado ou não encontrado na guild {member.guild.id}. Usando kick.")
+            action = "kick"
+
+        try:
+            if action == "kick":
+                await member.kick(reason=reason)
+                logging.info(f"Membro {member.id} ({member.name}) chutado na guild {member.guild.id} ({cause}).")
+                return
+
+            if quarantine_role:
+                await member.add_roles(quarantine_role, reason=reason)
+                logging.info(f"Membro {member.id} ({member.name}) colocado em quarentena na guild {member.guild.id} ({cause}).")
+
+            if action == "verify":
+                motive = "o servidor está em modo raid" if raid_mode else "sua conta é muito recente"
+                await verification_channel.send(
+                    f"{member.mention}, {motive} e sua entrada não pôde ser liberada automaticamente. "
+                    f"Aguarde a verificação da equipe de moderação.",
+                    allowed_mentions=discord.AllowedMentions(users=True)
+                )
+                logging.info(f"Membro {member.id} ({member.name}) enviado para verificação no canal {verification_channel.id} na guild {member.guild.id}.")
+        except discord.Forbidden:
+            logging.error(f"Bot sem permissão para aplicar a ação '{action}' em {member.name} na guild {member.guild.id} ({cause}).")
+        except Exception as e:
+            logging.error(f"Erro ao aplicar a ação '{action}' em {member.name} na guild {member.guild.id} ({cause}): {e}", exc_info=True)
+
     # Comandos de slash
+    @raid_group.command(name="account_action", description="Define a resposta do anti-raid para contas mais novas que a idade mínima.")
+    @app_commands.describe(
+        action="A ação aplicada a contas novas demais.",
+        quarantine_role="Cargo de quarentena (obrigatório para 'quarantine', opcional para 'verify').",
+        verification_channel="Canal de verificação (obrigatório para 'verify')."
+    )
+    @app_commands.choices(action=[
+        app_commands.Choice(name="Expulsar (kick)", value="kick"),
+        app_commands.Choice(name="Cargo de quarentena", value="quarantine"),
+        app_commands.Choice(name="Canal de verificação", value="verify")
+    ])
+    @app_commands.checks.has_permissions(manage_guild=True)
+    async def set_account_action(self, interaction: discord.Interaction, action: app_commands.Choice[str], quarantine_role: Optional[discord.Role] = None, verification_channel: Optional[discord.TextChannel] = None):
+        await interaction.response.defer(ephemeral=True)
+        guild_id = interaction.guild.id
+
+        if action.value == "quarantine" and quarantine_role is None:
+            await interaction.followup.send("Informe o cargo de quarentena para usar a ação 'quarantine'.", ephemeral=True)
+            return
+        if action.value == "verify" and verification_channel is None:
+            await interaction.followup.send("Informe o canal de verificação para usar a ação 'verify'.", ephemeral=True)
+            return
+
+        success = await self.db.execute_query(
+            "INSERT INTO anti_raid_action_settings (guild_id, new_account_action, quarantine_role_id, verification_channel_id) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(guild_id) DO UPDATE SET new_account_action = excluded.new_account_action, "
+            "quarantine_role_id = excluded.quarantine_role_id, verification_channel_id = excluded.verification_channel_id",
+            (guild_id, action.value, quarantine_role.id if quarantine_role else None, verification_channel.id if verification_channel else None)
+        )
+        if not success:
+            await interaction.followup.send("Ocorreu um erro ao salvar a ação anti-raid no banco de dados.", ephemeral=True)
+            return
+
+        await self.load_guild_settings(guild_id)
+        await interaction.followup.send(f"Ação para contas novas definida como **{action.name}**.", ephemeral=True)
+        logging.info(f"Ação anti-raid para contas novas definida como '{action.value}' por {interaction.user.id} na guild {guild_id}.")
+
+    @raid_group.command(name="raid_mode_action", description="Aplica a ação de contas novas a todas as entradas enquanto o modo raid estiver ativo.")
+    @app_commands.describe(enabled="Aplicar a ação configurada (kick, quarentena ou verificação) a toda entrada durante o modo raid?")
+    @app_commands.checks.has_permissions(manage_guild=True)
+    async def set_raid_mode_action(self, interaction: discord.Interaction, enabled: bool):
+        await interaction.response.defer(ephemeral=True)
+        guild_id = interaction.guild.id
+
+        success = await self.db.execute_query(
+            "INSERT INTO anti_raid_action_settings (guild_id, raid_mode_action) VALUES (?, ?) ON CONFLICT(guild_id) DO UPDATE SET raid_mode_action = excluded.raid_mode_action",
+            (guild_id, enabled)
+        )
+        if not success:
+            await interaction.followup.send("Ocorreu um erro ao salvar a configuração no banco de dados.", ephemeral=True)
+            return
+
+        await self.load_guild_settings(guild_id)
+        if enabled:
+            await interaction.followup.send(
+                f"Durante o modo raid ({RAID_MODE_DURATION_SECONDS // 60} minutos após um burst de entradas), **todas** as entradas receberão a ação configurada em `/raid account_action`, inclusive contas legítimas.",
+                ephemeral=True
+            )
+        else:
+            await interaction.followup.send("O modo raid voltará a apenas ser registrado, sem ações sobre as entradas.", ephemeral=True)
+        logging.info(f"Ação durante o modo raid {'ativada' if enabled else 'desativada'} por {interaction.user.id} na guild {guild_id}.")
+
+    async def _get_action_settings(self, guild_id: int):
+        """Busca a linha de anti_raid_action_settings da guild (quarantine_role_id, verification_channel_id)."""
+        row = await self.db.fetch_one(
+            "SELECT quarantine_role_id, verification_channel_id FROM anti_raid_action_settings WHERE guild_id = ?",
+            (guild_id,)
+        )
+        return (row[0], row[1]) if row else (None, None)
+
+    def _quarantine_overwrite_targets(self, guild: discord.Guild, role: discord.Role, verification_channel_id: Optional[int]):
+        """
+        Calcula, uma única vez, quais categorias/canais precisam de overwrite para o cargo de quarentena.
+        As permissões de um canal vêm só dos seus próprios overwrites (a sincronização com a categoria é uma cópia,
+        não uma herança), então canais sincronizados também recebem o overwrite; os que já o têm são pulados.
+        """
+        hidden = discord.PermissionOverwrite(view_channel=False)
+        visible = discord.PermissionOverwrite(view_channel=True, send_messages=True, read_message_history=True)
+        targets = []
+        for channel in guild.channels:
+            desired = visible if channel.id == verification_channel_id else hidden
+            if channel.overwrites_for(role) != desired:
+                targets.append((channel, desired))
+        return targets
+
+    async def _run_bounded(self, coros):
+        """Executa as corrotinas com no máximo QUARANTINE_CONCURRENCY chamadas simultâneas. Retorna (sucessos, falhas)."""
+        semaphore = asyncio.Semaphore(QUARANTINE_CONCURRENCY)
+
+        async def run(coro):
+            async with semaphore:
+                try:
+                    await coro
+                    return True
+                except discord.HTTPException as e:
+                    logging.error(f"Falha em operação de quarentena: {e}")
+                    return False
+
+        results = await asyncio.gather(*(run(coro) for coro in coros))
+        return results.count(True), results.count(False)
+
+    @raid_group.command(name="quarantine_setup", description="Cria/configura o cargo de quarentena e aplica seus overwrites nos canais.")
+    @app_commands.describe(role="Cargo de quarentena existente (opcional, um novo é criado se omitido).")
+    @app_commands.checks.has_permissions(manage_guild=True, manage_roles=True)
+    async def quarantine_setup(self, interaction: discord.Interaction, role: Optional[discord.Role] = None):
+        await interaction.response.defer(ephemeral=True)
+        guild = interaction.guild
+        _, verification_channel_id = await self._get_action_settings(guild.id)
+
+        try:
+            if role is None:
+                role = await guild.create_role(name="Quarentena", reason=f"Cargo de quarentena anti-raid criado por {interaction.user}")
+        except discord.Forbidden:
+            await interaction.followup.send("Não tenho permissão para criar cargos.", ephemeral=True)
+            return
+
+        success = await self.db.execute_query(
+            "INSERT INTO anti_raid_action_settings (guild_id, quarantine_role_id) VALUES (?, ?) ON CONFLICT(guild_id) DO UPDATE SET quarantine_role_id = excluded.quarantine_role_id",
+            (guild.id, role.id)
+        )
+        if not success:
+            await interaction.followup.send("Ocorreu um erro ao salvar o cargo de quarentena no banco de dados.", ephemeral=True)
+            return
+        await self.load_guild_settings(guild.id)
+
+        targets = self._quarantine_overwrite_targets(guild, role, verification_channel_id)
+        reason = f"Configuração da quarentena anti-raid por {interaction.user}"
+        done, failed = await self._run_bounded([channel.set_permissions(role, overwrite=overwrite, reason=reason) for channel, overwrite in targets])
+
+        message = f"Cargo de quarentena {role.mention} configurado. Overwrites aplicados em {done} categoria(s)/canal(is)."
+        if failed:
+            message += f" {failed} falharam; verifique as permissões e a hierarquia de cargos do bot."
+        await interaction.followup.send(message, ephemeral=True)
+        logging.info(f"Quarentena anti-raid configurada na guild {guild.id} com o cargo {role.id} por {interaction.user.id}. Overwrites: {done} aplicados, {failed} falhas.")
+
+    @raid_group.command(name="quarantine_release", description="Remove o cargo de quarentena de todos os membros que ainda o possuem.")
+    @app_commands.checks.has_permissions(manage_roles=True)
+    async def quarantine_release(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True)
+        quarantine_role_id, _ = await self._get_action_settings(interaction.guild.id)
+        role = interaction.guild.get_role(quarantine_role_id) if quarantine_role_id else None
+        if role is None:
+            await interaction.followup.send("Nenhum cargo de quarentena configurado. Use `/raid quarantine_setup`.", ephemeral=True)
+            return
+
+        members = list(role.members)
+        if not members:
+            await interaction.followup.send(f"Nenhum membro possui o cargo {role.mention}.", ephemeral=True)
+            return
+
+        reason = f"Quarentena anti-raid liberada por {interaction.user}"
+        released, failed = await self._run_bounded([member.remove_roles(role, reason=reason) for member in members])
+        message = f"{released} membro(s) liberado(s) da quarentena."
+        if failed:
+            message += f" {failed} falharam."
+        await interaction.followup.send(message, ephemeral=True)
+        logging.info(f"Quarentena liberada na guild {interaction.guild.id} por {interaction.user.id}: {released} liberados, {failed} falhas.")
+
+    @commands.Cog.listener()
+    async def on_guild_channel_create(self, channel: discord.abc.GuildChannel):
+        # Mantém o cargo de quarentena oculto em canais criados depois da configuração
+        settings = self.settings_cache.get(channel.guild.id)
+        if not settings or not settings['quarantine_role_id']:
+            return
+        role = channel.guild.get_role(settings['quarantine_role_id'])
+        if role is None:
+            return
+        if channel.overwrites_for(role).view_channel is False:
+            return # Já criado com o overwrite (copiado da categoria na criação)
+        try:
+            await channel.set_permissions(role, view_channel=False, reason="Quarentena anti-raid: novo canal")
+        except discord.HTTPException as e:
+            logging.error(f"Falha ao aplicar overwrite de quarentena no novo canal {channel.id} da guild {channel.guild.id}: {e}")
+
     @app_commands.command(name="setup_raid_panel", description="Configura ou move o painel de proteção anti-raid para o canal atual.")
     @app_commands.checks.has_permissions(manage_guild=True)
     async def setup_raid_protection_panel(self, interaction: discord.Interaction):
@@ -596,6 +983,7 @@ class RaidProtectionSystem(commands.Cog):
 
             # Adiciona a view ao bot para persistência
             self.bot.add_view(view, message_id=panel_message.id)
+            await self.load_guild_settings(guild_id)
 
             await interaction.followup.send(f"Painel de proteção Anti-Raid configurado neste canal: {interaction.channel.mention}", ephemeral=True)
             logging.info(f"Painel Proteção Anti-Raid configurado/movido por {interaction.user.id} para canal {interaction.channel.id} na guild {guild_id}. Mensagem ID: {panel_message.id}.")
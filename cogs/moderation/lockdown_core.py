@@ -1,6 +1,8 @@
 import discord
 from discord.ext import commands, tasks
+import asyncio
 import datetime
+import heapq
 import time
 import logging
 import re
@@ -10,6 +12,12 @@ import re
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+LOCKDOWN_CONCURRENCY = 5 # Máximo de canais alterados simultaneamente em operações em massa
+LOCKDOWN_RATE_LIMIT_RETRIES = 3 # Tentativas extras quando a API responde 429
+LOCKDOWN_PROGRESS_INTERVAL = 2 # Intervalo mínimo (segundos) entre atualizações de progresso
+LOCKDOWN_CONSISTENCY_CHECK_MINUTES = 10 # Intervalo da verificação do cache de canais bloqueados contra o DB
+LOCKDOWN_MODES = ("channel", "category", "server") # Modos de lockdown geral
+
 def parse_duration(duration_str: str) -> datetime.timedelta:
     """Converte uma string de duração (ex: '30m', '1h') em um timedelta."""
     seconds = 0
@@ -37,86 +45,509 @@ class LockdownCore(commands.Cog):
     def __init__(self, bot: commands.Bot): # db_manager removido daqui
         self.bot = bot
         self.db = bot.db_connection # Armazena a instância do gerenciador de DB
-        self.lockdown_check.start()
+        self.expiry_heap = [] # Min-heap de (locked_until, channel_id); entradas obsoletas são descartadas ao sair do heap
+        self.lock_deadlines = {} # channel_id -> (locked_until, guild_id); fonte da verdade para o heap
+        self.locked_channels = {} # guild_id -> {channel_id: scope}; espelho em memória da tabela locked_channels
+        self.guild_wide_locks = {} # guild_id -> permissões de @everyone antes do lockdown de servidor (tabela guild_lockdowns)
+        self._locked_cache_version = 0 # Incrementado a cada alteração do cache, para a verificação de consistência
+        self._expiry_wakeup = asyncio.Event()
+        self.expiry_task = self.bot.loop.create_task(self._expiry_scheduler())
         logging.info("LockdownCore cog inicializado.")
 
+    async def cog_load(self):
+        await self._load_locked_channels()
+        try:
+            rows = await self.db.fetch_all("SELECT guild_id, previous_permissions FROM guild_lockdowns")
+            self.guild_wide_locks = {guild_id: previous_permissions for guild_id, previous_permissions in rows}
+        except Exception as e:
+            logging.error(f"Erro ao carregar lockdowns de servidor do DB: {e}", exc_info=True)
+        self.lockdown_consistency_check.start()
+
     def cog_unload(self):
-        self.lockdown_check.cancel()
+        self.expiry_task.cancel()
+        self.lockdown_consistency_check.cancel()
         logging.info("LockdownCore cog descarregado.")
 
-    async def _is_channel_locked(self, channel_id: int) -> bool:
-        """Verifica se um canal está em lockdown no DB."""
+    async def _fetch_locked_channels(self):
+        """Lê a tabela locked_channels e retorna {guild_id: {channel_id: scope}}, ou None em caso de erro."""
         try:
-            result = await self.db.fetch_one( # Usando self.db.fetch_one
-                "SELECT channel_id FROM locked_channels WHERE channel_id = ?",
-                (channel_id,)
-            )
-            return result is not None
+            rows = await self.db.fetch_all("SELECT channel_id, guild_id, scope FROM locked_channels")
         except Exception as e:
-            logging.error(f"Erro ao verificar status de lockdown no DB para canal {channel_id}: {e}", exc_info=True)
-            return False
+            logging.error(f"Erro ao carregar canais bloqueados do DB: {e}", exc_info=True)
+            return None
+        locked = {}
+        for channel_id, guild_id, scope in rows:
+            locked.setdefault(guild_id, {})[channel_id] = scope or "channel"
+        return locked
+
+    async def _load_locked_channels(self):
+        locked = await self._fetch_locked_channels()
+        if locked is not None:
+            self.locked_channels = locked
+            logging.info(f"{sum(len(channels) for channels in locked.values())} canal(is) bloqueado(s) carregado(s) em memória.")
+
+    @tasks.loop(minutes=LOCKDOWN_CONSISTENCY_CHECK_MINUTES)
+    async def lockdown_consistency_check(self):
+        """Compara o cache de canais bloqueados com o DB e corrige divergências."""
+        version = self._locked_cache_version
+        locked = await self._fetch_locked_channels()
+        if locked is None or locked == self.locked_channels:
+            return
+        if version != self._locked_cache_version:
+            return # O cache mudou durante a leitura; verifica novamente na próxima execução
+        logging.warning("Cache de canais bloqueados divergente do DB. Recarregando a partir do DB.")
+        self.locked_channels = locked
+
+    def _mark_locked(self, guild_id: int, channel_id: int, locked: bool, scope: str = "channel"):
+        """Atualiza o cache de canais bloqueados. Deve ser chamado junto de cada escrita em locked_channels."""
+        self._locked_cache_version += 1
+        if locked:
+            self.locked_channels.setdefault(guild_id, {})[channel_id] = scope
+            return
+        channels = self.locked_channels.get(guild_id)
+        if channels is not None:
+            channels.pop(channel_id, None)
+            if not channels:
+                del self.locked_channels[guild_id]
+
+    def get_locked_channel_ids(self, guild_id: int) -> set:
+        """Retorna uma cópia dos IDs de canais bloqueados da guild."""
+        return set(self.locked_channels.get(guild_id, ()))
+
+    def get_locked_channels(self, guild_id: int) -> dict:
+        """Retorna uma cópia de {channel_id: scope} dos canais bloqueados da guild."""
+        return dict(self.locked_channels.get(guild_id, {}))
+
+    @staticmethod
+    def _lock_scope(channel) -> str:
+        return "category" if isinstance(channel, discord.CategoryChannel) else "channel"
+
+    async def delete_stale_lockdowns(self, stale: list):
+        """Remove em lote do DB (e do cache) lockdowns de canais/guilds que não existem mais. `stale` é [(channel_id, guild_id)]."""
+        if not stale:
+            return
+        if not await self.db.execute_many("DELETE FROM locked_channels WHERE channel_id = ?", [(channel_id,) for channel_id, _ in stale]):
+            logging.error(f"Falha ao remover {len(stale)} lockdown(s) obsoleto(s) do DB.")
+            return
+        for channel_id, guild_id in stale:
+            self._mark_locked(guild_id, channel_id, False)
+            self._schedule_expiry(channel_id, guild_id, None)
+
+    def _schedule_expiry(self, channel_id: int, guild_id: int, locked_until):
+        """Agenda (ou cancela, se locked_until for None) o desbloqueio automático de um canal."""
+        if locked_until is None:
+            self.lock_deadlines.pop(channel_id, None)
+            return
+        locked_until = int(locked_until)
+        self.lock_deadlines[channel_id] = (locked_until, guild_id)
+        heapq.heappush(self.expiry_heap, (locked_until, channel_id))
+        # Compacta o heap se as entradas obsoletas dominarem
+        if len(self.expiry_heap) > 2 * len(self.lock_deadlines) + 64:
+            self.expiry_heap = [(until, cid) for cid, (until, _) in self.lock_deadlines.items()]
+            heapq.heapify(self.expiry_heap)
+        if self.expiry_heap[0] == (locked_until, channel_id):
+            self._expiry_wakeup.set() # Novo prazo mais próximo: acorda o agendador
+
+    def _is_channel_locked(self, guild_id: int, channel_id: int) -> bool:
+        """Verifica se um canal tem lockdown próprio (consulta apenas o cache em memória). O lockdown de servidor é verificado à parte."""
+        return channel_id in self.locked_channels.get(guild_id, ())
+
+    def _is_guild_locked(self, guild_id: int) -> bool:
+        """Verifica se há um lockdown de servidor (@everyone) ativo na guild."""
+        return guild_id in self.guild_wide_locks
+
+    # Mantém o snapshot original se o canal já estiver bloqueado (ex.: reaplicação na reinicialização)
+    LOCK_UPSERT_QUERY = """
+        INSERT INTO locked_channels (channel_id, guild_id, locked_until_timestamp, reason, locked_by_id, previous_allow, previous_deny, scope)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(channel_id) DO UPDATE SET
+            guild_id = excluded.guild_id,
+            locked_until_timestamp = excluded.locked_until_timestamp,
+            reason = excluded.reason,
+            locked_by_id = excluded.locked_by_id,
+            scope = excluded.scope
+    """
+
+    @staticmethod
+    def _capture_overwrite(channel: discord.TextChannel):
+        """Retorna o overwrite atual de @everyone no canal como par (allow, deny) empacotado em inteiros."""
+        allow, deny = channel.overwrites_for(channel.guild.default_role).pair()
+        return allow.value, deny.value
+
+    async def _fetch_snapshots(self, channel_ids: list) -> dict:
+        """Busca em lote os snapshots (allow, deny) dos canais. Canais sem snapshot ficam de fora."""
+        snapshots = {}
+        # Em blocos, para ficar abaixo do limite de parâmetros do SQLite
+        for start in range(0, len(channel_ids), 500):
+            chunk = channel_ids[start:start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            try:
+                rows = await self.db.fetch_all(
+                    f"SELECT channel_id, previous_allow, previous_deny FROM locked_channels WHERE channel_id IN ({placeholders}) AND previous_allow IS NOT NULL",
+                    tuple(chunk)
+                )
+            except Exception as e:
+                logging.error(f"Erro ao buscar snapshots de overwrites do DB: {e}", exc_info=True)
+                continue
+            for channel_id, previous_allow, previous_deny in rows:
+                snapshots[channel_id] = (previous_allow, previous_deny or 0)
+        return snapshots
 
     async def _toggle_lockdown(self, channel: discord.TextChannel, lock: bool, reason: str = "Não especificado", locked_by: discord.Member = None, duration_seconds: int = None):
         """
         Alterna o estado de lockdown de um canal e atualiza o banco de dados.
         """
-        everyone_role = channel.guild.default_role
-        bot_member = channel.guild.me
-
         # Verifica as permissões do bot antes de tentar modificar o canal
-        if not (channel.permissions_for(bot_member).manage_roles or channel.permissions_for(bot_member).manage_channels):
-            logging.error(f"Bot sem permissão 'Gerenciar Cargos' ou 'Gerenciar Canais' para alterar permissões em #{channel.name} ({channel.id}).")
-            return False, "Erro: Bot sem permissões necessárias ('Gerenciar Cargos' ou 'Gerenciar Canais') para modificar este canal."
+        permission_error = self._check_bot_permissions(channel)
+        if permission_error:
+            return False, permission_error
 
         if lock:
-            current_perms = channel.overwrites_for(everyone_role) # Obter as permissões atuais
-            current_perms.send_messages = False
-            
-            db_query = "INSERT OR REPLACE INTO locked_channels (channel_id, guild_id, locked_until_timestamp, reason, locked_by_id) VALUES (?, ?, ?, ?, ?)"
             locked_until = None
             if duration_seconds:
                 locked_until = int(time.time()) + duration_seconds
-            
+            previous_allow, previous_deny = self._capture_overwrite(channel)
+            was_locked = channel.id in self.locked_channels.get(channel.guild.id, ())
+
             db_success = False
             try:
-                db_success = await self.db.execute_query(db_query, (channel.id, channel.guild.id, locked_until, reason, locked_by.id if locked_by else None)) # Usando self.db
+                db_success = await self.db.execute_query(self.LOCK_UPSERT_QUERY, (channel.id, channel.guild.id, locked_until, reason, locked_by.id if locked_by else None, previous_allow, previous_deny, self._lock_scope(channel))) # Usando self.db
             except Exception as e:
                 logging.error(f"Falha ao registrar lockdown no DB para canal #{channel.name} ({channel.id}): {e}", exc_info=True)
 
             if not db_success:
                 logging.error(f"Falha ao registrar lockdown no DB para canal #{channel.name} ({channel.id}).")
                 return False, "Erro no banco de dados ao registrar lockdown."
+            self._mark_locked(channel.guild.id, channel.id, True, self._lock_scope(channel))
+            self._schedule_expiry(channel.id, channel.guild.id, locked_until)
             
             status_message = "bloqueado"
             log_message = f"Lockdown ativado em #{channel.name} ({channel.id}) por {locked_by.name if locked_by else 'Desconhecido'}. Razão: '{reason}'. Duração: {duration_seconds}s"
         else:
-            current_perms = channel.overwrites_for(everyone_role) # Obter as permissões atuais
-            current_perms.send_messages = None # Reseta para o estado neutro, permitindo que as permissões do servidor prevaleçam
-            
-            db_query = "DELETE FROM locked_channels WHERE channel_id = ?"
+            if self._is_guild_locked(channel.guild.id):
+                # Desbloquear só o canal não liberaria nada: @everyone continua sem enviar mensagens no servidor inteiro
+                return False, "O servidor está em lockdown de servidor (@everyone). Desbloqueie o servidor inteiro primeiro."
+            snapshot = (await self._fetch_snapshots([channel.id])).get(channel.id)
+            # Restaura antes de remover a linha: ela guarda a única cópia do snapshot
+            success, error_message = await self._apply_lockdown_permissions(channel, False, reason, snapshot)
+            if not success:
+                return False, error_message
+
             db_success = False
             try:
-                db_success = await self.db.execute_query(db_query, (channel.id,)) # Usando self.db
+                db_success = await self.db.execute_query("DELETE FROM locked_channels WHERE channel_id = ?", (channel.id,)) # Usando self.db
             except Exception as e:
                 logging.error(f"Falha ao remover lockdown do DB para canal #{channel.name} ({channel.id}): {e}", exc_info=True)
 
             if not db_success:
+                # O overwrite já foi restaurado; a linha fica e um novo desbloqueio reaplica o mesmo snapshot
                 logging.error(f"Falha ao remover lockdown do DB para canal #{channel.name} ({channel.id}).")
                 return False, "Erro no banco de dados ao remover lockdown."
-            
-            status_message = "desbloqueado"
-            log_message = f"Lockdown desativado em #{channel.name} ({channel.id})."
+            self._mark_locked(channel.guild.id, channel.id, False)
+            self._schedule_expiry(channel.id, channel.guild.id, None)
+            logging.info(f"Lockdown desativado em #{channel.name} ({channel.id}).")
+            return True, "desbloqueado"
 
-        try:
-            await channel.set_permissions(everyone_role, overwrite=current_perms, reason=reason)
+        success, error_message = await self._apply_lockdown_permissions(channel, True, reason)
+        if success:
             logging.info(log_message)
             return True, status_message
-        except discord.Forbidden:
-            logging.error(f"Bot sem permissão para mudar as permissões em #{channel.name} ({channel.id}). Certifique-se de que o bot tem 'Gerenciar Cargos' ou 'Gerenciar Canais' e que seu cargo está acima de @everyone.", exc_info=True)
-            return False, "Erro: Não tenho permissão para modificar as permissões deste canal. Verifique as permissões 'Gerenciar Cargos' e 'Gerenciar Canais' para o cargo do bot e a hierarquia de cargos."
-        except Exception as e:
-            logging.error(f"Erro inesperado ao alternar lockdown em #{channel.name} ({channel.id}): {e}", exc_info=True)
-            return False, f"Erro interno: {e}" 
+        # O bloqueio não foi aplicado: desfaz o registro, a menos que o canal já estivesse bloqueado antes
+        if not was_locked:
+            if await self.db.execute_query("DELETE FROM locked_channels WHERE channel_id = ?", (channel.id,)):
+                self._mark_locked(channel.guild.id, channel.id, False)
+                self._schedule_expiry(channel.id, channel.guild.id, None)
+            else:
+                logging.error(f"Falha ao desfazer o registro de lockdown não aplicado em #{channel.name} ({channel.id}).")
+        return False, error_message
+
+    def _check_bot_permissions(self, channel: discord.TextChannel):
+        """Retorna uma mensagem de erro se o bot não puder alterar as permissões do canal, ou None."""
+        bot_perms = channel.permissions_for(channel.guild.me)
+        if not (bot_perms.manage_roles or bot_perms.manage_channels):
+            logging.error(f"Bot sem permissão 'Gerenciar Cargos' ou 'Gerenciar Canais' para alterar permissões em #{channel.name} ({channel.id}).")
+            return "Erro: Bot sem permissões necessárias ('Gerenciar Cargos' ou 'Gerenciar Canais') para modificar este canal."
+        return None
+
+    async def _apply_lockdown_permissions(self, channel: discord.TextChannel, lock: bool, reason: str, snapshot=None, sync: bool = False):
+        """
+        Aplica (ou remove) o bloqueio de send_messages para @everyone no canal, sem tocar no DB.
+        No desbloqueio, `snapshot` (allow, deny) restaura exatamente o overwrite anterior ao lockdown.
+        Com `sync`, o canal é ressincronizado com a categoria (já bloqueada ou já restaurada) em vez disso.
+        Respeita rate limits: em caso de 429 aguarda e tenta novamente.
+        """
+        everyone_role = channel.guild.default_role
+        sync = sync and channel.category is not None
+        if sync:
+            current_perms = None
+        elif not lock and snapshot is not None:
+            allow, deny = snapshot
+            # Um par vazio significa que não havia overwrite: remove-o em vez de criar um vazio
+            current_perms = discord.PermissionOverwrite.from_pair(discord.Permissions(allow), discord.Permissions(deny)) if (allow or deny) else None
+        else:
+            current_perms = channel.overwrites_for(everyone_role) # Obter as permissões atuais
+            # None reseta para o estado neutro, permitindo que as permissões do servidor prevaleçam
+            current_perms.send_messages = False if lock else None
+
+        for attempt in range(LOCKDOWN_RATE_LIMIT_RETRIES + 1):
+            try:
+                if sync:
+                    # A sincronização é feita pelo cliente: copia os overwrites atuais da categoria para o canal
+                    await channel.edit(sync_permissions=True, reason=reason)
+                elif isinstance(channel, discord.CategoryChannel):
+                    # PATCH na categoria: altera só os overwrites dela. O Discord não propaga a alteração
+                    # para os canais "sincronizados"; eles são ressincronizados à parte (scope 'inherited')
+                    overwrites = dict(channel.overwrites)
+                    if current_perms is None:
+                        overwrites.pop(everyone_role, None)
+                    else:
+                        overwrites[everyone_role] = current_perms
+                    await channel.edit(overwrites=overwrites, reason=reason)
+                else:
+                    await channel.set_permissions(everyone_role, overwrite=current_perms, reason=reason)
+                return True, None
+            except discord.Forbidden:
+                logging.error(f"Bot sem permissão para mudar as permissões em #{channel.name} ({channel.id}). Certifique-se de que o bot tem 'Gerenciar Cargos' ou 'Gerenciar Canais' e que seu cargo está acima de @everyone.", exc_info=True)
+                return False, "Erro: Não tenho permissão para modificar as permissões deste canal. Verifique as permissões 'Gerenciar Cargos' e 'Gerenciar Canais' para o cargo do bot e a hierarquia de cargos."
+            except discord.HTTPException as e:
+                if e.status == 429 and attempt < LOCKDOWN_RATE_LIMIT_RETRIES:
+                    retry_after = 2 ** attempt
+                    logging.warning(f"Rate limit ao alterar permissões em #{channel.name} ({channel.id}). Nova tentativa em {retry_after}s.")
+                    await asyncio.sleep(retry_after)
+                    continue
+                logging.error(f"Erro HTTP ao alternar lockdown em #{channel.name} ({channel.id}): {e}", exc_info=True)
+                return False, f"Erro interno: {e}"
+            except Exception as e:
+                logging.error(f"Erro inesperado ao alternar lockdown em #{channel.name} ({channel.id}): {e}", exc_info=True)
+                return False, f"Erro interno: {e}"
+        return False, "Erro: limite de requisições da API excedido."
+
+    async def bulk_toggle_lockdown(self, channels: list, lock: bool, reason: str = "Não especificado", locked_by: discord.Member = None, duration_seconds: int = None, concurrency: int = LOCKDOWN_CONCURRENCY, progress_callback=None, announce: bool = True, scope: str = None):
+        """
+        Alterna o lockdown de vários canais em paralelo, com no máximo `concurrency` canais em andamento.
+        No bloqueio, as linhas com os snapshots são gravadas em uma única transação antes das chamadas à API
+        (e removidas para os canais que falharem); no desbloqueio, são removidas em lote depois da restauração.
+        `progress_callback(done, total)` é chamado no máximo a cada LOCKDOWN_PROGRESS_INTERVAL segundos e ao terminar.
+        Com scope='inherited', os canais são (res)sincronizados com a categoria em vez de editados individualmente.
+        Retorna (canais alterados, lista de falhas no formato 'nome (motivo)').
+        """
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        total = len(channels)
+        done = 0
+        last_progress = 0.0
+        succeeded = []
+        failed = []
+
+        async def report(force: bool = False):
+            nonlocal last_progress
+            if progress_callback is None:
+                return
+            now = time.monotonic()
+            if not force and now - last_progress < LOCKDOWN_PROGRESS_INTERVAL:
+                return
+            last_progress = now
+            try:
+                await progress_callback(done, total)
+            except Exception as e:
+                logging.warning(f"Falha ao reportar progresso do lockdown em massa: {e}")
+
+        # Canais sem permissão falham antes de qualquer escrita
+        targets = []
+        for channel in channels:
+            error_message = self._check_bot_permissions(channel)
+            if error_message is None:
+                targets.append(channel)
+            else:
+                failed.append(f"{channel.name} ({error_message})")
+                done += 1
+
+        locked_until = int(time.time()) + duration_seconds if lock and duration_seconds else None
+        previously_locked = set()
+        if lock and targets:
+            # Como em _toggle_lockdown, as linhas (com os snapshots) são gravadas antes das chamadas à API:
+            # um canal bloqueado no Discord sempre tem seu snapshot no DB para ser restaurado
+            previously_locked = {channel.id for channel in targets if channel.id in self.locked_channels.get(channel.guild.id, ())}
+            if not await self.db.execute_many(
+                self.LOCK_UPSERT_QUERY,
+                [(channel.id, channel.guild.id, locked_until, reason, locked_by.id if locked_by else None, *self._capture_overwrite(channel), scope or self._lock_scope(channel)) for channel in targets]
+            ):
+                logging.error(f"Falha ao gravar em lote o lockdown de {len(targets)} canais no DB. Nenhum canal foi alterado.")
+                failed.extend(f"{channel.name} (Erro no banco de dados)" for channel in targets)
+                done += len(targets)
+                targets = []
+
+        # No desbloqueio, todos os snapshots são lidos em uma única consulta
+        snapshots = {} if lock else await self._fetch_snapshots([channel.id for channel in targets])
+
+        async def apply(channel: discord.TextChannel):
+            nonlocal done
+            async with semaphore:
+                success, error_message = await self._apply_lockdown_permissions(channel, lock, reason, snapshots.get(channel.id), sync=(scope == "inherited"))
+            if success:
+                succeeded.append(channel)
+            else:
+                failed.append(f"{channel.name} ({error_message})")
+            done += 1
+            await report()
+
+        await asyncio.gather(*(apply(channel) for channel in targets))
+
+        if lock:
+            # Remove as linhas gravadas para canais que não chegaram a ser bloqueados (mantém as de lockdowns anteriores)
+            succeeded_ids = {channel.id for channel in succeeded}
+            rollback = [channel for channel in targets if channel.id not in succeeded_ids and channel.id not in previously_locked]
+            if rollback and not await self.db.execute_many("DELETE FROM locked_channels WHERE channel_id = ?", [(channel.id,) for channel in rollback]):
+                logging.error(f"Falha ao remover do DB {len(rollback)} lockdown(s) que não foram aplicados; a verificação de consistência os recarregará.")
+            for channel in succeeded:
+                self._mark_locked(channel.guild.id, channel.id, True, scope or self._lock_scope(channel))
+                self._schedule_expiry(channel.id, channel.guild.id, locked_until)
+        elif succeeded:
+            # No desbloqueio a linha só é removida depois que o snapshot foi restaurado
+            if await self.db.execute_many("DELETE FROM locked_channels WHERE channel_id = ?", [(channel.id,) for channel in succeeded]):
+                for channel in succeeded:
+                    self._mark_locked(channel.guild.id, channel.id, False)
+                    self._schedule_expiry(channel.id, channel.guild.id, None)
+            else:
+                # Os overwrites já foram restaurados; as linhas ficam e um novo desbloqueio reaplica o mesmo snapshot
+                logging.error(f"Falha ao remover em lote o lockdown de {len(succeeded)} canais do DB.")
+                failed.extend(f"{channel.name} (Erro no banco de dados)" for channel in succeeded)
+                succeeded = []
+
+        logging.info(f"Lockdown em massa ({'bloqueio' if lock else 'desbloqueio'}): {len(succeeded)} alterados, {len(failed)} falhas. Motivo: '{reason}'.")
+
+        if announce and succeeded:
+            async def announce_channel(channel: discord.TextChannel):
+                async with semaphore:
+                    await self._send_lockdown_message(channel, lock, reason, duration_seconds if lock else None)
+            await asyncio.gather(*(announce_channel(channel) for channel in succeeded if isinstance(channel, discord.TextChannel)))
+
+        await report(force=True)
+        return succeeded, failed
+
+    async def lockdown_guild(self, guild: discord.Guild, mode: str, reason: str, locked_by: discord.Member = None, progress_callback=None):
+        """
+        Bloqueia a guild inteira.
+        - 'channel': um overwrite por canal de texto.
+        - 'category': um PATCH por categoria, com o overwrite do canal; canais sincronizados com uma categoria bloqueada
+          são então ressincronizados com ela (o Discord não propaga overwrites de categoria), e os demais editados individualmente.
+        - 'server': uma única edição das permissões de @everyone.
+        Retorna (quantidade de canais/categorias/cargos alterados, canais pulados, lista de falhas).
+        """
+        if mode == "server":
+            success, message = await self._lock_guild_role(guild, reason, locked_by)
+            return (1 if success else 0), [], ([] if success else [message])
+
+        locked = self.get_locked_channels(guild.id)
+        skipped = [channel.name for channel in guild.text_channels if channel.id in locked]
+        inherited = []
+        if mode == "category":
+            targets = [category for category in guild.categories if category.id not in locked]
+            locked_category_ids = {category.id for category in guild.categories}
+            # Decide quem herda antes de editar as categorias (permissions_synced compara com o estado atual)
+            for channel in guild.text_channels:
+                if channel.id in locked:
+                    continue
+                if channel.category_id in locked_category_ids and channel.permissions_synced:
+                    inherited.append(channel)
+                else:
+                    targets.append(channel)
+        else:
+            targets = [channel for channel in guild.text_channels if channel.id not in locked]
+
+        succeeded, failed = await self.bulk_toggle_lockdown(targets, True, reason, locked_by, progress_callback=progress_callback, announce=(mode == "channel"))
+
+        # Canais sincronizados só são ressincronizados se a categoria deles foi bloqueada; os demais ficam como estão
+        locked_categories = {channel.id for channel in succeeded if isinstance(channel, discord.CategoryChannel)} | {
+            channel_id for channel_id, scope in locked.items() if scope == "category"
+        }
+        inherited = [channel for channel in inherited if channel.category_id in locked_categories]
+        synced, sync_failed = await self.bulk_toggle_lockdown(inherited, True, reason, locked_by, progress_callback=progress_callback, announce=False, scope="inherited")
+        failed.extend(sync_failed)
+        return len(succeeded) + len(synced), skipped, failed
+
+    async def unlock_guild(self, guild: discord.Guild, reason: str, progress_callback=None):
+        """
+        Desfaz todos os lockdowns da guild (servidor, categorias, canais e herdados), restaurando os snapshots.
+        Retorna (quantidade desbloqueada, lista de falhas).
+        """
+        unlocked = 0
+        failed = []
+        if guild.id in self.guild_wide_locks:
+            success, message = await self._unlock_guild_role(guild, reason)
+            if success:
+                unlocked += 1
+            else:
+                failed.append(message)
+
+        targets = []
+        inherited = []
+        stale = []
+        for channel_id, scope in self.get_locked_channels(guild.id).items():
+            channel = guild.get_channel(channel_id)
+            if not isinstance(channel, (discord.TextChannel, discord.CategoryChannel)):
+                logging.warning(f"Canal {channel_id} do DB não encontrado ou não é de texto/categoria. Removendo do DB.")
+                stale.append((channel_id, guild.id))
+            elif scope == "inherited":
+                inherited.append(channel)
+            else:
+                targets.append(channel)
+        await self.delete_stale_lockdowns(stale)
+
+        succeeded, bulk_failed = await self.bulk_toggle_lockdown(targets, False, reason, progress_callback=progress_callback)
+        failed.extend(bulk_failed)
+
+        # Canais herdados são ressincronizados com a categoria depois que ela foi restaurada
+        still_locked_categories = {channel_id for channel_id, scope in self.get_locked_channels(guild.id).items() if scope == "category"}
+        released = [channel for channel in inherited if channel.category_id not in still_locked_categories]
+        resynced, sync_failed = await self.bulk_toggle_lockdown(released, False, reason, progress_callback=progress_callback, scope="inherited")
+        failed.extend(sync_failed)
+        return unlocked + len(succeeded) + len(resynced), failed
+
+    async def _lock_guild_role(self, guild: discord.Guild, reason: str, locked_by: discord.Member = None):
+        """Remove send_messages das permissões de @everyone, guardando as permissões anteriores para restauração exata."""
+        if guild.id in self.guild_wide_locks:
+            return True, "já bloqueado"
+        everyone_role = guild.default_role
+        previous_permissions = everyone_role.permissions.value
+        permissions = discord.Permissions(previous_permissions)
+        permissions.send_messages = False
+        # Registra antes de editar para não perder o snapshot se o bot cair no meio
+        if not await self.db.execute_query(
+            "INSERT OR REPLACE INTO guild_lockdowns (guild_id, previous_permissions, reason, locked_by_id) VALUES (?, ?, ?, ?)",
+            (guild.id, previous_permissions, reason, locked_by.id if locked_by else None)
+        ):
+            return False, "Erro no banco de dados ao registrar lockdown do servidor."
+        self.guild_wide_locks[guild.id] = previous_permissions
+        try:
+            await everyone_role.edit(permissions=permissions, reason=reason)
+            logging.info(f"Lockdown de servidor ativado na guild {guild.id}. Razão: '{reason}'.")
+            return True, "bloqueado"
+        except discord.HTTPException as e:
+            logging.error(f"Falha ao editar permissões de @everyone na guild {guild.id}: {e}", exc_info=True)
+            if await self.db.execute_query("DELETE FROM guild_lockdowns WHERE guild_id = ?", (guild.id,)):
+                self.guild_wide_locks.pop(guild.id, None)
+            else:
+                # Cache continua espelhando o DB; um desbloqueio posterior reaplica as permissões (inalteradas) e remove a linha
+                logging.error(f"Falha ao remover o registro de lockdown de servidor da guild {guild.id} após o erro.")
+            return False, f"@everyone (Erro: {e})"
+
+    async def _unlock_guild_role(self, guild: discord.Guild, reason: str):
+        """Restaura exatamente as permissões de @everyone anteriores ao lockdown de servidor."""
+        previous_permissions = self.guild_wide_locks.get(guild.id)
+        if previous_permissions is None:
+            return True, "não bloqueado"
+        try:
+            await guild.default_role.edit(permissions=discord.Permissions(previous_permissions), reason=reason)
+        except discord.HTTPException as e:
+            logging.error(f"Falha ao restaurar permissões de @everyone na guild {guild.id}: {e}", exc_info=True)
+            return False, f"@everyone (Erro: {e})"
+        if not await self.db.execute_query("DELETE FROM guild_lockdowns WHERE guild_id = ?", (guild.id,)):
+            # Mantém o cache igual ao DB: sem isso, a reconciliação bloquearia @everyone de novo na próxima inicialização
+            logging.error(f"Permissões de @everyone restauradas na guild {guild.id}, mas o registro do lockdown não pôde ser removido do DB.")
+            return False, "@everyone (Erro no banco de dados ao remover o registro do lockdown; tente desbloquear novamente)"
+        self.guild_wide_locks.pop(guild.id, None)
+        logging.info(f"Lockdown de servidor desativado na guild {guild.id}.")
+        return True, "desbloqueado"
 
     async def _send_lockdown_message(self, channel: discord.TextChannel, is_locked: bool, reason: str, duration_seconds: int = None):
         """Envia uma mensagem informativa sobre o estado de lockdown."""
@@ -146,101 +577,138 @@ class LockdownCore(commands.Cog):
         except Exception as e:
             logging.error(f"Erro ao enviar mensagem de lockdown/desbloqueio em #{channel.name} ({channel.id}): {e}", exc_info=True)
 
-    @tasks.loop(minutes=1)
-    async def lockdown_check(self):
+    async def _expiry_scheduler(self):
+        """Dorme até o próximo prazo do heap e desbloqueia os canais vencidos, sem consultar o DB enquanto nada vence."""
         await self.bot.wait_until_ready()
+        await self._reconcile_persisted_lockdowns()
 
-        current_time = int(time.time())
-        expired_lockdowns = []
-        try:
-            expired_lockdowns = await self.db.fetch_all( # Usando self.db.fetch_all
-                "SELECT channel_id, guild_id, reason FROM locked_channels WHERE locked_until_timestamp IS NOT NULL AND locked_until_timestamp <= ?",
-                (current_time,)
-            )
-        except Exception as e:
-            logging.error(f"Erro ao buscar lockdowns expirados do DB: {e}", exc_info=True)
-            return # Não continua se houver erro no DB
+        while True:
+            now = time.time()
+            due = self._pop_due_expiries(now)
+            if due:
+                try:
+                    await self._expire_lockdowns(due)
+                except Exception as e:
+                    logging.error(f"Erro ao processar lockdowns expirados: {e}", exc_info=True)
+                continue
 
-        if expired_lockdowns:
-            logging.info(f"Encontrados {len(expired_lockdowns)} canais com lockdown expirado.")
-            for channel_id, guild_id, reason in expired_lockdowns:
-                guild = self.bot.get_guild(guild_id)
-                if not guild:
-                    logging.warning(f"Guild {guild_id} não encontrada para lockdown expirado do canal {channel_id}. Removendo do DB.")
-                    try:
-                        await self.db.execute_query("DELETE FROM locked_channels WHERE channel_id = ?", (channel_id,)) # Usando self.db
-                    except Exception as e:
-                        logging.error(f"Erro ao remover canal {channel_id} do DB após guild não encontrada: {e}", exc_info=True)
-                    continue
+            timeout = self.expiry_heap[0][0] - now if self.expiry_heap else None
+            self._expiry_wakeup.clear()
+            try:
+                await asyncio.wait_for(self._expiry_wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
 
-                channel = guild.get_channel(channel_id)
-                if not channel or not isinstance(channel, discord.TextChannel):
-                    logging.warning(f"Canal {channel_id} não encontrado ou não é de texto para lockdown expirado na guild {guild_id}. Removendo do DB.")
-                    try:
-                        await self.db.execute_query("DELETE FROM locked_channels WHERE channel_id = ?", (channel_id,)) # Usando self.db
-                    except Exception as e:
-                        logging.error(f"Erro ao remover canal {channel_id} do DB após canal não encontrado: {e}", exc_info=True)
-                    continue
-                
-                logging.info(f"Desbloqueando canal {channel.name} ({channel.id}) automaticamente.")
-                success, _ = await self._toggle_lockdown(channel, False, f"Lockdown automático expirado. Motivo original: {reason}")
-                if success:
-                    await self._send_lockdown_message(channel, False, f"Lockdown automático expirado.")
+    def _pop_due_expiries(self, now: float) -> list:
+        """Remove do heap as entradas obsoletas e as vencidas. Retorna [(channel_id, guild_id)] vencidos."""
+        due = []
+        while self.expiry_heap:
+            locked_until, channel_id = self.expiry_heap[0]
+            current = self.lock_deadlines.get(channel_id)
+            if current is None or current[0] != locked_until:
+                heapq.heappop(self.expiry_heap) # Obsoleta: canal desbloqueado ou prazo alterado
+                continue
+            if locked_until > now:
+                break
+            heapq.heappop(self.expiry_heap)
+            del self.lock_deadlines[channel_id]
+            due.append((channel_id, current[1]))
+        return due
 
+    async def _expire_lockdowns(self, due: list):
+        """Desbloqueia os canais vencidos, agrupados por guild."""
+        logging.info(f"Encontrados {len(due)} canais com lockdown expirado.")
+        channels_by_guild = {}
+        stale = []
+        for channel_id, guild_id in due:
+            guild = self.bot.get_guild(guild_id)
+            channel = guild.get_channel(channel_id) if guild else None
+            if not channel or not isinstance(channel, (discord.TextChannel, discord.CategoryChannel)):
+                logging.warning(f"Canal {channel_id} ou guild {guild_id} não encontrado para lockdown expirado. Removendo do DB.")
+                stale.append((channel_id, guild_id))
+                continue
+            channels_by_guild.setdefault(guild_id, []).append(channel)
 
-    @lockdown_check.before_loop
-    async def before_lockdown_check(self):
-        await self.bot.wait_until_ready()
-        logging.info("Iniciando verificação de lockdown persistente...")
-        all_locked_channels = []
+        await self.delete_stale_lockdowns(stale)
+
+        for channels in channels_by_guild.values():
+            logging.info(f"Desbloqueando automaticamente {len(channels)} canal(is): {', '.join(channel.name for channel in channels)}.")
+            await self.bulk_toggle_lockdown(channels, False, "Lockdown automático expirado.")
+
+    async def _reconcile_persisted_lockdowns(self):
+        """
+        Reconcilia na inicialização os lockdowns salvos no DB com o estado atual das permissões (em cache do gateway).
+        Canais que já estão corretos são pulados, linhas obsoletas são removidas em lote,
+        lockdowns vencidos são desfeitos e as correções restantes rodam em paralelo.
+        """
+        logging.info("Iniciando reconciliação de lockdowns persistentes...")
         try:
-            all_locked_channels = await self.db.fetch_all( # Usando self.db.fetch_all
-                "SELECT channel_id, guild_id, reason, locked_by_id, locked_until_timestamp FROM locked_channels"
+            rows = await self.db.fetch_all( # Usando self.db.fetch_all
+                "SELECT channel_id, guild_id, reason, locked_until_timestamp, scope FROM locked_channels"
             )
         except Exception as e:
             logging.error(f"Erro ao buscar lockdowns persistentes do DB no carregamento: {e}", exc_info=True)
             return # Não continua se houver erro no DB
 
-        if all_locked_channels:
-            logging.info(f"Encontrados {len(all_locked_channels)} canais com lockdown persistente no DB.")
-            for channel_id, guild_id, reason, locked_by_id, locked_until_timestamp in all_locked_channels:
-                guild = self.bot.get_guild(guild_id)
-                if not guild:
-                    logging.warning(f"Guild {guild_id} não encontrada para canal {channel_id} no carregamento. Removendo do DB.")
-                    try:
-                        await self.db.execute_query("DELETE FROM locked_channels WHERE channel_id = ?", (channel_id,)) # Usando self.db
-                    except Exception as e:
-                        logging.error(f"Erro ao remover canal {channel_id} do DB após guild não encontrada no carregamento: {e}", exc_info=True)
-                    continue
+        now = int(time.time())
+        stale = []
+        expired_by_guild = {}
+        to_fix = []
+        for channel_id, guild_id, reason, locked_until_timestamp, scope in rows:
+            guild = self.bot.get_guild(guild_id)
+            channel = guild.get_channel(channel_id) if guild else None
+            if not isinstance(channel, (discord.TextChannel, discord.CategoryChannel)):
+                logging.warning(f"Canal {channel_id} ou guild {guild_id} não encontrado no carregamento. Removendo do DB.")
+                stale.append((channel_id, guild_id))
+                continue
 
-                channel = guild.get_channel(channel_id)
-                if not channel or not isinstance(channel, discord.TextChannel):
-                    logging.warning(f"Canal {channel_id} não encontrado ou não é de texto no carregamento para guild {guild_id}. Removendo do DB.")
-                    try:
-                        await self.db.execute_query("DELETE FROM locked_channels WHERE channel_id = ?", (channel_id,)) # Usando self.db
-                    except Exception as e:
-                        logging.error(f"Erro ao remover canal {channel_id} do DB após canal não encontrado no carregamento: {e}", exc_info=True)
-                    continue
-                
-                # Se o lockdown já expirou na hora do carregamento, desbloqueia e remove do DB
-                if locked_until_timestamp and locked_until_timestamp <= int(time.time()):
-                    logging.info(f"Lockdown para canal {channel.name} ({channel.id}) já expirou no carregamento. Desbloqueando.")
-                    await self._toggle_lockdown(channel, False, f"Lockdown expirado na reinicialização do bot. Motivo original: {reason}")
-                else:
-                    logging.info(f"Aplicando lockdown persistente em #{channel.name} ({channel.id}).")
-                    # Recalcula a duração restante para passar para _toggle_lockdown, se houver
-                    remaining_duration = (locked_until_timestamp - int(time.time())) if locked_until_timestamp else None
-                    success, _ = await self._toggle_lockdown(
-                        channel, 
-                        True, 
-                        reason, 
-                        guild.get_member(locked_by_id) if locked_by_id else None, 
-                        remaining_duration
-                    )
-                    if not success:
-                        logging.error(f"Falha ao aplicar lockdown persistente em #{channel.name} ({channel.id}).")
-        else:
-            logging.info("Nenhum canal em lockdown persistente para carregar.")
+            # A coluna é TEXT, então o valor pode vir como string
+            locked_until = int(locked_until_timestamp) if locked_until_timestamp else None
+            if locked_until and locked_until <= now:
+                expired_by_guild.setdefault(guild_id, []).append(channel)
+                continue
+            self._schedule_expiry(channel_id, guild_id, locked_until)
+
+            if channel.overwrites_for(guild.default_role).send_messages is False:
+                continue # Já está bloqueado como esperado
+            to_fix.append((channel, reason))
+
+        await self.delete_stale_lockdowns(stale)
+
+        semaphore = asyncio.Semaphore(LOCKDOWN_CONCURRENCY)
+
+        async def fix(channel, reason):
+            async with semaphore:
+                success, error_message = await self._apply_lockdown_permissions(channel, True, reason or "Lockdown persistente")
+                if not success:
+                    logging.error(f"Falha ao reaplicar lockdown persistente em #{channel.name} ({channel.id}): {error_message}")
+
+        async def fix_guild_role(guild):
+            async with semaphore:
+                permissions = guild.default_role.permissions
+                permissions.send_messages = False
+                try:
+                    await guild.default_role.edit(permissions=permissions, reason="Reaplicando lockdown de servidor persistente")
+                except discord.HTTPException as e:
+                    logging.error(f"Falha ao reaplicar lockdown de servidor na guild {guild.id}: {e}")
+
+        role_fixes = []
+        for guild_id in list(self.guild_wide_locks):
+            guild = self.bot.get_guild(guild_id)
+            if guild is None:
+                continue
+            if guild.default_role.permissions.send_messages:
+                role_fixes.append(guild)
+
+        await asyncio.gather(
+            *(fix(channel, reason) for channel, reason in to_fix),
+            *(fix_guild_role(guild) for guild in role_fixes),
+            *(self.bulk_toggle_lockdown(channels, False, "Lockdown expirado na reinicialização do bot.", announce=False) for channels in expired_by_guild.values())
+        )
+        logging.info(
+            f"Reconciliação de lockdowns concluída: {len(rows)} registro(s), {len(stale)} obsoleto(s) removido(s), "
+            f"{sum(len(channels) for channels in expired_by_guild.values())} expirado(s), {len(to_fix)} canal(is) e {len(role_fixes)} servidor(es) corrigido(s)."
+        )
 
 
 async def setup(bot: commands.Bot): # db_manager removido daqui
@@ -8,6 +8,58 @@ from cogs.moderation.lockdown_core import LockdownCore
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+LOCKDOWN_MODE_LABELS = {
+    "channel": "Por canal",
+    "category": "Por categoria",
+    "server": "Servidor inteiro (@everyone)"
+}
+
+async def run_lockdown_all(interaction: discord.Interaction, lockdown_core: LockdownCore, mode: str):
+    """Executa o lockdown geral no modo escolhido, exibindo o progresso em uma mensagem efêmera (interação já deferida)."""
+    progress_message = await interaction.followup.send(f"🔒 Bloqueando canais ({LOCKDOWN_MODE_LABELS[mode]})...", ephemeral=True, wait=True)
+
+    async def update_progress(done: int, total: int):
+        await progress_message.edit(content=f"🔒 Bloqueando canais ({LOCKDOWN_MODE_LABELS[mode]})... {done}/{total}")
+
+    locked_count, skipped_channels, failed_channels = await lockdown_core.lockdown_guild(
+        interaction.guild,
+        mode,
+        reason=f"Lockdown geral ativado via Painel por {interaction.user.name}",
+        locked_by=interaction.user,
+        progress_callback=update_progress
+    )
+
+    if mode == "server":
+        response_message = "As permissões de @everyone foram alteradas para bloquear o envio de mensagens em todo o servidor." if locked_count else "Falha ao bloquear o servidor."
+    else:
+        response_message = f"Foram bloqueados {locked_count} canais/categorias ({LOCKDOWN_MODE_LABELS[mode]})."
+    if skipped_channels:
+        response_message += f"\n\n**Canal(is) já marcado(s) como bloqueado(s) no sistema (pulado(s)):**\n{', '.join(skipped_channels)}"
+    if failed_channels:
+        response_message += f"\n\n**Falha ao bloquear:**\n{'; '.join(failed_channels)}\n\nPor favor, verifique as permissões do bot ('Gerenciar Cargos' e 'Gerenciar Canais') e a hierarquia de cargos."
+
+    await progress_message.edit(content=response_message[:2000])
+
+async def run_unlock_all(interaction: discord.Interaction, lockdown_core: LockdownCore):
+    """Desfaz todos os lockdowns da guild, exibindo o progresso em uma mensagem efêmera (interação já deferida)."""
+    progress_message = await interaction.followup.send("🔓 Desbloqueando canais...", ephemeral=True, wait=True)
+
+    async def update_progress(done: int, total: int):
+        await progress_message.edit(content=f"🔓 Desbloqueando canais... {done}/{total}")
+
+    unlocked_count, failed_channels = await lockdown_core.unlock_guild(
+        interaction.guild,
+        reason=f"Lockdown geral desativado via Painel por {interaction.user.name}",
+        progress_callback=update_progress
+    )
+
+    response_message = f"Foram desbloqueados {unlocked_count} canais/categorias."
+    if failed_channels:
+        response_message += f"\n\n**Falha ao desbloquear:**\n{'; '.join(failed_channels)}\n\nPor favor, verifique as permissões do bot ('Gerenciar Cargos' e 'Gerenciar Canais') e a hierarquia de cargos."
+
+    await progress_message.edit(content=response_message[:2000])
+
+
 class LockdownPanelView(ui.View):
     """View persistente para o painel de controle de lockdown."""
     def __init__(self, bot: commands.Bot, guild_id: int): # db_manager removido daqui
@@ -106,13 +158,17 @@ class LockdownPanelView(ui.View):
         # Obter o status de lockdown do canal principal (geralmente o canal do painel ou um canal padrão)
         lockdown_core = await self.get_lockdown_core_cog()
         is_panel_channel_locked = False
+        is_guild_locked = False
         if lockdown_core:
-            is_panel_channel_locked = await lockdown_core._is_channel_locked(panel_channel_id)
+            is_panel_channel_locked = lockdown_core._is_channel_locked(guild_id, panel_channel_id)
+            is_guild_locked = lockdown_core._is_guild_locked(guild_id)
         else:
             logging.warning("LockdownCore cog não encontrado ao tentar verificar o estado do canal no refresh do painel.")
         
         status = "Ativado (Canais Bloqueados)" if is_panel_channel_locked else "Desativado (Canais Desbloqueados)"
-        color = discord.Color.red() if is_panel_channel_locked else discord.Color.green()
+        if is_guild_locked:
+            status = "Ativado (Servidor Inteiro Bloqueado via @everyone)"
+        color = discord.Color.red() if is_panel_channel_locked or is_guild_locked else discord.Color.green()
 
         embed = discord.Embed(
             title="Painel de Controle de Lockdown",
@@ -186,7 +242,11 @@ class LockdownPanelView(ui.View):
             await interaction.followup.send("Erro: O sistema de lockdown principal não está carregado. Por favor, contate um administrador.", ephemeral=True)
             return
         
-        is_locked = await lockdown_core._is_channel_locked(interaction.channel.id)
+        if lockdown_core._is_guild_locked(self.guild_id):
+            await interaction.followup.send("O servidor inteiro está em lockdown via @everyone. Use **Desbloquear TODOS os Canais** para liberá-lo; desbloquear apenas este canal não teria efeito.", ephemeral=True)
+            return
+
+        is_locked = lockdown_core._is_channel_locked(self.guild_id, interaction.channel.id)
         if not is_locked:
             await interaction.followup.send(f"O canal {interaction.channel.mention} não está atualmente em lockdown pelo sistema (ou não está registrado no DB).", ephemeral=True)
             await self.refresh_panel(self.guild_id, interaction.client)
@@ -219,43 +279,8 @@ class LockdownPanelView(ui.View):
             await interaction.followup.send("Erro: O sistema de lockdown principal não está carregado. Por favor, contate um administrador.", ephemeral=True)
             return
 
-        locked_count = 0
-        skipped_channels = [] # Nova lista para canais explicitamente pulados (já marcados no DB)
-        failed_channels = [] # Lista para canais que falharam por erro ou permissão
-        
-        for channel in interaction.guild.text_channels:
-            try:
-                # Verifica se o canal já está marcado como bloqueado no DB
-                is_locked_in_db = await lockdown_core._is_channel_locked(channel.id)
-                if is_locked_in_db:
-                    logging.info(f"Canal #{channel.name} ({channel.id}) já está marcado como bloqueado no DB, pulando.")
-                    skipped_channels.append(channel.name)
-                    continue
-
-                # Tenta alternar o lockdown
-                success, msg = await lockdown_core._toggle_lockdown(
-                    channel=channel,
-                    lock=True,
-                    reason=f"Lockdown geral ativado via Painel por {interaction.user.name}",
-                    locked_by=interaction.user
-                )
-                if success:
-                    locked_count += 1
-                    await lockdown_core._send_lockdown_message(channel, True, f"Lockdown geral ativado por {interaction.user.name}")
-                else:
-                    # Se success for False, msg contém a razão do _toggle_lockdown
-                    failed_channels.append(f"{channel.name} ({msg})")
-            except Exception as e:
-                logging.error(f"Erro inesperado ao tentar bloquear canal {channel.name} ({channel.id}): {e}", exc_info=True)
-                failed_channels.append(f"{channel.name} (Erro interno: {e})")
-
-        response_message = f"Foram bloqueados {locked_count} canais de texto."
-        if skipped_channels:
-            response_message += f"\n\n**Canal(is) já marcado(s) como bloqueado(s) no sistema (pulado(s)):**\n{', '.join(skipped_channels)}"
-        if failed_channels:
-            response_message += f"\n\n**Falha ao bloquear:**\n{'; '.join(failed_channels)}\n\nPor favor, verifique as permissões do bot ('Gerenciar Cargos' e 'Gerenciar Canais') e a hierarquia de cargos."
-        
-        await interaction.followup.send(response_message, ephemeral=True)
+        # O botão de emergência bloqueia canal por canal (com aviso em cada um); outros modos só via /lockdown_all_channels
+        await run_lockdown_all(interaction, lockdown_core, "channel")
         await self.refresh_panel(self.guild_id, interaction.client)
 
     @ui.button(label="Desbloquear TODOS os Canais", style=discord.ButtonStyle.success, custom_id="lockdown_panel_unlock_all")
@@ -272,53 +297,7 @@ class LockdownPanelView(ui.View):
             await interaction.followup.send("Erro: O sistema de lockdown principal não está carregado. Por favor, contate um administrador.", ephemeral=True)
             return
 
-        unlocked_count = 0
-        failed_channels = []
-
-        # Buscar todos os canais que estão em lockdown pelo nosso DB
-        locked_channels_data = []
-        try:
-            locked_channels_data = await self.db.fetch_all( # Usando self.db
-                "SELECT channel_id FROM locked_channels WHERE guild_id = ?",
-                (interaction.guild.id,)
-            )
-        except Exception as e:
-            logging.error(f"Erro ao buscar canais bloqueados do DB para guild {self.guild_id}: {e}", exc_info=True)
-            await interaction.followup.send("Ocorreu um erro ao buscar canais bloqueados no banco de dados.", ephemeral=True)
-            return
-
-        locked_channel_ids = [row[0] for row in locked_channels_data]
-
-        for channel_id in locked_channel_ids:
-            channel = interaction.guild.get_channel(channel_id)
-            if not channel or not isinstance(channel, discord.TextChannel):
-                logging.warning(f"Canal {channel_id} do DB não encontrado ou não é de texto. Removendo do DB.")
-                try:
-                    await self.db.execute_query("DELETE FROM locked_channels WHERE channel_id = ?", (channel_id,)) # Usando self.db
-                except Exception as e:
-                    logging.error(f"Erro ao remover canal {channel_id} do DB após não encontrado: {e}", exc_info=True)
-                continue
-
-            try:
-                success, msg = await lockdown_core._toggle_lockdown(
-                    channel=channel,
-                    lock=False,
-                    reason=f"Lockdown geral desativado via Painel por {interaction.user.name}"
-                )
-                if success:
-                    unlocked_count += 1
-                    await lockdown_core._send_lockdown_message(channel, False, f"Lockdown geral desativado por {interaction.user.name}")
-                else:
-                    failed_channels.append(f"{channel.name} ({msg})")
-            except Exception as e:
-                logging.error(f"Erro ao tentar desbloquear canal {channel.name} ({channel.id}): {e}", exc_info=True)
-                failed_channels.append(f"{channel.name} (Erro interno: {e})")
-
-        response_message = f"Foram desbloqueados {unlocked_count} canais de texto."
-        if failed_channels:
-            response_message += f"\n\n**Falha ao desbloquear:**\n{'; '.join(failed_channels)}\n\nPor favor, verifique as permissões do bot ('Gerenciar Cargos' e 'Gerenciar Canais') e a hierarquia de cargos."
-        
-        await interaction.followup.send(response_message, ephemeral=True)
+        await run_unlock_all(interaction, lockdown_core)
         await self.refresh_panel(self.guild_id, interaction.client)
 
 
@@ -436,13 +415,17 @@ class LockdownPanel(commands.Cog):
         # O estado inicial do painel vai depender do estado do canal atual
         lockdown_core = self.bot.get_cog("LockdownCore")
         is_panel_channel_locked = False
+        is_guild_locked = False
         if lockdown_core:
-            is_panel_channel_locked = await lockdown_core._is_channel_locked(interaction.channel.id)
+            is_panel_channel_locked = lockdown_core._is_channel_locked(guild_id, interaction.channel.id)
+            is_guild_locked = lockdown_core._is_guild_locked(guild_id)
         else:
             logging.warning("LockdownCore cog não encontrado ao tentar verificar o estado do canal no setup do painel.")
 
         status = "Ativado (Canais Bloqueados)" if is_panel_channel_locked else "Desativado (Canais Desbloqueados)"
-        color = discord.Color.red() if is_panel_channel_locked else discord.Color.green()
+        if is_guild_locked:
+            status = "Ativado (Servidor Inteiro Bloqueado via @everyone)"
+        color = discord.Color.red() if is_panel_channel_locked or is_guild_locked else discord.Color.green()
 
         embed = discord.Embed(
             title="Painel de Controle de Lockdown",
@@ -480,6 +463,30 @@ class LockdownPanel(commands.Cog):
             await interaction.followup.send(f"Ocorreu um erro ao configurar o painel: {e}", ephemeral=True)
             logging.error(f"Erro inesperado ao configurar painel de lockdown na guild {guild_id}: {e}", exc_info=True)
 
+    @app_commands.command(name="lockdown_all_channels", description="Bloqueia todos os canais de texto do servidor.")
+    @app_commands.describe(mode="Como aplicar o bloqueio: por canal, por categoria (canais sincronizados seguem a categoria) ou via @everyone.")
+    @app_commands.choices(mode=[
+        app_commands.Choice(name=label, value=value) for value, label in LOCKDOWN_MODE_LABELS.items()
+    ])
+    @app_commands.checks.has_permissions(manage_channels=True)
+    async def lockdown_all_channels(self, interaction: discord.Interaction, mode: app_commands.Choice[str]):
+        await interaction.response.defer(ephemeral=True)
+        lockdown_core = self.bot.get_cog("LockdownCore")
+        if not lockdown_core:
+            await interaction.followup.send("Erro: O sistema de lockdown principal não está carregado. Por favor, contate um administrador.", ephemeral=True)
+            return
+        await run_lockdown_all(interaction, lockdown_core, mode.value)
+
+    @app_commands.command(name="unlock_all_channels", description="Desfaz todos os lockdowns do servidor, restaurando as permissões anteriores.")
+    @app_commands.checks.has_permissions(manage_channels=True)
+    async def unlock_all_channels(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True)
+        lockdown_core = self.bot.get_cog("LockdownCore")
+        if not lockdown_core:
+            await interaction.followup.send("Erro: O sistema de lockdown principal não está carregado. Por favor, contate um administrador.", ephemeral=True)
+            return
+        await run_unlock_all(interaction, lockdown_core)
+
     @app_commands.command(name="lockdown_panel_delete", description="Deleta o painel de controle de lockdown existente.")
     @app_commands.checks.has_permissions(manage_guild=True)
     async def delete_lockdown_panel(self, interaction: discord.Interaction):
@@ -1,35 +1,69 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import app_commands, ui
 import json
 import os
+import hashlib
+import gzip
+import zlib
+import codecs
+import aiohttp
+import contextlib
 import datetime
 import logging
+import time
 import asyncio # Para usar bot.wait_for
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # --- Funções Auxiliares para Lógica de Backup/Restauração ---
-async def _perform_backup_logic(interaction: discord.Interaction, guild: discord.Guild):
-    """Lógica central para criar um backup da estrutura do servidor."""
-    backup_data = {
-        "guild_id": guild.id,
-        "guild_name": guild.name,
-        "roles": [],
-        "categories": [],
-        "text_channels": [],
-        "voice_channels": [],
-        "timestamp": datetime.datetime.now().isoformat()
+def _overwrite_entries(channel, label: str) -> list:
+    """Overwrites do canal/categoria no formato de backup ({id, type, allow, deny})."""
+    entries = []
+    for target, overwrite_perms in channel.overwrites.items():
+        target_id = target.id
+        target_type = "role" if isinstance(target, discord.Role) else "member"
+        try:
+            # Verifica se 'allowed' e 'denied' existem e não são None antes de acessar '.value'
+            allowed_value = overwrite_perms.allowed.value if hasattr(overwrite_perms, 'allowed') and overwrite_perms.allowed else 0
+            denied_value = overwrite_perms.denied.value if hasattr(overwrite_perms, 'denied') and overwrite_perms.denied else 0
+
+            entries.append({
+                "id": target_id,
+                "type": target_type,
+                "allow": allowed_value,
+                "deny": denied_value
+            })
+        except AttributeError as e:
+            logging.error(f"Erro ao obter permissões de sobrescrita para {label} (Target ID: {target_id}, Tipo: {target_type}). Erro: {e}. Tipo de overwrite_perms: {type(overwrite_perms)}")
+            # Se ocorrer um erro, esta sobrescrita será ignorada para evitar travar o backup.
+    return entries
+
+def _channel_entry(channel, category_id) -> dict:
+    return {
+        "name": channel.name,
+        "position": channel.position,
+        "topic": channel.topic if isinstance(channel, discord.TextChannel) else None,
+        "bitrate": channel.bitrate if isinstance(channel, discord.VoiceChannel) else None,
+        "user_limit": channel.user_limit if isinstance(channel, discord.VoiceChannel) else None,
+        "nsfw": channel.nsfw if isinstance(channel, discord.TextChannel) else None,
+        "slowmode_delay": channel.slowmode_delay if isinstance(channel, discord.TextChannel) else None,
+        "overwrites": _overwrite_entries(channel, f"canal '{channel.name}'"),
+        "id": channel.id, # Inclui o ID original
+        "category_id": category_id, # Link para o ID original da categoria (None se não tiver)
+        "type": "text_channel" if isinstance(channel, discord.TextChannel) else "voice_channel" # Adiciona o tipo de canal
     }
 
-    # Backup de Cargos
-    for role in guild.roles:
+def _iter_structure(guild: discord.Guild):
+    """Percorre a estrutura do servidor gerando (tipo, entrada), uma entrada por vez."""
+    # Backup de Cargos, ordenados por posição para tentar recriar na ordem correta
+    for role in sorted(guild.roles, key=lambda r: r.position, reverse=True):
         # Ignora o cargo @everyone para evitar duplicação ou problemas na restauração,
         # pois ele é recriado automaticamente pelo Discord.
         if role == guild.default_role:
             continue
-        backup_data["roles"].append({
+        yield "roles", {
             "name": role.name,
             "permissions": role.permissions.value, # Salva o valor inteiro das permissões
             "color": role.color.value, # Salva o valor inteiro da cor
@@ -37,128 +71,665 @@ async def _perform_backup_logic(interaction: discord.Interaction, guild: discord
             "mentionable": role.mentionable,
             "position": role.position,
             "id": role.id # Inclui o ID original para mapeamento durante a restauração
-        })
-    # Ordena os cargos por posição para tentar recriar na ordem correta
-    backup_data["roles"].sort(key=lambda x: x["position"], reverse=True)
+        }
 
     # Backup de Canais e Categorias
     for category in guild.categories:
-        category_data = {
+        yield "categories", {
             "name": category.name,
             "id": category.id, # Inclui o ID original para mapeamento
             "position": category.position,
-            "overwrites": []
+            "overwrites": _overwrite_entries(category, f"categoria '{category.name}'")
         }
-        for target, overwrite_perms in category.overwrites.items():
-            target_id = target.id
-            target_type = "role" if isinstance(target, discord.Role) else "member"
-            try:
-                # Verifica se 'allowed' e 'denied' existem e não são None antes de acessar '.value'
-                allowed_value = overwrite_perms.allowed.value if hasattr(overwrite_perms, 'allowed') and overwrite_perms.allowed else 0
-                denied_value = overwrite_perms.denied.value if hasattr(overwrite_perms, 'denied') and overwrite_perms.denied else 0
-                
-                category_data["overwrites"].append({
-                    "id": target_id,
-                    "type": target_type,
-                    "allow": allowed_value,
-                    "deny": denied_value
-                })
-            except AttributeError as e:
-                logging.error(f"Erro ao obter permissões de sobrescrita para categoria '{category.name}' (Target ID: {target_id}, Tipo: {target_type}). Erro: {e}. Tipo de overwrite_perms: {type(overwrite_perms)}")
-                # Se ocorrer um erro, esta sobrescrita será ignorada para evitar travar o backup.
-                # Você pode adicionar lógica para lidar com isso, como definir permissões padrão.
-        backup_data["categories"].append(category_data)
-
         for channel in category.channels:
-            channel_data = {
-                "name": channel.name,
-                "position": channel.position,
-                "topic": channel.topic if isinstance(channel, discord.TextChannel) else None,
-                "bitrate": channel.bitrate if isinstance(channel, discord.VoiceChannel) else None,
-                "user_limit": channel.user_limit if isinstance(channel, discord.VoiceChannel) else None,
-                "nsfw": channel.nsfw if isinstance(channel, discord.TextChannel) else None,
-                "slowmode_delay": channel.slowmode_delay if isinstance(channel, discord.TextChannel) else None,
-                "overwrites": [],
-                "id": channel.id, # Inclui o ID original
-                "category_id": category.id, # Link para o ID original da categoria
-                "type": "text_channel" if isinstance(channel, discord.TextChannel) else "voice_channel" # Adiciona o tipo de canal
-            }
-            for target, overwrite_perms in channel.overwrites.items():
-                target_id = target.id
-                target_type = "role" if isinstance(target, discord.Role) else "member"
-                try:
-                    # Verifica se 'allowed' e 'denied' existem e não são None antes de acessar '.value'
-                    allowed_value = overwrite_perms.allowed.value if hasattr(overwrite_perms, 'allowed') and overwrite_perms.allowed else 0
-                    denied_value = overwrite_perms.denied.value if hasattr(overwrite_perms, 'denied') and overwrite_perms.denied else 0
-
-                    channel_data["overwrites"].append({
-                        "id": target_id,
-                        "type": target_type,
-                        "allow": allowed_value,
-                        "deny": denied_value
-                    })
-                except AttributeError as e:
-                    logging.error(f"Erro ao obter permissões de sobrescrita para canal '{channel.name}' (Target ID: {target_id}, Tipo: {target_type}). Erro: {e}. Tipo de overwrite_perms: {type(overwrite_perms)}")
-                    # Se ocorrer um erro, esta sobrescrita será ignorada.
-            
             if isinstance(channel, discord.TextChannel):
-                backup_data["text_channels"].append(channel_data)
+                yield "text_channels", _channel_entry(channel, category.id)
             elif isinstance(channel, discord.VoiceChannel):
-                backup_data["voice_channels"].append(channel_data)
-    
+                yield "voice_channels", _channel_entry(channel, category.id)
+
     # Canais sem categoria (que não estão dentro de uma categoria)
     for channel in guild.channels:
         if channel.category is None and not isinstance(channel, discord.CategoryChannel):
-            channel_data = {
-                "name": channel.name,
-                "position": channel.position,
-                "topic": channel.topic if isinstance(channel, discord.TextChannel) else None,
-                "bitrate": channel.bitrate if isinstance(channel, discord.VoiceChannel) else None,
-                "user_limit": channel.user_limit if isinstance(channel, discord.VoiceChannel) else None,
-                "nsfw": channel.nsfw if isinstance(channel, discord.TextChannel) else None,
-                "slowmode_delay": channel.slowmode_delay if isinstance(channel, discord.TextChannel) else None,
-                "overwrites": [],
-                "id": channel.id, # Inclui o ID original
-                "category_id": None, # Sem categoria
-                "type": "text_channel" if isinstance(channel, discord.TextChannel) else "voice_channel" # Adiciona o tipo de canal
-            }
-            for target, overwrite_perms in channel.overwrites.items():
-                target_id = target.id
-                target_type = "role" if isinstance(target, discord.Role) else "member"
-                try:
-                    # Verifica se 'allowed' e 'denied' existem e não são None antes de acessar '.value'
-                    allowed_value = overwrite_perms.allowed.value if hasattr(overwrite_perms, 'allowed') and overwrite_perms.allowed else 0
-                    denied_value = overwrite_perms.denied.value if hasattr(overwrite_perms, 'denied') and overwrite_perms.denied else 0
-
-                    channel_data["overwrites"].append({
-                        "id": target_id,
-                        "type": target_type,
-                        "allow": allowed_value,
-                        "deny": denied_value
-                    })
-                except AttributeError as e:
-                    logging.error(f"Erro ao obter permissões de sobrescrita para canal sem categoria '{channel.name}' (Target ID: {target_id}, Tipo: {target_type}). Erro: {e}. Tipo de overwrite_perms: {type(overwrite_perms)}")
-                    # Se ocorrer um erro, esta sobrescrita será ignorada.
-
             if isinstance(channel, discord.TextChannel):
-                backup_data["text_channels"].append(channel_data)
+                yield "text_channels", _channel_entry(channel, None)
             elif isinstance(channel, discord.VoiceChannel):
-                backup_data["voice_channels"].append(channel_data)
+                yield "voice_channels", _channel_entry(channel, None)
+
+BACKUP_DIR = "server_backups"
+SNAPSHOT_KINDS = ("roles", "categories", "text_channels", "voice_channels")
+SNAPSHOT_CHAIN_MAX_DEPTH = 24 # A cada N snapshots incrementais, grava um snapshot completo para limitar a cadeia
+SNAPSHOT_EXTENSION = ".json.gz"
+BACKUP_RETENTION = {"hourly": 24, "daily": 7, "weekly": 4} # Quantos snapshots manter por período
+BACKUP_SCHEDULER_TICK_MINUTES = 5
+BACKUP_SCHEDULER_MAX_PER_TICK = 3 # Máximo de servidores com backup agendado por execução do loop
+BACKUP_INTERVAL_CHOICES = [1, 6, 12, 24]
+
+def _entry_hash(entry: dict) -> str:
+    """Hash estável do conteúdo de um cargo/canal (inclui posição e overwrites)."""
+    encoded = json.dumps(entry, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:20]
+
+def _snapshot_dir(guild_id: int) -> str:
+    return os.path.join(BACKUP_DIR, str(guild_id), "snapshots")
+
+def _snapshot_path(guild_id: int, snapshot_id: str) -> str:
+    compressed = os.path.join(_snapshot_dir(guild_id), f"{snapshot_id}{SNAPSHOT_EXTENSION}")
+    if os.path.exists(compressed):
+        return compressed
+    legacy = os.path.join(_snapshot_dir(guild_id), f"{snapshot_id}.json") # Snapshots antigos, sem compressão
+    return legacy if os.path.exists(legacy) else compressed
+
+def _list_snapshots(guild_id: int) -> list:
+    """IDs dos snapshots locais do servidor, do mais antigo para o mais recente."""
+    directory = _snapshot_dir(guild_id)
+    if not os.path.isdir(directory):
+        return []
+    snapshot_ids = set()
+    for name in os.listdir(directory):
+        for extension in (SNAPSHOT_EXTENSION, ".json"):
+            if name.endswith(extension):
+                snapshot_ids.add(name[:-len(extension)])
+                break
+    return sorted(snapshot_ids)
+
+def _read_snapshot(guild_id: int, snapshot_id: str) -> dict:
+    path = _snapshot_path(guild_id, snapshot_id)
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+def _snapshot_datetime(snapshot_id: str) -> datetime.datetime:
+    return datetime.datetime.strptime(snapshot_id, '%Y%m%d_%H%M%S_%f')
+
+def _apply_retention(guild_id: int) -> int:
+    """
+    Remove snapshots fora da política de retenção (o mais recente de cada uma das últimas N horas, N dias e
+    N semanas). Os ancestrais de um snapshot mantido também são mantidos, para que a cadeia continue
+    reconstruível. Retorna a quantidade de snapshots removidos.
+    """
+    snapshots = _list_snapshots(guild_id)
+    if not snapshots:
+        return 0
+
+    keep = {snapshots[-1]}
+    bucket_formats = {"hourly": '%Y%m%d%H', "daily": '%Y%m%d', "weekly": '%G%V'}
+    for period, limit in BACKUP_RETENTION.items():
+        buckets = {}
+        for snapshot_id in reversed(snapshots): # Do mais recente para o mais antigo
+            bucket = _snapshot_datetime(snapshot_id).strftime(bucket_formats[period])
+            if bucket not in buckets and len(buckets) < limit:
+                buckets[bucket] = snapshot_id
+        keep.update(buckets.values())
+
+    for snapshot_id in list(keep):
+        parent = _read_snapshot(guild_id, snapshot_id).get("parent")
+        while parent and parent not in keep:
+            keep.add(parent)
+            parent = _read_snapshot(guild_id, parent).get("parent")
+
+    removed = 0
+    for snapshot_id in snapshots:
+        if snapshot_id not in keep:
+            os.remove(_snapshot_path(guild_id, snapshot_id))
+            removed += 1
+    return removed
+
+class SnapshotBuilder:
+    """
+    Monta um snapshot incremental entrada por entrada: guarda apenas o manifesto de hashes e as entradas
+    cujo hash mudou desde o snapshot anterior (pai). O manifesto completo permite o próximo diff e
+    a detecção de remoções.
+    """
+    def __init__(self, guild_id: int, guild_name: str):
+        self.guild_id = guild_id
+        self.guild_name = guild_name
+        self.timestamp = datetime.datetime.now().isoformat()
+        snapshots = _list_snapshots(guild_id)
+        self.parent = _read_snapshot(guild_id, snapshots[-1]) if snapshots else None
+        if self.parent and self.parent.get("depth", 0) + 1 >= SNAPSHOT_CHAIN_MAX_DEPTH:
+            self.parent = None # Inicia uma nova cadeia com um snapshot completo
+        self.hashes = {kind: {} for kind in SNAPSHOT_KINDS}
+        self.changed = {kind: [] for kind in SNAPSHOT_KINDS}
 
+    def add(self, kind: str, entry: dict):
+        key = str(entry["id"])
+        digest = _entry_hash(entry)
+        self.hashes[kind][key] = digest
+        parent_hashes = self.parent["hashes"].get(kind, {}) if self.parent else {}
+        if parent_hashes.get(key) != digest:
+            self.changed[kind].append(entry)
+
+    def write(self):
+        """Grava o snapshot. Retorna (snapshot_id, quantidade de entradas alteradas)."""
+        snapshot_id = datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        snapshot = {
+            "format": "incremental",
+            "guild_id": self.guild_id,
+            "guild_name": self.guild_name,
+            "snapshot_id": snapshot_id,
+            "parent": self.parent["snapshot_id"] if self.parent else None,
+            "depth": self.parent.get("depth", 0) + 1 if self.parent else 0,
+            "timestamp": self.timestamp,
+            "hashes": self.hashes,
+            "changed": self.changed
+        }
+
+        os.makedirs(_snapshot_dir(self.guild_id), exist_ok=True)
+        with gzip.open(os.path.join(_snapshot_dir(self.guild_id), f"{snapshot_id}{SNAPSHOT_EXTENSION}"), 'wt', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False, separators=(",", ":"))
+        return snapshot_id, sum(len(entries) for entries in self.changed.values())
+
+def _write_incremental_snapshot(guild_id: int, guild_name: str, entries: list):
+    """
+    Grava um snapshot incremental a partir das entradas já coletadas. Não acessa objetos do discord.py,
+    então pode rodar em uma thread. Retorna (snapshot_id, entradas alteradas).
+    """
+    builder = SnapshotBuilder(guild_id, guild_name)
+    for kind, entry in entries:
+        builder.add(kind, entry)
+    return builder.write()
+
+@contextlib.contextmanager
+def _timed(timings: dict, stage: str):
+    """Mede a duração de uma etapa e a registra em `timings[stage]`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = time.perf_counter() - started
+
+def _format_timings(timings: dict) -> str:
+    return ", ".join(f"{stage}={duration:.3f}s" for stage, duration in timings.items())
+
+def _collect_entries(guild: discord.Guild) -> list:
+    """
+    Lê a estrutura do cache do discord.py no event loop (o cache não é thread-safe). O resultado são apenas
+    dicts simples, que podem ser serializados em uma thread.
+    """
+    return list(_iter_structure(guild))
+
+def _reconstruct_snapshot(guild_id: int, snapshot_id: str) -> dict:
+    """Reconstrói o estado completo de um snapshot percorrendo a cadeia de pais até o snapshot completo."""
+    chain = []
+    current = snapshot_id
+    while current:
+        snapshot = _read_snapshot(guild_id, current)
+        chain.append(snapshot)
+        current = snapshot.get("parent")
+
+    state = {kind: {} for kind in SNAPSHOT_KINDS}
+    for snapshot in reversed(chain): # Do snapshot completo (raiz) até o solicitado
+        for kind in SNAPSHOT_KINDS:
+            for entry in snapshot["changed"].get(kind, []):
+                state[kind][str(entry["id"])] = entry
+            # Entradas ausentes do manifesto foram removidas do servidor neste snapshot
+            manifest = snapshot["hashes"].get(kind, {})
+            state[kind] = {key: entry for key, entry in state[kind].items() if key in manifest}
+
+    target = chain[0]
+    backup_data = {
+        "guild_id": target["guild_id"],
+        "guild_name": target.get("guild_name"),
+        "timestamp": target.get("timestamp"),
+        **{kind: list(state[kind].values()) for kind in SNAPSHOT_KINDS}
+    }
+    backup_data["roles"].sort(key=lambda x: x["position"], reverse=True)
+    return backup_data
+
+BACKUP_EXPORT_FORMAT = "lyv2-backup"
+BACKUP_EXPORT_VERSION = 2
+BACKUP_EXPORT_EXTENSION = ".jsonl.gz"
+BACKUP_FILE_EXTENSIONS = (".json", BACKUP_EXPORT_EXTENSION) # .json = formato antigo, ainda aceito na restauração
+OVERWRITE_TYPES = ("role", "member") # Índice usado no formato compactado dos overwrites
+
+def _pack_overwrites(overwrites: list) -> list:
+    """[{id, type, allow, deny}] -> [[id, tipo, allow, deny]] (tipo = índice em OVERWRITE_TYPES)."""
+    return [[ow["id"], OVERWRITE_TYPES.index(ow["type"]), ow["allow"], ow["deny"]] for ow in overwrites]
+
+def _unpack_overwrites(packed: list) -> list:
+    return [{"id": target_id, "type": OVERWRITE_TYPES[type_index], "allow": allow, "deny": deny} for target_id, type_index, allow, deny in packed]
+
+def _write_backup_export(filename: str, header: dict, entries) -> int:
+    """
+    Grava o backup no formato compacto versionado: JSON Lines comprimido com gzip. A primeira linha é o
+    cabeçalho; cada linha seguinte é uma entrada ({"k": tipo, ...}) escrita assim que é gerada, sem montar
+    o backup inteiro em memória. Retorna a quantidade de entradas gravadas.
+    """
+    count = 0
+    with gzip.open(filename, 'wt', encoding='utf-8') as f:
+        f.write(json.dumps({"format": BACKUP_EXPORT_FORMAT, "version": BACKUP_EXPORT_VERSION, **header}, ensure_ascii=False, separators=(",", ":")) + "\n")
+        for kind, entry in entries:
+            record = {"k": kind, **entry}
+            if "overwrites" in record:
+                record["overwrites"] = _pack_overwrites(record["overwrites"])
+            f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+            count += 1
+    return count
+
+BACKUP_DOWNLOAD_CHUNK_SIZE = 64 * 1024 # Bytes lidos do download por vez ao carregar um backup anexado
+
+class BackupStreamDecoder:
+    """
+    Decodifica um arquivo de backup à medida que os bytes chegam: o formato compacto é descomprimido e cada
+    linha é convertida em entrada assim que fica completa, sem guardar o arquivo baixado nem o texto descomprimido.
+    Arquivos .json do formato antigo (um único documento JSON) só podem ser lidos inteiros em finish().
+    Levanta ValueError se o arquivo for inválido.
+    """
+    def __init__(self):
+        self.head = b"" # Primeiros bytes, até ser possível identificar o formato
+        self.legacy_chunks = None # Formato antigo: bytes acumulados até o fim
+        self.decompressor = None
+        self.text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self.partial_line = ""
+        self.backup_data = None
+
+    def feed(self, chunk: bytes):
+        if self.decompressor is None and self.legacy_chunks is None:
+            self.head += chunk
+            if len(self.head) < 2:
+                return
+            chunk, self.head = self.head, b""
+            if chunk[:2] == b"\x1f\x8b":
+                self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) # Cabeçalho gzip
+            else:
+                self.legacy_chunks = [] # Não é gzip: formato antigo (JSON indentado)
+        if self.legacy_chunks is not None:
+            self.legacy_chunks.append(chunk)
+            return
+        try:
+            data = self.decompressor.decompress(chunk)
+        except zlib.error as e:
+            raise ValueError(f"Arquivo de backup corrompido: {e}") from e
+        self._feed_text(self.text_decoder.decode(data))
+
+    def _feed_text(self, text: str):
+        lines = (self.partial_line + text).split("\n")
+        self.partial_line = lines.pop()
+        for line in lines:
+            self._feed_line(line)
+
+    def _feed_line(self, line: str):
+        if not line.strip():
+            return
+        record = json.loads(line)
+        if self.backup_data is None: # Primeira linha: cabeçalho
+            if record.get("format") != BACKUP_EXPORT_FORMAT:
+                raise ValueError("O arquivo não é um backup de estrutura do servidor.")
+            if record.get("version", 0) > BACKUP_EXPORT_VERSION:
+                raise ValueError(f"Versão de backup não suportada: {record.get('version')}.")
+            self.backup_data = {
+                "guild_id": record.get("guild_id"),
+                "guild_name": record.get("guild_name"),
+                "timestamp": record.get("timestamp"),
+                **{kind: [] for kind in SNAPSHOT_KINDS}
+            }
+            return
+        kind = record.pop("k")
+        if "overwrites" in record:
+            record["overwrites"] = _unpack_overwrites(record["overwrites"])
+        self.backup_data.setdefault(kind, []).append(record)
+
+    def finish(self) -> dict:
+        if self.decompressor is None:
+            return json.loads(b"".join(self.legacy_chunks or [self.head]).decode('utf-8'))
+        try:
+            data = self.decompressor.flush()
+        except zlib.error as e:
+            raise ValueError(f"Arquivo de backup corrompido: {e}") from e
+        self._feed_text(self.text_decoder.decode(data, final=True))
+        self._feed_line(self.partial_line)
+        if not self.decompressor.eof or self.backup_data is None:
+            raise ValueError("Arquivo de backup incompleto.")
+        return self.backup_data
+
+def _write_backup_files(guild_id: int, guild_name: str, entries: list, filename: str):
+    """
+    Serializa, comprime e grava o arquivo de exportação e, na mesma passada, o snapshot incremental local.
+    Roda em uma thread. Retorna (entradas exportadas, snapshot_id, entradas alteradas no snapshot).
+    """
     # Cria a pasta de backups se não existir
-    backup_dir = "server_backups"
-    os.makedirs(backup_dir, exist_ok=True)
-
-    # Salva o backup em um arquivo JSON
-    filename = f"{backup_dir}/{guild.id}_backup_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(backup_data, f, ensure_ascii=False, indent=4)
-    
-    logging.info(f"Backup da estrutura do servidor {guild.name} ({guild.id}) criado em {filename}")
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+
+    builder = SnapshotBuilder(guild_id, guild_name)
+    def tee_entries():
+        for kind, entry in entries:
+            builder.add(kind, entry)
+            yield kind, entry
+
+    header = {"guild_id": guild_id, "guild_name": guild_name, "timestamp": builder.timestamp}
+    count = _write_backup_export(filename, header, tee_entries())
+    snapshot_id, changed_count = builder.write()
+    return count, snapshot_id, changed_count
+
+async def _perform_backup_logic(interaction: discord.Interaction, guild: discord.Guild):
+    """
+    Lógica central para criar um backup da estrutura do servidor: exporta o estado completo no formato
+    compacto e, na mesma passada, grava um snapshot incremental local. Serialização e disco rodam fora do event loop.
+    """
+    timings = {}
+    with _timed(timings, "coleta"):
+        entries = _collect_entries(guild)
+
+    filename = f"{BACKUP_DIR}/{guild.id}_backup_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}{BACKUP_EXPORT_EXTENSION}"
+    with _timed(timings, "gravação"):
+        count, snapshot_id, changed_count = await asyncio.to_thread(_write_backup_files, guild.id, guild.name, entries, filename)
+
+    logging.info(f"Snapshot incremental {snapshot_id} do servidor {guild.id} gravado ({changed_count} entradas alteradas).")
+    logging.info(f"Backup da estrutura do servidor {guild.name} ({guild.id}) criado em {filename} ({count} entradas). Tempos: {_format_timings(timings)}")
     return filename
 
-async def _perform_restore_logic(interaction: discord.Interaction, backup_data: dict):
-    """Lógica central para restaurar a estrutura do servidor a partir de dados de backup."""
+async def _load_backup_attachment(attachment: discord.Attachment) -> dict:
+    """
+    Baixa um arquivo de backup anexado em blocos e decodifica cada bloco assim que chega (descompressão e parse
+    em uma thread). Apenas o backup decodificado, necessário para planejar a restauração, fica inteiro em memória.
+    """
+    decoder = BackupStreamDecoder()
+    size = 0
+    started = time.perf_counter()
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(attachment.url) as response:
+                response.raise_for_status()
+                async for chunk in response.content.iter_chunked(BACKUP_DOWNLOAD_CHUNK_SIZE):
+                    size += len(chunk)
+                    await asyncio.to_thread(decoder.feed, chunk)
+    except aiohttp.ClientError as e:
+        raise OSError(f"Falha ao baixar o backup '{attachment.filename}': {e}") from e
+    backup_data = await asyncio.to_thread(decoder.finish)
+    logging.info(f"Backup '{attachment.filename}' ({size} bytes) baixado e decodificado em {time.perf_counter() - started:.2f}s.")
+    return backup_data
+
+BACKUP_RESTORE_CONCURRENCY = 4 # Máximo de chamadas simultâneas à API durante a restauração
+BACKUP_RATE_LIMIT_RETRIES = 3 # Tentativas extras quando a API responde 429
+BACKUP_PROGRESS_INTERVAL = 3 # Intervalo mínimo (segundos) entre atualizações de progresso
+
+class RestorePlanner:
+    """
+    Grafo de dependências da restauração: cada etapa só executa depois das etapas das quais depende
+    (cargos -> categorias -> canais que usam esses cargos/categorias). Etapas independentes rodam em
+    paralelo, limitadas por `concurrency`.
+    """
+    def __init__(self, concurrency: int = BACKUP_RESTORE_CONCURRENCY):
+        self.concurrency = concurrency
+        self.steps = {} # chave -> (dependências, função assíncrona, descrição)
+
+    def add(self, key, func, deps=(), label: str = None):
+        self.steps[key] = (tuple(deps), func, label or str(key))
+
+    async def _call_with_retry(self, func):
+        for attempt in range(BACKUP_RATE_LIMIT_RETRIES + 1):
+            try:
+                return await func()
+            except discord.HTTPException as e:
+                if e.status != 429 or attempt == BACKUP_RATE_LIMIT_RETRIES:
+                    raise
+                retry_after = 2 ** attempt
+                logging.warning(f"Rate limit durante a restauração. Nova tentativa em {retry_after}s.")
+                await asyncio.sleep(retry_after)
+
+    async def run(self, progress_callback=None):
+        """
+        Executa todas as etapas. `progress_callback(done, total, eta_seconds)` é chamado no máximo a cada
+        BACKUP_PROGRESS_INTERVAL segundos e ao terminar. Retorna a lista de falhas ('descrição: erro').
+        """
+        events = {key: asyncio.Event() for key in self.steps}
+        semaphore = asyncio.Semaphore(max(1, self.concurrency))
+        total = len(self.steps)
+        done = 0
+        failures = []
+        started = time.monotonic()
+        last_progress = 0.0
+
+        async def report(force: bool = False):
+            nonlocal last_progress
+            if progress_callback is None:
+                return
+            now = time.monotonic()
+            if not force and now - last_progress < BACKUP_PROGRESS_INTERVAL:
+                return
+            last_progress = now
+            eta = (now - started) / done * (total - done) if done else None
+            try:
+                await progress_callback(done, total, eta)
+            except Exception as e:
+                logging.warning(f"Falha ao reportar progresso da restauração: {e}")
+
+        async def run_step(key):
+            nonlocal done
+            deps, func, label = self.steps[key]
+            for dep in deps:
+                if dep in events:
+                    await events[dep].wait()
+            try:
+                async with semaphore:
+                    await self._call_with_retry(func)
+            except Exception as e:
+                logging.error(f"Falha na etapa de restauração '{label}': {e}")
+                failures.append(f"{label}: {e}")
+            finally:
+                events[key].set() # Dependentes seguem mesmo em caso de falha (o overwrite/categoria é ignorado)
+                done += 1
+                await report()
+
+        await asyncio.gather(*(run_step(key) for key in self.steps))
+        await report(force=True)
+        return failures
+
+
+def _build_overwrites(guild: discord.Guild, overwrites_data: list, role_id_map: dict, label: str) -> dict:
+    """Converte os overwrites do backup em {alvo: PermissionOverwrite}, usando o mapeamento de cargos restaurados."""
+    overwrites = {}
+    for ow in overwrites_data:
+        target = None
+        if ow["type"] == "role":
+            mapped_id = role_id_map.get(ow["id"])
+            if mapped_id:
+                target = guild.get_role(mapped_id)
+            # Nota: O backup não salva o nome do cargo para overwrites, apenas o ID.
+            # Se o ID não for mapeado, e o cargo não existir, não podemos encontrá-lo pelo nome aqui.
+        elif ow["type"] == "member":
+            target = guild.get_member(ow["id"])
+
+        if target:
+            perm_allow = discord.Permissions(ow["allow"])
+            perm_deny = discord.Permissions(ow["deny"])
+            overwrites[target] = discord.PermissionOverwrite.from_pair(perm_allow, perm_deny)
+        else:
+            logging.warning(f"Alvo de overwrite não encontrado (ID: {ow['id']}, Tipo: {ow['type']}) para '{label}'. Ignorando overwrite.")
+    return overwrites
+
+def _compute_role_positions(guild: discord.Guild, roles_data: list, role_id_map: dict) -> dict:
+    """
+    Calcula a ordem final dos cargos restaurados ({cargo: posição}) para ser aplicada em uma única chamada.
+    Os cargos mantêm a ordem relativa do backup e ficam abaixo do cargo mais alto do bot.
+    """
+    bot_top_position = guild.me.top_role.position
+    ordered = sorted(roles_data, key=lambda r: (r["position"], r.get("id") or 0))
+    movable = []
+    for role_data in ordered:
+        if role_data["name"] == "@everyone":
+            continue
+        role = guild.get_role(role_id_map.get(role_data.get("id")) or 0)
+        if role is None or role.is_default() or role >= guild.me.top_role:
+            continue
+        movable.append(role)
+
+    if len(movable) >= bot_top_position:
+        logging.warning(f"Cargos restaurados ({len(movable)}) excedem o espaço abaixo do cargo do bot. Ajustando apenas os {bot_top_position - 1} mais baixos.")
+        movable = movable[:max(0, bot_top_position - 1)]
+
+    positions = {role: index for index, role in enumerate(movable, start=1)}
+    if all(role.position == position for role, position in positions.items()):
+        return {} # Já está na ordem correta
+    return positions
+
+def _compute_channel_positions(guild: discord.Guild, categories_data: list, category_id_map: dict, channels_data: list, channel_id_map: dict) -> list:
+    """Monta o payload de atualização em lote das posições de categorias e canais que estão fora da posição do backup."""
+    payload = []
+    for data, id_map in ((categories_data, category_id_map), (channels_data, channel_id_map)):
+        for item in sorted(data, key=lambda c: (c["position"], c.get("id") or 0)):
+            new_id = id_map.get(item.get("id"))
+            channel = guild.get_channel(new_id) if new_id else None
+            if channel and channel.position != item["position"]:
+                payload.append({"id": new_id, "position": item["position"]})
+    return payload
+
+def _format_eta(seconds) -> str:
+    if seconds is None:
+        return "calculando..."
+    return str(datetime.timedelta(seconds=int(seconds)))
+
+CHANNEL_TYPES = {"text_channel": discord.TextChannel, "voice_channel": discord.VoiceChannel}
+
+def _match_entries(entries: list, get_by_id, candidates: list, name_key) -> dict:
+    """
+    Associa cada entrada do backup a um objeto do servidor: primeiro pelo ID, depois pelo nome (e tipo).
+    Cada objeto do servidor é associado a no máximo uma entrada. Retorna {id do backup: objeto ou None}.
+    """
+    matches = {}
+    claimed = set()
+    for entry in entries:
+        live = get_by_id(entry.get("id"))
+        if live is not None and live.id not in claimed:
+            matches[entry.get("id")] = live
+            claimed.add(live.id)
+
+    by_name = {}
+    for live in candidates:
+        if live.id not in claimed:
+            by_name.setdefault(name_key(live), []).append(live)
+    for entry in entries:
+        if entry.get("id") in matches:
+            continue
+        options = by_name.get(name_key(entry), [])
+        matches[entry.get("id")] = options.pop(0) if options else None
+    return matches
+
+def _live_overwrites(channel) -> dict:
+    """Overwrites atuais do canal como {(tipo, id): (allow, deny)}."""
+    return {
+        ("role" if isinstance(target, discord.Role) else "member", target.id): tuple(p.value for p in overwrite.pair())
+        for target, overwrite in channel.overwrites.items()
+    }
+
+def _desired_overwrites(guild: discord.Guild, overwrites_data: list, role_matches: dict):
+    """
+    Overwrites do backup traduzidos para os IDs do servidor, no mesmo formato de _live_overwrites.
+    Retorna None se algum cargo referenciado ainda precisa ser criado (os overwrites terão de ser reaplicados).
+    """
+    desired = {}
+    for ow in overwrites_data:
+        if ow["type"] == "role":
+            role = role_matches.get(ow["id"])
+            if role is None:
+                return None
+            desired[("role", role.id)] = (ow["allow"], ow["deny"])
+        elif guild.get_member(ow["id"]):
+            desired[("member", ow["id"])] = (ow["allow"], ow["deny"])
+    return desired
+
+def _get_category(guild: discord.Guild, channel_id):
+    category = guild.get_channel(channel_id or 0)
+    return category if isinstance(category, discord.CategoryChannel) else None
+
+def _plan_restore(guild: discord.Guild, backup_data: dict) -> dict:
+    """
+    Compara o backup com o estado atual do servidor (em memória, sem chamadas à API) e monta o plano mínimo:
+    {"roles"|"categories"|"channels": [{"action": "create"|"edit"|"skip", "data", "target", "changes"}]}.
+    """
+    plan = {"roles": [], "categories": [], "channels": []}
+
+    roles_data = [r for r in backup_data.get("roles", []) if r["name"] != "@everyone"]
+    role_matches = _match_entries(
+        roles_data,
+        lambda role_id: guild.get_role(role_id or 0),
+        [role for role in guild.roles if not role.is_default()],
+        lambda item: item.name if isinstance(item, discord.Role) else item["name"]
+    )
+    # @everyone não entra no backup de cargos, mas aparece nos overwrites com o ID do servidor de origem
+    role_matches[backup_data.get("guild_id")] = guild.default_role
+    for role_data in roles_data:
+        role = role_matches[role_data.get("id")]
+        changes = []
+        if role is not None:
+            current = {"name": role.name, "permissions": role.permissions.value, "color": role.color.value, "hoist": role.hoist, "mentionable": role.mentionable}
+            changes = [field for field, value in current.items() if role_data[field] != value]
+        plan["roles"].append({"action": "create" if role is None else ("edit" if changes else "skip"), "data": role_data, "target": role, "changes": changes})
+
+    categories_data = backup_data.get("categories", [])
+    category_matches = _match_entries(
+        categories_data,
+        lambda channel_id: _get_category(guild, channel_id),
+        list(guild.categories),
+        lambda item: item.name if isinstance(item, discord.CategoryChannel) else item["name"]
+    )
+    for category_data in categories_data:
+        category = category_matches[category_data.get("id")]
+        changes = []
+        if category is not None:
+            if category.name != category_data["name"]:
+                changes.append("name")
+            if _desired_overwrites(guild, category_data["overwrites"], role_matches) != _live_overwrites(category):
+                changes.append("overwrites")
+        plan["categories"].append({"action": "create" if category is None else ("edit" if changes else "skip"), "data": category_data, "target": category, "changes": changes})
+
+    channels_data = [c for c in backup_data.get("text_channels", []) + backup_data.get("voice_channels", []) if c["type"] in CHANNEL_TYPES]
+    live_channels = [c for c in guild.channels if isinstance(c, (discord.TextChannel, discord.VoiceChannel))]
+    channel_type_name = lambda channel: "text_channel" if isinstance(channel, discord.TextChannel) else "voice_channel"
+    channel_matches = _match_entries(
+        channels_data,
+        lambda channel_id: guild.get_channel(channel_id or 0),
+        live_channels,
+        lambda item: (item["name"], item["type"]) if isinstance(item, dict) else (item.name, channel_type_name(item))
+    )
+    for channel_data in channels_data:
+        channel = channel_matches[channel_data.get("id")]
+        if channel is not None and not isinstance(channel, CHANNEL_TYPES[channel_data["type"]]):
+            channel = None # Mesmo ID com outro tipo de canal: não é possível convertê-lo
+        changes = []
+        if channel is not None:
+            if isinstance(channel, discord.TextChannel):
+                current = {"name": channel.name, "topic": channel.topic, "nsfw": channel.nsfw, "slowmode_delay": channel.slowmode_delay}
+            else:
+                current = {"name": channel.name, "bitrate": channel.bitrate, "user_limit": channel.user_limit}
+            changes = [field for field, value in current.items() if channel_data.get(field) != value]
+            expected_category = category_matches.get(channel_data.get("category_id")) if channel_data.get("category_id") else None
+            if expected_category is None and channel_data.get("category_id"):
+                changes.append("category") # A categoria será criada; o canal precisa ser movido para ela
+            elif channel.category_id != (expected_category.id if expected_category else None):
+                changes.append("category")
+            if _desired_overwrites(guild, channel_data["overwrites"], role_matches) != _live_overwrites(channel):
+                changes.append("overwrites")
+        plan["channels"].append({"action": "create" if channel is None else ("edit" if changes else "skip"), "data": channel_data, "target": channel, "changes": changes})
+
+    return plan
+
+def _format_restore_plan(plan: dict, max_lines: int = 20) -> str:
+    """Resumo do plano de restauração para exibição (dry run)."""
+    labels = {"roles": "Cargos", "categories": "Categorias", "channels": "Canais"}
+    action_labels = {"create": "criar", "edit": "editar", "skip": "sem alterações"}
+    lines = []
+    details = []
+    for kind, entries in plan.items():
+        counts = {action: sum(1 for entry in entries if entry["action"] == action) for action in action_labels}
+        lines.append(f"**{labels[kind]}:** " + ", ".join(f"{counts[action]} {action_labels[action]}" for action in action_labels))
+        for entry in entries:
+            if entry["action"] == "create":
+                details.append(f"+ {labels[kind][:-1].lower()} '{entry['data']['name']}'")
+            elif entry["action"] == "edit":
+                details.append(f"~ {labels[kind][:-1].lower()} '{entry['data']['name']}' ({', '.join(entry['changes'])})")
+    if details:
+        lines.append("")
+        lines.extend(details[:max_lines])
+        if len(details) > max_lines:
+            lines.append(f"... e mais {len(details) - max_lines} alteração(ões).")
+    return "\n".join(lines)
+
+async def _perform_restore_logic(interaction: discord.Interaction, backup_data: dict, dry_run: bool = False):
+    """
+    Lógica central para restaurar a estrutura do servidor a partir de dados de backup. Apenas as diferenças
+    entre o backup e o servidor atual são aplicadas; com `dry_run`, o plano é exibido sem alterar nada.
+    """
     guild = interaction.guild
 
     # Verifica se o backup pertence ao servidor atual
@@ -166,34 +737,43 @@ async def _perform_restore_logic(interaction: discord.Interaction, backup_data:
         await interaction.followup.send("Este arquivo de backup não pertence a este servidor. Cancelando.", ephemeral=True)
         return
 
-    await interaction.followup.send("Iniciando restauração da estrutura do servidor. Isso pode levar um tempo...", ephemeral=True)
+    # Snapshots incrementais guardam apenas o diff; o estado completo vem da cadeia local de snapshots
+    if backup_data.get("format") == "incremental":
+        try:
+            backup_data = await asyncio.to_thread(_reconstruct_snapshot, guild.id, backup_data["snapshot_id"])
+        except (OSError, KeyError, json.JSONDecodeError) as e:
+            logging.error(f"Falha ao reconstruir o snapshot {backup_data.get('snapshot_id')} do servidor {guild.id}: {e}", exc_info=True)
+            await interaction.followup.send("Não foi possível reconstruir este snapshot: a cadeia de snapshots locais está incompleta.", ephemeral=True)
+            return
 
-    role_id_map = {} # Mapeia IDs de cargos antigos para novos IDs
-    category_id_map = {} # Mapeia IDs de categorias antigas para novos IDs
-    
-    # Restauração de Cargos
-    existing_roles_map = {role.name: role for role in guild.roles}
+    timings = {}
+    with _timed(timings, "planejamento"):
+        plan = _plan_restore(guild, backup_data)
+    plan_summary = _format_restore_plan(plan)
+    if dry_run:
+        await interaction.followup.send(f"**Simulação da restauração (nada foi alterado):**\n{plan_summary}"[:2000], ephemeral=True)
+        return
 
-    for role_data in backup_data.get("roles", []):
-        role_name = role_data["name"]
-        
-        # Se o cargo já existe, tenta atualizá-lo. Caso contrário, cria um novo.
-        if role_name in existing_roles_map:
-            new_role = existing_roles_map[role_name]
-            try:
-                await new_role.edit(
-                    permissions=discord.Permissions(role_data["permissions"]),
-                    color=discord.Color(role_data["color"]),
-                    hoist=role_data["hoist"],
-                    mentionable=role_data["mentionable"],
-                    reason="Restauração de backup"
-                )
-                logging.info(f"Cargo existente '{role_name}' atualizado.")
-            except Exception as e:
-                logging.warning(f"Não foi possível atualizar o cargo existente '{role_name}': {e}")
-            role_id_map[role_data.get("id")] = new_role.id
-        else:
-            try:
+    progress_message = await interaction.followup.send("Iniciando restauração da estrutura do servidor. Isso pode levar um tempo...", ephemeral=True, wait=True)
+
+    # Mapeiam IDs do backup para IDs do servidor; objetos já existentes são mapeados antes da execução
+    role_id_map = {entry["data"].get("id"): entry["target"].id for entry in plan["roles"] if entry["target"]}
+    role_id_map[backup_data.get("guild_id")] = guild.default_role.id # Overwrites de @everyone usam o ID do servidor
+    category_id_map = {entry["data"].get("id"): entry["target"].id for entry in plan["categories"] if entry["target"]}
+    channel_id_map = {entry["data"].get("id"): entry["target"].id for entry in plan["channels"] if entry["target"]}
+    planner = RestorePlanner()
+
+    # Restauração de Cargos
+    def role_step(entry: dict):
+        role_data = entry["data"]
+        async def step():
+            role_name = role_data["name"]
+            if entry["action"] == "edit":
+                converters = {"permissions": discord.Permissions, "color": discord.Color}
+                changes = {field: converters.get(field, lambda value: value)(role_data[field]) for field in entry["changes"]}
+                await entry["target"].edit(**changes, reason="Restauração de backup")
+                logging.info(f"Cargo existente '{role_name}' atualizado ({', '.join(entry['changes'])}).")
+            else:
                 new_role = await guild.create_role(
                     name=role_name,
                     permissions=discord.Permissions(role_data["permissions"]),
@@ -204,99 +784,90 @@ async def _perform_restore_logic(interaction: discord.Interaction, backup_data:
                 )
                 logging.info(f"Cargo '{role_name}' criado.")
                 role_id_map[role_data.get("id")] = new_role.id
-            except Exception as e:
-                logging.error(f"Não foi possível criar o cargo '{role_name}': {e}")
-    
-    # Ajustar posições dos cargos após a criação/atualização
-    for role_data in backup_data.get("roles", []):
-        if role_data["name"] == "@everyone":
+        return step
+
+    role_keys = []
+    for entry in plan["roles"]:
+        if entry["action"] == "skip":
             continue
-        role_id = role_id_map.get(role_data.get("id"))
-        if role_id:
-            role = guild.get_role(role_id)
-            if role and role.position != role_data["position"]:
-                try:
-                    await role.edit(position=role_data["position"], reason="Ajuste de posição pós-restauração")
-                    logging.info(f"Posição do cargo '{role.name}' ajustada para {role_data['position']}.")
-                except Exception as e:
-                    logging.warning(f"Não foi possível ajustar a posição do cargo '{role.name}' para {role_data['position']}: {e}")
-
-    # Restauração de Categorias
-    for category_data in backup_data.get("categories", []):
-        overwrites = {}
-        for ow in category_data["overwrites"]:
-            target = None
-            if ow["type"] == "role":
-                mapped_id = role_id_map.get(ow["id"])
-                if mapped_id:
-                    target = guild.get_role(mapped_id)
-                else:
-                    # Fallback: tenta encontrar o cargo pelo nome se o ID mapeado não foi encontrado
-                    # Nota: O backup não salva o nome do cargo para overwrites, apenas o ID.
-                    # Se o ID não for mapeado, e o cargo não existir, não podemos encontrá-lo pelo nome aqui.
-                    # Isso é uma limitação se o cargo foi deletado e recriado com outro ID mas o mesmo nome.
-                    pass 
-            elif ow["type"] == "member":
-                target = guild.get_member(ow["id"])
-            
-            if target:
-                perm_allow = discord.Permissions(ow["allow"])
-                perm_deny = discord.Permissions(ow["deny"])
-                overwrites[target] = discord.PermissionOverwrite.from_pair(perm_allow, perm_deny)
-            else:
-                logging.warning(f"Alvo de overwrite não encontrado (ID: {ow['id']}, Tipo: {ow['type']}) para categoria '{category_data['name']}'. Ignorando overwrite.")
+        key = ("role", entry["data"].get("id"))
+        role_keys.append(key)
+        planner.add(key, role_step(entry), label=f"cargo '{entry['data']['name']}'")
 
-        try:
-            new_category = await guild.create_category(
-                name=category_data["name"],
-                position=category_data["position"],
-                overwrites=overwrites,
-                reason="Restauração de backup"
-            )
-            logging.info(f"Categoria '{category_data['name']}' criada.")
-            category_id_map[category_data.get("id")] = new_category.id
-        except Exception as e:
-            logging.error(f"Não foi possível criar a categoria '{category_data['name']}': {e}")
-    
-    # Restauração de Canais (Texto e Voz)
-    # Combina canais de texto e voz para iterar sobre eles
-    for channel_data in backup_data.get("text_channels", []) + backup_data.get("voice_channels", []):
-        overwrites = {}
-        for ow in channel_data["overwrites"]:
-            target = None
-            if ow["type"] == "role":
-                mapped_id = role_id_map.get(ow["id"])
-                if mapped_id:
-                    target = guild.get_role(mapped_id)
-                else:
-                    # Fallback: tenta encontrar o cargo pelo nome se o ID mapeado não foi encontrado
-                    pass
-            elif ow["type"] == "member":
-                target = guild.get_member(ow["id"])
-            
-            if target:
-                perm_allow = discord.Permissions(ow["allow"])
-                perm_deny = discord.Permissions(ow["deny"])
-                overwrites[target] = discord.PermissionOverwrite.from_pair(perm_allow, perm_deny)
-            else:
-                logging.warning(f"Alvo de overwrite não encontrado (ID: {ow['id']}, Tipo: {ow['type']}) para canal '{channel_data['name']}'. Ignorando overwrite.")
-
-        category = None
-        if channel_data.get("category_id"):
-            mapped_category_id = category_id_map.get(channel_data["category_id"])
-            if mapped_category_id:
-                category = guild.get_channel(mapped_category_id)
-                if not isinstance(category, discord.CategoryChannel):
-                    category = None # Garante que é uma categoria válida
+    # Ajusta as posições de todos os cargos de uma vez, depois que todos foram criados/atualizados
+    async def role_positions_step():
+        positions = _compute_role_positions(guild, backup_data.get("roles", []), role_id_map)
+        if positions:
+            await guild.edit_role_positions(positions=positions, reason="Ajuste de posição pós-restauração")
+            logging.info(f"Posições de {len(positions)} cargos ajustadas em uma única chamada.")
+    planner.add(("role_positions",), role_positions_step, deps=role_keys, label="posições dos cargos")
+
+    def overwrite_role_deps(overwrites_data: list):
+        return [("role", ow["id"]) for ow in overwrites_data if ow["type"] == "role"]
+
+    def resolve_category(channel_data: dict):
+        if not channel_data.get("category_id"):
+            return None
+        mapped_category_id = category_id_map.get(channel_data["category_id"])
+        category = guild.get_channel(mapped_category_id) if mapped_category_id else None
+        if not isinstance(category, discord.CategoryChannel):
+            logging.warning(f"Categoria mapeada não encontrada para canal '{channel_data['name']}'. Mantendo sem categoria.")
+            return None
+        return category
+
+    # Restauração de Categorias (dependem dos cargos usados nos overwrites)
+    def category_step(entry: dict):
+        category_data = entry["data"]
+        async def step():
+            overwrites = _build_overwrites(guild, category_data["overwrites"], role_id_map, category_data["name"])
+            if entry["action"] == "edit":
+                changes = {}
+                if "name" in entry["changes"]:
+                    changes["name"] = category_data["name"]
+                if "overwrites" in entry["changes"]:
+                    changes["overwrites"] = overwrites
+                await entry["target"].edit(**changes, reason="Restauração de backup")
+                logging.info(f"Categoria existente '{category_data['name']}' atualizada ({', '.join(entry['changes'])}).")
             else:
-                logging.warning(f"Categoria mapeada não encontrada para canal '{channel_data['name']}'. Criando sem categoria.")
+                new_category = await guild.create_category(
+                    name=category_data["name"],
+                    overwrites=overwrites,
+                    reason="Restauração de backup"
+                )
+                logging.info(f"Categoria '{category_data['name']}' criada.")
+                category_id_map[category_data.get("id")] = new_category.id
+        return step
 
-        try:
+    for entry in plan["categories"]:
+        if entry["action"] == "skip":
+            continue
+        planner.add(
+            ("category", entry["data"].get("id")),
+            category_step(entry),
+            deps=overwrite_role_deps(entry["data"]["overwrites"]),
+            label=f"categoria '{entry['data']['name']}'"
+        )
+
+    # Restauração de Canais (Texto e Voz); dependem da categoria e dos cargos usados nos overwrites
+    def channel_step(entry: dict):
+        channel_data = entry["data"]
+        async def step():
+            overwrites = _build_overwrites(guild, channel_data["overwrites"], role_id_map, channel_data["name"])
+            category = resolve_category(channel_data)
+
+            if entry["action"] == "edit":
+                changes = {field: channel_data.get(field) for field in entry["changes"] if field not in ("category", "overwrites")}
+                if "category" in entry["changes"]:
+                    changes["category"] = category
+                if "overwrites" in entry["changes"]:
+                    changes["overwrites"] = overwrites
+                await entry["target"].edit(**changes, reason="Restauração de backup")
+                logging.info(f"Canal existente '{channel_data['name']}' atualizado ({', '.join(entry['changes'])}).")
             # Verifica o tipo de canal para criar corretamente
-            if channel_data["type"] == "text_channel": 
-                await guild.create_text_channel(
+            # A posição é aplicada depois, em lote, para que criações paralelas não reordenem umas às outras
+            elif channel_data["type"] == "text_channel":
+                new_channel = await guild.create_text_channel(
                     name=channel_data["name"],
-                    position=channel_data["position"],
                     topic=channel_data.get("topic"),
                     nsfw=channel_data.get("nsfw", False),
                     slowmode_delay=channel_data.get("slowmode_delay"),
@@ -305,10 +876,10 @@ async def _perform_restore_logic(interaction: discord.Interaction, backup_data:
                     reason="Restauração de backup"
                 )
                 logging.info(f"Canal de texto '{channel_data['name']}' criado.")
-            elif channel_data["type"] == "voice_channel": 
-                await guild.create_voice_channel(
+                channel_id_map[channel_data.get("id")] = new_channel.id
+            else:
+                new_channel = await guild.create_voice_channel(
                     name=channel_data["name"],
-                    position=channel_data["position"],
                     bitrate=channel_data.get("bitrate"),
                     user_limit=channel_data.get("user_limit"),
                     category=category,
@@ -316,13 +887,136 @@ async def _perform_restore_logic(interaction: discord.Interaction, backup_data:
                     reason="Restauração de backup"
                 )
                 logging.info(f"Canal de voz '{channel_data['name']}' criado.")
-            else:
-                logging.warning(f"Tipo de canal desconhecido ou não suportado para restauração: {channel_data['type']}")
-        except Exception as e:
-            logging.error(f"Não foi possível criar o canal '{channel_data['name']}' ({channel_data['type']}): {e}")
+                channel_id_map[channel_data.get("id")] = new_channel.id
+        return step
+
+    for entry in plan["channels"]:
+        if entry["action"] == "skip":
+            continue
+        deps = overwrite_role_deps(entry["data"]["overwrites"])
+        if entry["data"].get("category_id"):
+            deps.append(("category", entry["data"]["category_id"]))
+        planner.add(
+            ("channel", entry["data"].get("id")),
+            channel_step(entry),
+            deps=deps,
+            label=f"canal '{entry['data']['name']}'"
+        )
+
+    # Ajusta as posições de categorias e canais de uma vez, depois que todos foram criados
+    all_channels = [entry["data"] for entry in plan["channels"]]
+    async def channel_positions_step():
+        payload = _compute_channel_positions(guild, backup_data.get("categories", []), category_id_map, all_channels, channel_id_map)
+        if payload:
+            await interaction.client.http.bulk_channel_update(guild.id, payload, reason="Ajuste de posição pós-restauração")
+            logging.info(f"Posições de {len(payload)} canais/categorias ajustadas em uma única chamada.")
+    planner.add(
+        ("channel_positions",),
+        channel_positions_step,
+        deps=[key for key in planner.steps if key[0] in ("category", "channel")],
+        label="posições dos canais"
+    )
+
+    async def update_progress(done: int, total: int, eta):
+        await progress_message.edit(content=f"Restaurando a estrutura do servidor... {done}/{total} etapas concluídas. Tempo restante estimado: {_format_eta(eta)}")
 
-    await interaction.followup.send("Restauração da estrutura do servidor concluída! Por favor, verifique manualmente.", ephemeral=True)
-    logging.info(f"Estrutura do servidor '{guild.name}' (ID: {guild.id}) restaurada por {interaction.user.name}.")
+    with _timed(timings, "execução"):
+        failures = await planner.run(update_progress)
+
+    summary = f"Restauração da estrutura do servidor concluída! Por favor, verifique manualmente.\n\n{plan_summary}"
+    if failures:
+        summary += f"\n\n**{len(failures)} etapa(s) falharam:**\n" + "\n".join(failures[:15])
+    await progress_message.edit(content=summary[:2000])
+    logging.info(f"Estrutura do servidor '{guild.name}' (ID: {guild.id}) restaurada por {interaction.user.name}. Falhas: {len(failures)}. Tempos: {_format_timings(timings)}")
+
+
+# --- Arquivo de Mensagens (opcional) ---
+MESSAGE_ARCHIVE_CONCURRENCY = 3 # Canais exportados ao mesmo tempo
+MESSAGE_ARCHIVE_REQUESTS_PER_SECOND = 2 # Orçamento global de páginas de histórico por segundo (todas as exportações)
+MESSAGE_ARCHIVE_BATCH_SIZE = 500 # Mensagens por bloco gzip; o checkpoint é gravado após cada bloco
+MESSAGE_HISTORY_PAGE_SIZE = 100 # Mensagens por requisição de histórico da API
+
+class RateBudget:
+    """Orçamento de requisições compartilhado entre tarefas: no máximo `rate` aquisições por segundo."""
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            now = time.monotonic()
+            if self._next_slot > now:
+                await asyncio.sleep(self._next_slot - now)
+            self._next_slot = max(now, self._next_slot) + self.interval
+
+def _message_archive_paths(guild_id: int, channel_id: int):
+    directory = os.path.join(BACKUP_DIR, str(guild_id), "messages")
+    return os.path.join(directory, f"{channel_id}.jsonl.gz"), os.path.join(directory, f"{channel_id}.checkpoint.json")
+
+def _read_archive_checkpoint(checkpoint_path: str) -> dict:
+    try:
+        with open(checkpoint_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _append_archive_batch(archive_path: str, checkpoint_path: str, checkpoint: dict, lines: list) -> dict:
+    """
+    Acrescenta um bloco de mensagens como um membro gzip completo e só então grava o checkpoint.
+    O checkpoint guarda o tamanho do arquivo após o último bloco completo: se a exportação for interrompida
+    no meio de um bloco, o resto parcial é descartado na retomada.
+    """
+    os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+    with open(archive_path, 'ab') as raw:
+        raw.truncate(checkpoint.get("archive_size", 0)) # Descarta um bloco parcial de uma execução interrompida
+        raw.seek(0, os.SEEK_END)
+        with gzip.GzipFile(fileobj=raw, mode='wb') as f:
+            f.write("".join(lines).encode('utf-8'))
+        archive_size = raw.tell()
+
+    checkpoint = {**checkpoint, "archive_size": archive_size}
+    temp_path = f"{checkpoint_path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+    os.replace(temp_path, checkpoint_path) # Atômico: o checkpoint nunca fica parcialmente gravado
+    return checkpoint
+
+def _serialize_message(message: discord.Message) -> str:
+    return json.dumps({
+        "id": message.id,
+        "author_id": message.author.id,
+        "author": str(message.author),
+        "created_at": message.created_at.timestamp(),
+        "content": message.content,
+        "attachments": [attachment.url for attachment in message.attachments],
+        "reply_to": message.reference.message_id if message.reference else None
+    }, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+async def _archive_channel_messages(channel: discord.TextChannel, budget: RateBudget) -> int:
+    """
+    Exporta o histórico do canal para JSONL comprimido, em ordem cronológica, retomando do último checkpoint.
+    A memória usada é limitada a um bloco de MESSAGE_ARCHIVE_BATCH_SIZE mensagens. Retorna quantas mensagens
+    foram exportadas nesta execução.
+    """
+    archive_path, checkpoint_path = _message_archive_paths(channel.guild.id, channel.id)
+    checkpoint = _read_archive_checkpoint(checkpoint_path)
+    after = discord.Object(id=checkpoint["last_message_id"]) if checkpoint.get("last_message_id") else None
+
+    exported = 0
+    lines = []
+    await budget.acquire()
+    async for message in channel.history(limit=None, after=after, oldest_first=True):
+        lines.append(_serialize_message(message))
+        exported += 1
+        if exported % MESSAGE_HISTORY_PAGE_SIZE == 0:
+            await budget.acquire() # Consome o orçamento antes de a próxima página ser buscada
+        if len(lines) >= MESSAGE_ARCHIVE_BATCH_SIZE:
+            checkpoint = await asyncio.to_thread(_append_archive_batch, archive_path, checkpoint_path, {**checkpoint, "last_message_id": message.id}, lines)
+            lines = []
+    if lines:
+        checkpoint = await asyncio.to_thread(_append_archive_batch, archive_path, checkpoint_path, {**checkpoint, "last_message_id": message.id}, lines)
+    return exported
 
 
 # --- View para o Painel Principal de Backup/Restauração ---
@@ -346,8 +1040,8 @@ class BackupMainView(ui.View):
             description="Use os botões abaixo para gerenciar a estrutura do seu servidor.",
             color=discord.Color.blue()
         )
-        embed.add_field(name="Criar Backup", value="Salva a estrutura atual de cargos e canais em um arquivo JSON.", inline=False)
-        embed.add_field(name="Carregar Backup", value="Restaura a estrutura a partir de um arquivo JSON de backup que você anexar.", inline=False)
+        embed.add_field(name="Criar Backup", value="Salva a estrutura atual de cargos e canais em um arquivo de backup compactado.", inline=False)
+        embed.add_field(name="Carregar Backup", value="Restaura a estrutura a partir de um arquivo de backup (.jsonl.gz ou .json) que você anexar.", inline=False)
 
         if self.message:
             try:
@@ -396,24 +1090,23 @@ class BackupMainView(ui.View):
             return
 
         # Esta é a primeira resposta para esta interação de botão
-        await interaction.response.send_message("Por favor, anexe o arquivo JSON de backup que você deseja carregar. Eu irei processá-lo.", ephemeral=True)
+        await interaction.response.send_message("Por favor, anexe o arquivo de backup (.jsonl.gz ou .json) que você deseja carregar. Eu irei processá-lo.", ephemeral=True)
         
         # Define uma função de checagem para o wait_for
         def check(m: discord.Message):
             return m.author == interaction.user and \
                    m.channel == interaction.channel and \
                    m.attachments and \
-                   m.attachments[0].filename.endswith(".json")
+                   m.attachments[0].filename.endswith(BACKUP_FILE_EXTENSIONS)
 
         try:
-            # Espera por uma mensagem do usuário com um anexo JSON
+            # Espera por uma mensagem do usuário com um anexo de backup
             message = await self.bot.wait_for('message', check=check, timeout=120.0) # Espera por 120 segundos
             backup_file = message.attachments[0]
             
             await interaction.followup.send(f"Recebi o arquivo `{backup_file.filename}`. Iniciando restauração...", ephemeral=True)
 
-            backup_content = await backup_file.read()
-            backup_data = json.loads(backup_content.decode('utf-8'))
+            backup_data = await _load_backup_attachment(backup_file)
 
             await _perform_restore_logic(interaction, backup_data)
 
@@ -427,8 +1120,8 @@ class BackupMainView(ui.View):
             
         except asyncio.TimeoutError:
             await interaction.followup.send("Tempo esgotado. Nenhum arquivo de backup foi recebido.", ephemeral=True)
-        except json.JSONDecodeError:
-            await interaction.followup.send("O arquivo anexado não é um JSON válido. Por favor, tente novamente com um arquivo JSON correto.", ephemeral=True)
+        except (ValueError, OSError):
+            await interaction.followup.send("O arquivo anexado não é um backup válido. Por favor, tente novamente com um arquivo de backup correto.", ephemeral=True)
         except Exception as e:
             logging.error(f"Erro ao carregar backup pelo botão: {e}", exc_info=True)
             await interaction.followup.send(f"Ocorreu um erro ao carregar o backup: {e}", ephemeral=True)
@@ -438,11 +1131,149 @@ class BackupMainView(ui.View):
 
 # --- Cog Principal de Comandos de Backup ---
 class BackupCommands(commands.Cog):
+    backup_group = app_commands.Group(name="backup", description="Comandos para criar e gerenciar backups da estrutura do servidor.")
+
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.db = bot.db_connection # Armazena a instância do gerenciador de DB
+        self.schedules = {} # guild_id -> [interval_hours, last_backup_at]; espelho da tabela backup_schedules
+        self.archive_budget = RateBudget(MESSAGE_ARCHIVE_REQUESTS_PER_SECOND) # Compartilhado por todas as exportações de mensagens
+        self.archive_tasks = {} # guild_id -> tarefa de exportação de mensagens em andamento
         logging.info("Cog 'BackupCommands' inicializado.")
 
+    async def cog_load(self):
+        try:
+            rows = await self.db.fetch_all("SELECT guild_id, interval_hours, last_backup_at FROM backup_schedules")
+            self.schedules = {guild_id: [interval_hours, last_backup_at] for guild_id, interval_hours, last_backup_at in rows}
+            logging.info(f"{len(self.schedules)} agendamento(s) de backup carregado(s).")
+        except Exception as e:
+            logging.error(f"Erro ao carregar agendamentos de backup do DB: {e}", exc_info=True)
+        self.scheduled_backups.start()
+
+    def cog_unload(self):
+        self.scheduled_backups.cancel()
+        for task in self.archive_tasks.values():
+            task.cancel() # O checkpoint permite retomar a exportação depois
+
+    def _next_backup_due(self, guild_id: int) -> float:
+        interval_hours, last_backup_at = self.schedules[guild_id]
+        interval = interval_hours * 3600
+        if last_backup_at is None:
+            # Primeiro backup escalonado pelo ID do servidor, para que nem todos rodem ao mesmo tempo
+            return time.time() + (guild_id >> 22) % interval
+        return last_backup_at + interval
+
+    @tasks.loop(minutes=BACKUP_SCHEDULER_TICK_MINUTES)
+    async def scheduled_backups(self):
+        """Executa os backups agendados que venceram, no máximo BACKUP_SCHEDULER_MAX_PER_TICK por execução."""
+        now = time.time()
+        due = []
+        for guild_id, schedule in self.schedules.items():
+            if schedule[1] is None:
+                # Registra o horário-base escalonado para que o primeiro backup aconteça dentro de um intervalo
+                schedule[1] = self._next_backup_due(guild_id) - schedule[0] * 3600
+            if self._next_backup_due(guild_id) <= now and self.bot.get_guild(guild_id) is not None:
+                due.append(guild_id)
+        due.sort(key=self._next_backup_due) # Os mais atrasados primeiro; o restante fica para as próximas execuções
+
+        for guild_id in due[:BACKUP_SCHEDULER_MAX_PER_TICK]:
+            guild = self.bot.get_guild(guild_id)
+            timings = {}
+            try:
+                with _timed(timings, "coleta"):
+                    entries = _collect_entries(guild)
+                with _timed(timings, "gravação"):
+                    snapshot_id, changed_count = await asyncio.to_thread(_write_incremental_snapshot, guild_id, guild.name, entries)
+                with _timed(timings, "retenção"):
+                    removed = await asyncio.to_thread(_apply_retention, guild_id)
+                logging.info(f"Backup agendado {snapshot_id} do servidor {guild_id} gravado ({changed_count} entradas alteradas, {removed} snapshot(s) antigo(s) removido(s)). Tempos: {_format_timings(timings)}")
+            except Exception as e:
+                logging.error(f"Erro no backup agendado do servidor {guild_id}: {e}", exc_info=True)
+            finally:
+                # Mesmo em caso de erro, aguarda o próximo intervalo para não repetir a falha a cada execução
+                self.schedules[guild_id][1] = now
+                await self.db.execute_query("UPDATE backup_schedules SET last_backup_at = ? WHERE guild_id = ?", (now, guild_id))
+
+    @scheduled_backups.before_loop
+    async def before_scheduled_backups(self):
+        await self.bot.wait_until_ready()
+
+    async def snapshot_autocomplete(self, interaction: discord.Interaction, current: str):
+        snapshots = _list_snapshots(interaction.guild.id)
+        return [
+            app_commands.Choice(name=_snapshot_datetime(snapshot_id).strftime('%d/%m/%Y %H:%M:%S'), value=snapshot_id)
+            for snapshot_id in reversed(snapshots) if current in snapshot_id
+        ][:25]
+
+    @backup_group.command(name="schedule", description="Ativa ou desativa os backups automáticos da estrutura do servidor.")
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.describe(enabled="Ativar backups automáticos?", interval_hours="Intervalo entre os backups, em horas.")
+    @app_commands.choices(interval_hours=[app_commands.Choice(name=f"{hours}h", value=hours) for hours in BACKUP_INTERVAL_CHOICES])
+    async def backup_schedule(self, interaction: discord.Interaction, enabled: bool, interval_hours: app_commands.Choice[int] = None):
+        guild_id = interaction.guild.id
+        if not enabled:
+            await self.db.execute_query("DELETE FROM backup_schedules WHERE guild_id = ?", (guild_id,))
+            self.schedules.pop(guild_id, None)
+            await interaction.response.send_message("Backups automáticos desativados. Os snapshots já gravados foram mantidos.", ephemeral=True)
+            return
+
+        hours = interval_hours.value if interval_hours else 6
+        success = await self.db.execute_query(
+            "INSERT INTO backup_schedules (guild_id, interval_hours) VALUES (?, ?) ON CONFLICT(guild_id) DO UPDATE SET interval_hours = excluded.interval_hours",
+            (guild_id, hours)
+        )
+        if not success:
+            await interaction.response.send_message("Erro ao salvar o agendamento de backups.", ephemeral=True)
+            return
+        previous = self.schedules.get(guild_id)
+        self.schedules[guild_id] = [hours, previous[1] if previous else None]
+        retention = BACKUP_RETENTION
+        await interaction.response.send_message(
+            f"Backups automáticos ativados a cada **{hours}h**. Retenção: {retention['hourly']} por hora, "
+            f"{retention['daily']} por dia e {retention['weekly']} por semana.",
+            ephemeral=True
+        )
+
+    @backup_group.command(name="list", description="Lista os snapshots de backup salvos para este servidor.")
+    @app_commands.checks.has_permissions(administrator=True)
+    async def backup_list(self, interaction: discord.Interaction):
+        snapshots = _list_snapshots(interaction.guild.id)
+        if not snapshots:
+            await interaction.response.send_message("Nenhum snapshot de backup encontrado para este servidor.", ephemeral=True)
+            return
+
+        lines = []
+        for snapshot_id in reversed(snapshots[-25:]):
+            size_kb = os.path.getsize(_snapshot_path(interaction.guild.id, snapshot_id)) / 1024
+            taken_at = _snapshot_datetime(snapshot_id).strftime('%d/%m/%Y %H:%M:%S')
+            lines.append(f"`{snapshot_id}` - {taken_at} ({size_kb:.1f} KB)")
+
+        embed = discord.Embed(
+            title="Snapshots de Backup",
+            description="\n".join(lines),
+            color=discord.Color.blue()
+        )
+        schedule = self.schedules.get(interaction.guild.id)
+        footer = f"Backups automáticos a cada {schedule[0]}h" if schedule else "Backups automáticos desativados"
+        embed.set_footer(text=f"{len(snapshots)} snapshot(s) no total • {footer}")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @backup_group.command(name="restore", description="Restaura a estrutura do servidor a partir de um snapshot salvo (APENAS COM EXTREMA CAUTELA!).")
+    @app_commands.check(commands.is_owner().predicate) # Restrito ao proprietário, como o /restore
+    @app_commands.describe(snapshot="Snapshot a ser restaurado.", dry_run="Apenas mostrar o que seria alterado, sem aplicar nada.")
+    @app_commands.autocomplete(snapshot=snapshot_autocomplete)
+    async def backup_restore(self, interaction: discord.Interaction, snapshot: str, dry_run: bool = False):
+        if snapshot not in _list_snapshots(interaction.guild.id):
+            await interaction.response.send_message("Snapshot não encontrado. Use `/backup list` para ver os disponíveis.", ephemeral=True)
+            return
+        await interaction.response.defer(ephemeral=True)
+        try:
+            backup_data = await asyncio.to_thread(_reconstruct_snapshot, interaction.guild.id, snapshot)
+            await _perform_restore_logic(interaction, backup_data, dry_run=dry_run)
+        except Exception as e:
+            logging.error(f"Erro ao restaurar o snapshot {snapshot}: {e}", exc_info=True)
+            await interaction.followup.send(f"Ocorreu um erro ao restaurar o snapshot: {e}", ephemeral=True)
+
     @app_commands.command(name="backup_panel", description="Abre o painel de backup e restauração do servidor.")
     @app_commands.checks.has_permissions(administrator=True)
     async def backup_panel(self, interaction: discord.Interaction):
@@ -454,7 +1285,7 @@ class BackupCommands(commands.Cog):
             return
         await view._update_display(interaction)
 
-    @app_commands.command(name="backup", description="Cria um backup da estrutura de canais e cargos do servidor.")
+    @backup_group.command(name="create", description="Cria um backup da estrutura de canais e cargos do servidor.")
     @app_commands.checks.has_permissions(administrator=True)
     async def backup_command(self, interaction: discord.Interaction):
         try:
@@ -462,7 +1293,7 @@ class BackupCommands(commands.Cog):
         except discord.errors.NotFound:
             # Isso significa que a interação já foi respondida ou é inválida.
             # Não podemos fazer mais nada com esta interação específica.
-            logging.warning(f"Interaction for /backup command was already responded to or invalid for user {interaction.user.id}. Skipping further response.")
+            logging.warning(f"Interaction for /backup create command was already responded to or invalid for user {interaction.user.id}. Skipping further response.")
             return # Sai do manipulador de comando
 
         try:
@@ -473,16 +1304,16 @@ class BackupCommands(commands.Cog):
             os.remove(filename) 
             logging.info(f"Arquivo de backup local {filename} removido após envio.")
         except Exception as e:
-            logging.error(f"Erro ao criar backup pelo comando /backup: {e}", exc_info=True)
+            logging.error(f"Erro ao criar backup pelo comando /backup create: {e}", exc_info=True)
             # Garante que um follow-up seja sempre enviado, mesmo em caso de erro
             await interaction.followup.send(f"Ocorreu um erro ao criar o backup: {e}", ephemeral=True)
 
-    @app_commands.command(name="restore", description="Restaura a estrutura do servidor a partir de um arquivo JSON (APENAS COM EXTREMA CAUTELA!).")
+    @app_commands.command(name="restore", description="Restaura a estrutura do servidor a partir de um arquivo de backup (APENAS COM EXTREMA CAUTELA!).")
     @app_commands.check(commands.is_owner().predicate) # Mantém este comando restrito ao proprietário para segurança
-    @app_commands.describe(file="Anexe o arquivo JSON de backup aqui.")
-    async def restore_command(self, interaction: discord.Interaction, file: discord.Attachment):
-        if not file.filename.endswith(".json"):
-            await interaction.response.send_message("Por favor, anexe um arquivo JSON válido.", ephemeral=True)
+    @app_commands.describe(file="Anexe o arquivo de backup (.jsonl.gz ou .json) aqui.", dry_run="Apenas mostrar o que seria alterado, sem aplicar nada.")
+    async def restore_command(self, interaction: discord.Interaction, file: discord.Attachment, dry_run: bool = False):
+        if not file.filename.endswith(BACKUP_FILE_EXTENSIONS):
+            await interaction.response.send_message("Por favor, anexe um arquivo de backup válido (.jsonl.gz ou .json).", ephemeral=True)
             return
         
         try:
@@ -492,15 +1323,69 @@ class BackupCommands(commands.Cog):
             return
 
         try:
-            backup_content = await file.read()
-            backup_data = json.loads(backup_content.decode('utf-8'))
-            await _perform_restore_logic(interaction, backup_data)
-        except json.JSONDecodeError:
-            await interaction.followup.send("O arquivo JSON de backup é inválido.", ephemeral=True)
+            backup_data = await _load_backup_attachment(file)
+            await _perform_restore_logic(interaction, backup_data, dry_run=dry_run)
+        except (ValueError, OSError):
+            await interaction.followup.send("O arquivo de backup é inválido.", ephemeral=True)
         except Exception as e:
             logging.error(f"Erro geral ao carregar backup pelo comando /restore: {e}", exc_info=True)
             await interaction.followup.send(f"Ocorreu um erro ao carregar o backup: {e}", ephemeral=True)
 
+    async def _run_message_archive(self, guild: discord.Guild, channels: list, progress_message: discord.WebhookMessage):
+        semaphore = asyncio.Semaphore(MESSAGE_ARCHIVE_CONCURRENCY)
+        done = 0
+        total_messages = 0
+        failed = []
+
+        async def archive(channel):
+            nonlocal done, total_messages
+            async with semaphore:
+                try:
+                    total_messages += await _archive_channel_messages(channel, self.archive_budget)
+                except discord.Forbidden:
+                    failed.append(channel.mention)
+                except Exception as e:
+                    # Inclui erros de disco (OSError): a falha fica restrita ao canal e os demais seguem normalmente
+                    logging.error(f"Erro ao exportar mensagens do canal {channel.id}: {e}", exc_info=True)
+                    failed.append(channel.mention)
+            done += 1
+            try:
+                await progress_message.edit(content=f"Exportando mensagens... {done}/{len(channels)} canais concluídos ({total_messages} mensagens novas).")
+            except discord.HTTPException:
+                pass # O token da interação expira após 15 minutos; a exportação continua mesmo assim
+
+        try:
+            await asyncio.gather(*(archive(channel) for channel in channels))
+            summary = f"Exportação de mensagens concluída: {total_messages} mensagens novas em {len(channels)} canais."
+            if failed:
+                summary += f"\nNão foi possível exportar: {', '.join(failed[:20])}"
+            logging.info(f"Exportação de mensagens do servidor {guild.id} concluída: {total_messages} mensagens, {len(failed)} falhas.")
+            try:
+                await progress_message.edit(content=summary[:2000])
+            except discord.HTTPException:
+                pass
+        finally:
+            self.archive_tasks.pop(guild.id, None)
+
+    @backup_group.command(name="messages", description="Exporta o histórico de mensagens para o arquivo local (retoma de onde parou).")
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.describe(channel="Canal a ser exportado. Se omitido, exporta todos os canais de texto legíveis.")
+    async def backup_messages(self, interaction: discord.Interaction, channel: discord.TextChannel = None):
+        guild = interaction.guild
+        if guild.id in self.archive_tasks:
+            await interaction.response.send_message("Já existe uma exportação de mensagens em andamento neste servidor.", ephemeral=True)
+            return
+
+        candidates = [channel] if channel else guild.text_channels
+        channels = [c for c in candidates if c.permissions_for(guild.me).read_message_history and c.permissions_for(guild.me).view_channel]
+        if not channels:
+            await interaction.response.send_message("Não tenho permissão para ler o histórico de nenhum dos canais selecionados.", ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True)
+        progress_message = await interaction.followup.send(f"Exportação de mensagens iniciada para {len(channels)} canal(is). Canais já exportados continuam do último checkpoint.", ephemeral=True, wait=True)
+        self.archive_tasks[guild.id] = self.bot.loop.create_task(self._run_message_archive(guild, channels, progress_message))
+
 
 async def setup(bot: commands.Bot):
     """
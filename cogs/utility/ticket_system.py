@@ -1,21 +1,44 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import app_commands, ui
 import logging
 import os
 import datetime
 import asyncio
 import json
-# import aiofiles # This import would be preferred for async file operations
-# import asyncio # Keep asyncio for async functions
+import copy
+import gzip
+import heapq
+import html
+import re
+import time
 
 # JSON file paths
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'data')
 SETTINGS_DIR = os.path.join(DATA_DIR, 'ticket_settings')
-TICKETS_DIR = os.path.join(DATA_DIR, 'active_tickets')
+TICKETS_DIR = os.path.join(DATA_DIR, 'active_tickets') # Legacy ticket files, only read by the one-time migration
+TRANSCRIPT_DIR = "transcripts"
+TRANSCRIPT_FORMAT = "lyv2-transcript"
+TRANSCRIPT_VERSION = 1
+TRANSCRIPT_EXTENSION = ".jsonl.gz"
+TRANSCRIPT_HTML_EXTENSION = ".html" # Readable rendering of the compact archive, generated next to it
+LEGACY_TRANSCRIPT_EXTENSION = ".txt" # Plain-text transcripts written before the compact format; indexed once by _backfill_legacy_transcripts
+LEGACY_TRANSCRIPT_NAME = re.compile(r"^ticket-(.+)-(\d{8}-\d{6})\.txt$")
+LEGACY_TRANSCRIPT_HEADER = re.compile(r"^--- Transcrição do Ticket (.+) \((.*)\) ---$")
 
 logger = logging.getLogger(__name__)
 
+TRANSCRIPT_WRITE_BATCH = 100 # Messages buffered before each write to disk (about one page of history)
+TRANSCRIPT_WORKER_COUNT = 2 # Closed tickets whose transcript/channel deletion run at the same time
+TRANSCRIPT_DRAIN_TIMEOUT = 30 # Seconds the cog waits for queued closes when unloading
+TICKET_CLOSE_RETRY_SECONDS = 60 # Delay before a failed close (transcript or channel deletion) is queued again
+TICKET_CLOSE_MAX_ATTEMPTS = 5 # After this many failures the ticket stays 'closing' until the next startup
+TRANSCRIPT_SEARCH_LIMIT = 10 # Tickets listed by /ticket search
+TICKET_IDLE_CHOICES = [12, 24, 48, 72, 168] # Hours without messages before an idle ticket is closed (/ticket autoclose)
+TICKET_IDLE_DEFAULT_HOURS = 48
+TICKET_IDLE_WARNING_HOURS = 12 # Warning sent this long before the auto-close (at most half of the idle period)
+TICKET_ACTIVITY_FLUSH_SECONDS = 60 # Interval between saves of the tickets' last activity to the DB
+
 # Mapping common color names to discord.Color objects
 COLOR_MAP = {
     'default': discord.Color.default(),
@@ -46,50 +69,465 @@ COLOR_MAP = {
 
 # --- JSON File Handling Helpers ---
 
-async def _ensure_dirs_exist():
-    """Ensures the necessary directories for JSON files exist."""
-    os.makedirs(SETTINGS_DIR, exist_ok=True)
-    os.makedirs(TICKETS_DIR, exist_ok=True)
-    #logger.info("Ensured ticket data directories exist.") # Avoid excessive logging
+JSON_SAVE_COALESCE_SECONDS = 0.5 # Saves requested within this window are merged into a single write
+JSON_SAVE_RETRY_SECONDS = 5 # Delay before retrying a save whose write failed
+
+_settings_locks = {} # guild_id -> asyncio.Lock serializing read-modify-write of the guild's settings
+_settings_cache = {} # guild_id -> settings dict, loaded from disk once and kept in sync by _update_settings
+_file_locks = {} # filepath -> asyncio.Lock keeping writes to the same file in order
+_pending_saves = {} # filepath -> latest data waiting to be written
+_save_tasks = {} # filepath -> task that will write the pending data
 
 def _get_settings_filepath(guild_id: int):
     """Returns the filepath for a guild's ticket settings JSON."""
     return os.path.join(SETTINGS_DIR, f'{guild_id}.json')
 
-def _get_tickets_filepath(guild_id: int):
-    """Returns the filepath for a guild's active tickets JSON."""
-    return os.path.join(TICKETS_DIR, f'tickets_{guild_id}.json')
+def _get_settings_lock(guild_id: int) -> asyncio.Lock:
+    return _settings_locks.setdefault(guild_id, asyncio.Lock())
 
-async def _load_json_file(filepath: str, default_data):
-    """Loads data from a JSON file. Returns default_data if file not found or empty/invalid."""
-    await _ensure_dirs_exist() # Ensure directories exist before trying to read
-
-    # Simulating async file read with sync os.path.exists and open
+def _read_json(filepath: str, default_data):
     if not os.path.exists(filepath):
         return default_data
-    
+    with open(filepath, 'r', encoding='utf-8') as f:
+        content = f.read()
+    if not content or content.strip() == "":
+        return default_data
+    return json.loads(content)
+
+def _write_json_atomic(filepath: str, data):
+    """Writes to a temp file in the same directory and renames it over the target, so a crash never leaves a truncated file."""
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    temp_path = f"{filepath}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, filepath)
+
+async def _load_json_file(filepath: str, default_data):
+    """Loads data from a JSON file (or its pending, not yet written save). Returns default_data if file not found or empty/invalid."""
+    if filepath in _pending_saves:
+        return copy.deepcopy(_pending_saves[filepath])
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-            if not content or content.strip() == "":
-                return default_data
-            return json.loads(content)
-    except (FileNotFoundError, json.JSONDecodeError, Exception) as e:
+        return await asyncio.to_thread(_read_json, filepath, default_data)
+    except (json.JSONDecodeError, Exception) as e:
         logger.error(f"Error loading JSON file {filepath}: {e}", exc_info=True)
         return default_data
 
 async def _save_json_file(filepath: str, data):
-    """Saves data to a JSON file, overwriting existing content."""
-    await _ensure_dirs_exist() # Ensure directories exist before trying to write
-
-    # Simulating async file write with sync open
-    try:
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4)
-        return True
-    except Exception as e:
-        logger.error(f"Error saving JSON file {filepath}: {e}", exc_info=True)
+    """Saves data to a JSON file atomically, off the event loop."""
+    async with _file_locks.setdefault(filepath, asyncio.Lock()):
+        try:
+            await asyncio.to_thread(_write_json_atomic, filepath, data)
+            return True
+        except Exception as e:
+            logger.error(f"Error saving JSON file {filepath}: {e}", exc_info=True)
+            return False
+
+async def _flush_json_save(filepath: str, delay: float = JSON_SAVE_COALESCE_SECONDS):
+    await asyncio.sleep(delay)
+    _save_tasks.pop(filepath, None) # Saves requested from now on schedule a new write
+    data = _pending_saves.get(filepath)
+    if data is None:
+        return
+    if not await _save_json_file(filepath, data):
+        # Keep the pending data (it is still what _load_json_file returns) and try again later,
+        # unless a newer save already scheduled its own write
+        logger.warning(f"Save of {filepath} failed; retrying in {JSON_SAVE_RETRY_SECONDS}s.")
+        if filepath not in _save_tasks:
+            _save_tasks[filepath] = asyncio.get_running_loop().create_task(_flush_json_save(filepath, JSON_SAVE_RETRY_SECONDS))
+        return
+    # Pending data stays visible to _load_json_file until it is on disk, unless a newer save replaced it
+    if _pending_saves.get(filepath) is data:
+        del _pending_saves[filepath]
+
+def _schedule_json_save(filepath: str, data):
+    """
+    Queues a save and returns immediately. Every save requested for the same file within
+    JSON_SAVE_COALESCE_SECONDS results in a single write of the latest data.
+    """
+    _pending_saves[filepath] = copy.deepcopy(data)
+    if filepath not in _save_tasks:
+        _save_tasks[filepath] = asyncio.get_running_loop().create_task(_flush_json_save(filepath))
+
+async def _flush_all_json_saves():
+    """Writes every pending save immediately (used on cog unload)."""
+    for filepath in list(_pending_saves):
+        data = _pending_saves[filepath]
+        if not await _save_json_file(filepath, data):
+            logger.error(f"Pending changes to {filepath} could not be written on unload.")
+            continue
+        if _pending_saves.get(filepath) is data:
+            del _pending_saves[filepath]
+    # Scheduled tasks find nothing pending and return; one already writing finishes before we return
+    await asyncio.gather(*_save_tasks.values(), return_exceptions=True)
+
+async def _get_settings(guild_id: int) -> dict:
+    """Returns the cached settings of a guild, reading the file only on first use. Treat it as read-only; change it through _update_settings."""
+    settings = _settings_cache.get(guild_id)
+    if settings is None:
+        settings = await _load_json_file(_get_settings_filepath(guild_id), default_data={})
+        # A concurrent load or update may have filled the cache while the file was read
+        settings = _settings_cache.setdefault(guild_id, settings)
+    return settings
+
+async def _update_settings(guild_id: int, mutate) -> dict:
+    """Read-modify-write of a guild's ticket settings under the guild lock. `mutate(settings)` edits the dict in place; the save is coalesced."""
+    async with _get_settings_lock(guild_id):
+        settings = await _get_settings(guild_id)
+        mutate(settings)
+        _schedule_json_save(_get_settings_filepath(guild_id), settings)
+        return settings
+
+# --- Ticket Store (SQLite, tabela active_tickets) ---
+
+TICKET_COLUMNS = "ticket_id, guild_id, channel_id, user_id, created_at, status, closed_by_id, closed_at, legacy_ticket_id, last_activity_at, idle_warned_at"
+
+def _ticket_from_row(row) -> dict:
+    """Converts an active_tickets row into the ticket dict used by the views and commands."""
+    if row is None:
+        return None
+    return {
+        'id': row['ticket_id'],
+        'ticket_id': row['legacy_ticket_id'] or str(row['ticket_id']), # Display ID; migrated tickets keep their old ID
+        'guild_id': row['guild_id'],
+        'channel_id': row['channel_id'],
+        'user_id': row['user_id'],
+        'created_at': row['created_at'],
+        'status': row['status'],
+        'closed_by_id': row['closed_by_id'],
+        'closed_at': row['closed_at'],
+        'last_activity_at': row['last_activity_at'],
+        'idle_warned_at': row['idle_warned_at']
+    }
+
+async def _list_open_ticket_records(db) -> list:
+    rows = await db.fetch_all(f"SELECT {TICKET_COLUMNS} FROM active_tickets WHERE status = 'open'")
+    return [_ticket_from_row(row) for row in rows]
+
+async def _list_closing_ticket_records(db) -> list:
+    rows = await db.fetch_all(f"SELECT {TICKET_COLUMNS} FROM active_tickets WHERE status = 'closing'")
+    return [_ticket_from_row(row) for row in rows]
+
+async def _get_ticket_for_channel(db, channel_id: int):
+    row = await db.fetch_one(f"SELECT {TICKET_COLUMNS} FROM active_tickets WHERE channel_id = ?", (channel_id,))
+    return _ticket_from_row(row)
+
+async def _create_ticket_record(db, guild_id: int, channel_id: int, user_id: int):
+    """Inserts a new open ticket and returns it, or None on error."""
+    success = await db.execute_query(
+        "INSERT INTO active_tickets (guild_id, channel_id, user_id, created_at, status) VALUES (?, ?, ?, ?, 'open')",
+        (guild_id, channel_id, user_id, datetime.datetime.now().isoformat())
+    )
+    if not success:
+        return None
+    return await _get_ticket_for_channel(db, channel_id)
+
+async def _mark_ticket_closing(db, channel_id: int, closed_by_id: int) -> bool:
+    """Marks an open ticket as 'closing': its transcript and channel deletion are pending. The closer is stored so the close can resume after a restart."""
+    return await db.execute_query(
+        "UPDATE active_tickets SET status = 'closing', closed_by_id = ? WHERE channel_id = ? AND status = 'open'",
+        (closed_by_id, channel_id)
+    )
+
+async def _close_ticket_record(db, channel_id: int, closed_by_id: int) -> bool:
+    return await db.execute_query(
+        "UPDATE active_tickets SET status = 'closed', closed_by_id = ?, closed_at = ? WHERE channel_id = ? AND status IN ('open', 'closing')",
+        (closed_by_id, datetime.datetime.now().isoformat(), channel_id)
+    )
+
+async def _save_ticket_activity(db, activity: list) -> bool:
+    """Saves the last member activity of several tickets at once. `activity` is a list of (last_activity_at, channel_id)."""
+    return await db.execute_many("UPDATE active_tickets SET last_activity_at = ? WHERE channel_id = ?", activity)
+
+async def _set_ticket_idle_warning(db, channel_id: int, warned_at: float) -> bool:
+    return await db.execute_query("UPDATE active_tickets SET idle_warned_at = ? WHERE channel_id = ?", (warned_at, channel_id))
+
+async def _delete_ticket_record(db, channel_id: int) -> bool:
+    return await db.execute_query("DELETE FROM active_tickets WHERE channel_id = ?", (channel_id,))
+
+async def _list_ticket_records(db, guild_id: int) -> list:
+    rows = await db.fetch_all(f"SELECT {TICKET_COLUMNS} FROM active_tickets WHERE guild_id = ? ORDER BY ticket_id", (guild_id,))
+    return [_ticket_from_row(row) for row in rows]
+
+async def _migrate_json_tickets(db):
+    """
+    One-time migration of the legacy data/active_tickets/tickets_<guild>.json files into active_tickets.
+    Each migrated file is renamed to *.migrated, so the migration runs only once per file.
+    """
+    if not os.path.isdir(TICKETS_DIR):
+        return
+    for filename in os.listdir(TICKETS_DIR):
+        if not (filename.startswith('tickets_') and filename.endswith('.json')):
+            continue
+        filepath = os.path.join(TICKETS_DIR, filename)
+        data = await _load_json_file(filepath, default_data={'tickets': []})
+        rows = [
+            (
+                ticket.get('guild_id'), ticket.get('channel_id'), ticket.get('user_id'),
+                ticket.get('created_at') or datetime.datetime.now().isoformat(), ticket.get('status', 'open'),
+                ticket.get('closed_by_id'), ticket.get('closed_at'), str(ticket.get('ticket_id')) if ticket.get('ticket_id') else None
+            )
+            for ticket in data.get('tickets', [])
+            if ticket.get('guild_id') and ticket.get('channel_id') and ticket.get('user_id')
+        ]
+        # OR IGNORE: a ticket already in the table (same channel) is not duplicated if the migration is re-run
+        success = await db.execute_many(
+            "INSERT OR IGNORE INTO active_tickets (guild_id, channel_id, user_id, created_at, status, closed_by_id, closed_at, legacy_ticket_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        ) if rows else True
+        if success:
+            os.replace(filepath, f"{filepath}.migrated")
+            logger.info(f"{len(rows)} ticket(s) migrado(s) de {filename} para a tabela active_tickets.")
+        else:
+            logger.error(f"Falha ao migrar os tickets de {filename}; o arquivo foi mantido para uma nova tentativa.")
+
+# --- Transcript Archive (tabelas ticket_transcripts e ticket_transcripts_fts) ---
+
+def _compact_json(record) -> str:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+def _epoch_ms(moment: datetime.datetime) -> int:
+    return int(moment.timestamp() * 1000)
+
+class TranscriptEncoder:
+    """
+    Encodes messages in the compact transcript format (JSON Lines, gzip-compressed by the writer):
+    - line 1: header {"format", "version", "ticket_id", "guild_id", "channel", "user_id", "opened_at", "closed_at"} (epoch ms)
+    - {"author": {"id", "name", "avatar", "bot"}}: written once, right before the author's first message;
+      authors are numbered 0, 1, 2... in the order they appear
+    - [author_index, delta_ms, content] or [author_index, delta_ms, content, [[filename, url, size], ...]]:
+      one message, delta_ms counted from the previous message (the first one from opened_at)
+    """
+    def __init__(self, header: dict):
+        self.authors = {} # author id -> index in the author table
+        self.previous_ms = header['opened_at']
+        self.header_line = _compact_json({"format": TRANSCRIPT_FORMAT, "version": TRANSCRIPT_VERSION, **header})
+
+    def encode(self, msg: discord.Message) -> str:
+        lines = ""
+        if msg.author.id not in self.authors:
+            self.authors[msg.author.id] = len(self.authors)
+            lines += _compact_json({"author": {
+                "id": msg.author.id,
+                "name": msg.author.display_name,
+                "avatar": msg.author.display_avatar.url,
+                "bot": msg.author.bot
+            }})
+
+        created_ms = _epoch_ms(msg.created_at)
+        record = [self.authors[msg.author.id], created_ms - self.previous_ms, msg.clean_content]
+        self.previous_ms = created_ms
+        if msg.attachments:
+            record.append([[attachment.filename, attachment.url, attachment.size] for attachment in msg.attachments])
+        return lines + _compact_json(record)
+
+TRANSCRIPT_HTML_HEAD = """<!DOCTYPE html>
+<html lang="pt-BR">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{ font-family: sans-serif; background: #313338; color: #dbdee1; margin: 2em; }}
+.message {{ margin: 0 0 1em; }}
+.author {{ font-weight: bold; color: #f2f3f5; }}
+.bot {{ font-size: 0.75em; background: #5865f2; color: #fff; border-radius: 3px; padding: 0 4px; }}
+.time {{ font-size: 0.8em; color: #949ba4; margin-left: 0.5em; }}
+.content {{ white-space: pre-wrap; word-wrap: break-word; }}
+a {{ color: #00a8fc; }}
+table {{ border-collapse: collapse; }}
+td, th {{ border: 1px solid #4e5058; padding: 4px 8px; text-align: left; }}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+<p>Aberto em {opened_at} · Fechado em {closed_at}</p>
+<hr>
+"""
+
+def _format_epoch_ms(epoch_ms: int) -> str:
+    return datetime.datetime.fromtimestamp(epoch_ms / 1000).strftime("%d/%m/%Y %H:%M:%S")
+
+def _render_transcript_html(archive_path: str, html_path: str):
+    """
+    Renders a compact transcript as a readable HTML page, streaming it line by line (blocking; run it in a thread).
+    Timestamps are rebuilt from the deltas and the authors table is written at the end, once every author is known.
+    """
+    with gzip.open(archive_path, "rt", encoding="utf-8") as source, open(html_path, "w", encoding="utf-8") as out:
+        header = json.loads(source.readline())
+        if header.get("format") != TRANSCRIPT_FORMAT:
+            raise ValueError(f"{archive_path} não é uma transcrição no formato {TRANSCRIPT_FORMAT}.")
+        out.write(TRANSCRIPT_HTML_HEAD.format(
+            title=html.escape(f"Ticket {header['ticket_id']} ({header['channel']})"),
+            opened_at=_format_epoch_ms(header['opened_at']),
+            closed_at=_format_epoch_ms(header['closed_at'])
+        ))
+        authors = []
+        current_ms = header['opened_at']
+        for line in source:
+            record = json.loads(line)
+            if isinstance(record, dict):
+                authors.append(record['author'])
+                continue
+            author = authors[record[0]]
+            current_ms += record[1]
+            out.write('<div class="message">')
+            out.write(f'<span class="author">{html.escape(author["name"])}</span>')
+            if author.get("bot"):
+                out.write(' <span class="bot">BOT</span>')
+            out.write(f'<span class="time">{_format_epoch_ms(current_ms)}</span>')
+            if record[2]:
+                out.write(f'<div class="content">{html.escape(record[2])}</div>')
+            for filename, url, size in (record[3] if len(record) > 3 else []):
+                out.write(f'<div><a href="{html.escape(url)}">{html.escape(filename)}</a> ({size / 1024:.1f} KB)</div>')
+            out.write("</div>\n")
+
+        out.write("<hr>\n<h2>Participantes</h2>\n<table>\n<tr><th>Nome</th><th>ID</th><th>Bot</th></tr>\n")
+        for author in authors:
+            out.write(f'<tr><td>{html.escape(author["name"])}</td><td>{author["id"]}</td><td>{"Sim" if author.get("bot") else "Não"}</td></tr>\n')
+        out.write("</table>\n</body>\n</html>\n")
+
+def _transcript_html_path(archive_path: str) -> str:
+    return archive_path[:-len(TRANSCRIPT_EXTENSION)] + TRANSCRIPT_HTML_EXTENSION
+
+async def _create_transcript_record(db, guild_id: int, ticket: dict, channel_name: str, closed_at: str, file_path: str):
+    """Registers a transcript file and returns its transcript_id, or None on error."""
+    success = await db.execute_query(
+        "INSERT INTO ticket_transcripts (guild_id, ticket_id, user_id, channel_name, closed_at, file_path) VALUES (?, ?, ?, ?, ?, ?)",
+        (guild_id, ticket['ticket_id'], ticket['user_id'], channel_name, closed_at, file_path)
+    )
+    if not success:
+        return None
+    row = await db.fetch_one("SELECT transcript_id FROM ticket_transcripts WHERE file_path = ?", (file_path,))
+    return row['transcript_id'] if row else None
+
+async def _delete_transcript_record(db, transcript_id: int) -> bool:
+    """Removes a transcript that could not be completed, along with the text already indexed for it."""
+    if not await db.execute_query("DELETE FROM ticket_transcripts_fts WHERE transcript_id = ?", (transcript_id,)):
         return False
+    return await db.execute_query("DELETE FROM ticket_transcripts WHERE transcript_id = ?", (transcript_id,))
+
+async def _index_transcript_chunk(db, transcript_id: int, guild_id: int, ticket: dict, content: str) -> bool:
+    """Indexes one block of transcript text; a transcript is indexed as several blocks, so it never has to be held whole in memory."""
+    return await db.execute_query(
+        "INSERT INTO ticket_transcripts_fts (content, transcript_id, guild_id, ticket_id, user_id) VALUES (?, ?, ?, ?, ?)",
+        (content, transcript_id, guild_id, ticket['ticket_id'], ticket['user_id'])
+    )
+
+async def _get_latest_transcript_record(db, guild_id: int, ticket_id: str):
+    """Returns the most recent transcript of a ticket (by its display ID), or None."""
+    return await db.fetch_one(
+        "SELECT transcript_id, ticket_id, channel_name, closed_at, file_path FROM ticket_transcripts "
+        "WHERE guild_id = ? AND ticket_id = ? ORDER BY transcript_id DESC LIMIT 1",
+        (guild_id, ticket_id)
+    )
+
+def _read_legacy_transcript(filepath: str):
+    """Parses a plain-text transcript: returns (ticket_id, channel_name, closed_at, message lines), or None if it is not one."""
+    match = LEGACY_TRANSCRIPT_NAME.match(os.path.basename(filepath))
+    if match is None:
+        return None
+    ticket_id, channel_name = match.group(1), None
+    closed_at = datetime.datetime.strptime(match.group(2), "%Y%m%d-%H%M%S")
+    with open(filepath, "r", encoding="utf-8", errors="replace") as f:
+        lines = f.read().splitlines()
+    header = LEGACY_TRANSCRIPT_HEADER.match(lines[0]) if lines else None
+    if header:
+        ticket_id, channel_name = header.group(1), header.group(2)
+    # Messages are "[date] name: content"; the "[date] " prefix is dropped so the index matches the new transcripts
+    messages = [line.split("] ", 1)[1] if line.startswith("[") and "] " in line else line.strip() for line in lines[4:]]
+    return ticket_id, channel_name, closed_at.isoformat(), [line for line in messages if line]
+
+async def _backfill_legacy_transcripts(db):
+    """
+    One-time indexing of the plain-text transcripts (transcripts/*.txt) into ticket_transcripts and its FTS index,
+    so /ticket search also finds tickets closed before the compact format. Files already registered (file_path)
+    are skipped, so re-running it only picks up what is missing. The .txt files themselves are kept as the archive.
+    """
+    if not await asyncio.to_thread(os.path.isdir, TRANSCRIPT_DIR):
+        return
+    filenames = await asyncio.to_thread(os.listdir, TRANSCRIPT_DIR)
+    legacy_paths = [os.path.join(TRANSCRIPT_DIR, name) for name in filenames if name.endswith(LEGACY_TRANSCRIPT_EXTENSION)]
+    if not legacy_paths:
+        return
+    registered = {row['file_path'] for row in await db.fetch_all(
+        "SELECT file_path FROM ticket_transcripts WHERE file_path LIKE ?", (f"%{LEGACY_TRANSCRIPT_EXTENSION}",)
+    )}
+
+    indexed = unattributed = 0
+    for filepath in legacy_paths:
+        if filepath in registered:
+            continue
+        try:
+            parsed = await asyncio.to_thread(_read_legacy_transcript, filepath)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Transcrição antiga {filepath} não pôde ser lida: {e}")
+            continue
+        if parsed is None:
+            continue
+        ticket_id, channel_name, closed_at, messages = parsed
+        # The plain-text files do not record the guild or the opener; both come from the ticket row (display ID)
+        rows = await db.fetch_all(
+            "SELECT guild_id, user_id FROM active_tickets WHERE legacy_ticket_id = ? OR (legacy_ticket_id IS NULL AND CAST(ticket_id AS TEXT) = ?)",
+            (ticket_id, ticket_id)
+        )
+        if len(rows) != 1:
+            unattributed += 1
+            continue
+        ticket = {'ticket_id': ticket_id, 'user_id': rows[0]['user_id']}
+        guild_id = rows[0]['guild_id']
+
+        transcript_id = await _create_transcript_record(db, guild_id, ticket, channel_name, closed_at, filepath)
+        if transcript_id is None:
+            continue
+        chunks = [f"{channel_name or ''}\n" + "\n".join(messages[start:start + TRANSCRIPT_WRITE_BATCH]) for start in range(0, max(len(messages), 1), TRANSCRIPT_WRITE_BATCH)]
+        complete = False
+        try:
+            for chunk in chunks:
+                if not await _index_transcript_chunk(db, transcript_id, guild_id, ticket, chunk):
+                    break
+            else:
+                complete = True
+                indexed += 1
+        finally:
+            if not complete:
+                # Removed (also when the cog is unloaded mid-file) so the next run indexes the file again from scratch
+                await _delete_transcript_record(db, transcript_id)
+
+    if indexed:
+        logger.info(f"{indexed} transcrição(ões) antiga(s) (.txt) indexada(s) para /ticket search.")
+    if unattributed:
+        logger.warning(f"{unattributed} transcrição(ões) antiga(s) sem ticket correspondente no DB não foram indexadas.")
+
+def _fts_query(text: str) -> str:
+    """Quotes every word of a user query, so FTS5 operators and punctuation are searched literally (all words must match)."""
+    return " ".join(f'"{word}"' for word in (term.replace('"', '') for term in text.split()) if word)
+
+async def _search_transcripts(db, guild_id: int, text: str, user_id: int = None) -> list:
+    """Returns the best-ranked transcripts of the guild matching the query, one entry per transcript."""
+    query = _fts_query(text)
+    if not query:
+        return []
+    sql = (
+        "SELECT t.transcript_id, t.ticket_id, t.user_id, t.channel_name, t.closed_at, "
+        "snippet(ticket_transcripts_fts, 0, '**', '**', '…', 16) AS excerpt "
+        "FROM ticket_transcripts_fts JOIN ticket_transcripts t ON t.transcript_id = ticket_transcripts_fts.transcript_id "
+        "WHERE ticket_transcripts_fts MATCH ? AND ticket_transcripts_fts.guild_id = ?"
+    )
+    params = [query, guild_id]
+    if user_id is not None:
+        sql += " AND ticket_transcripts_fts.user_id = ?"
+        params.append(user_id)
+    # Several blocks of the same transcript may match; fetch extra rows and keep the best block of each
+    sql += " ORDER BY rank LIMIT ?"
+    params.append(TRANSCRIPT_SEARCH_LIMIT * 5)
+
+    results = {}
+    for row in await db.fetch_all(sql, tuple(params)):
+        if row['transcript_id'] not in results:
+            results[row['transcript_id']] = row
+    return list(results.values())[:TRANSCRIPT_SEARCH_LIMIT]
 
 # --- Funções Auxiliares para Embeds (Reutilizadas do Welcome/Leave) ---
 def _create_embed_from_data(embed_data: dict, member: discord.Member = None, guild: discord.Guild = None):
@@ -238,28 +676,26 @@ class TicketPanelConfigView(ui.View):
 
 
     async def _get_panel_embed_data(self):
-        settings_filepath = _get_settings_filepath(self.guild_id)
-        settings = await _load_json_file(settings_filepath, default_data={})
+        settings = await _get_settings(self.guild_id)
         # Panel embed data is stored directly as a dictionary under \'panel_embed\' key
-        return settings.get('panel_embed', {})
+        # Copy, so edits made by the view only reach the cache through _save_panel_embed_data
+        return copy.deepcopy(settings.get('panel_embed', {}))
 
     async def _save_panel_embed_data(self, embed_data: dict):
-        settings_filepath = _get_settings_filepath(self.guild_id)
-        settings = await _load_json_file(settings_filepath, default_data={})
-
         has_content = False
         for key, value in embed_data.items():
             if value is not None and value != "" and key not in ["fields"]:
                 has_content = True
                 break
-        
+
         # Store embed data directly as a dictionary or remove the key if no content
-        if has_content:
-            settings['panel_embed'] = embed_data
-        elif 'panel_embed' in settings:
-             del settings['panel_embed']
+        def mutate(settings: dict):
+            if has_content:
+                settings['panel_embed'] = embed_data
+            else:
+                settings.pop('panel_embed', None)
 
-        await _save_json_file(settings_filepath, settings)
+        await _update_settings(self.guild_id, mutate)
 
     @ui.button(label="Título do Embed", style=discord.ButtonStyle.green, row=0, custom_id="panel_embed_title")
     async def set_panel_embed_title(self, interaction: discord.Interaction, button: ui.Button):
@@ -497,28 +933,26 @@ class TicketInitialEmbedConfigView(ui.View):
                 self.message = await interaction.original_response()
 
     async def _get_initial_embed_data(self):
-        settings_filepath = _get_settings_filepath(self.guild_id)
-        settings = await _load_json_file(settings_filepath, default_data={})
+        settings = await _get_settings(self.guild_id)
         # Initial embed data is stored directly as a dictionary under \'initial_embed\' key
-        return settings.get('initial_embed', {})
+        # Copy, so edits made by the view only reach the cache through _save_initial_embed_data
+        return copy.deepcopy(settings.get('initial_embed', {}))
 
     async def _save_initial_embed_data(self, embed_data: dict):
-        settings_filepath = _get_settings_filepath(self.guild_id)
-        settings = await _load_json_file(settings_filepath, default_data={})
-
         has_content = False
         for key, value in embed_data.items():
             if value is not None and value != "" and key not in ["fields"]:
                 has_content = True
                 break
-        
+
         # Store embed data directly as a dictionary or remove the key if no content
-        if has_content:
-            settings['initial_embed'] = embed_data
-        elif 'initial_embed' in settings:
-            del settings['initial_embed']
+        def mutate(settings: dict):
+            if has_content:
+                settings['initial_embed'] = embed_data
+            else:
+                settings.pop('initial_embed', None)
 
-        await _save_json_file(settings_filepath, settings)
+        await _update_settings(self.guild_id, mutate)
 
     @ui.button(label="Título", style=discord.ButtonStyle.green, row=0, custom_id="initial_embed_title")
     async def set_initial_embed_title(self, interaction: discord.Interaction, button: ui.Button):
@@ -758,16 +1192,19 @@ class TicketPanelView(ui.View):
     @ui.button(label="Abrir Ticket", style=discord.ButtonStyle.primary, custom_id="open_ticket_button")
     async def open_ticket(self, interaction: discord.Interaction, button: ui.Button):
         try:
-            await asyncio.sleep(0.1)
             await interaction.response.defer(ephemeral=True)
         except discord.NotFound:
             logging.error(f"Unknown interaction ao deferir open_ticket para o usuário {interaction.user.id} na guild {interaction.guild_id}.")
             return
 
-        # Fetch existing ticket from JSON
-        tickets_filepath = _get_tickets_filepath(interaction.guild_id)
-        all_tickets = await _load_json_file(tickets_filepath, default_data={'tickets': []})
-        existing_ticket = next((ticket for ticket in all_tickets.get('tickets', []) if ticket['user_id'] == interaction.user.id and ticket['status'] == 'open'), None)
+        cog = self.bot.get_cog("TicketSystem")
+        if cog is None:
+            logging.error("Cog 'TicketSystem' não encontrado para abrir ticket.")
+            await interaction.followup.send("O sistema de tickets não está disponível no momento.", ephemeral=True)
+            return
+
+        # Existing open ticket, from the cog's in-memory index
+        existing_ticket = cog.get_open_ticket_for_user(interaction.guild_id, interaction.user.id)
 
         if existing_ticket:
             channel = self.bot.get_channel(existing_ticket['channel_id'])
@@ -775,14 +1212,11 @@ class TicketPanelView(ui.View):
                 await interaction.followup.send(f"Você já tem um ticket aberto em {channel.mention}.", ephemeral=True)
                 return
             else:
-                # Clean up obsolete ticket entry in JSON
-                all_tickets['tickets'] = [ticket for ticket in all_tickets.get('tickets', []) if ticket.get('channel_id') != existing_ticket['channel_id']]
-                await _save_json_file(tickets_filepath, all_tickets)
+                # Clean up obsolete ticket entry
+                await cog.discard_ticket(existing_ticket['channel_id'])
                 logging.warning(f"Registro de ticket obsoleto para o usuário {interaction.user.id} na guild {interaction.guild_id} removido.")
 
-        # Fetch settings from JSON
-        settings_filepath = _get_settings_filepath(interaction.guild_id)
-        settings = await _load_json_file(settings_filepath, default_data={})
+        settings = await _get_settings(interaction.guild_id)
 
         category_id = settings.get('category_id')
         support_role_id = settings.get('support_role_id')
@@ -813,24 +1247,13 @@ class TicketPanelView(ui.View):
         try:
             ticket_channel = await category.create_text_channel(f"ticket-{interaction.user.name}", overwrites=overwrites)
             
-            # Add new ticket to JSON
-            # Generate a simple ticket ID (timestamp + user ID last digits)
-            timestamp_id = int(datetime.datetime.now().timestamp())
-            user_id_suffix = str(interaction.user.id)[-4:]
-            ticket_id = f"{timestamp_id}-{user_id_suffix}"
-
-            new_ticket = {
-                'ticket_id': ticket_id,
-                'guild_id': interaction.guild_id,
-                'channel_id': ticket_channel.id,
-                'user_id': interaction.user.id,
-                'created_at': datetime.datetime.now().isoformat(),
-                'status': 'open',
-                'closed_by_id': None,
-                'closed_at': None
-            }
-            all_tickets.setdefault('tickets', []).append(new_ticket)
-            await _save_json_file(tickets_filepath, all_tickets)
+            # Add new ticket to the database and the index; the ticket ID is the row ID
+            new_ticket = await cog.create_ticket(interaction.guild_id, ticket_channel.id, interaction.user.id)
+            if new_ticket is None:
+                await ticket_channel.delete(reason="Falha ao registrar o ticket")
+                await interaction.followup.send("Ocorreu um erro ao registrar o ticket. Tente novamente.", ephemeral=True)
+                return
+            ticket_id = new_ticket['ticket_id']
             logging.info(f"New ticket created: {ticket_id} for user {interaction.user.id} in guild {interaction.guild_id}.")
 
             ticket_embed = None
@@ -852,15 +1275,12 @@ class TicketPanelView(ui.View):
 
             close_view = CloseTicketView()
             await ticket_channel.send(f"{interaction.user.mention}", embed=ticket_embed, view=close_view)
-            await asyncio.sleep(1) # Aumenta o atraso antes do followup
             await interaction.followup.send(f"Seu ticket foi criado em {ticket_channel.mention}!", ephemeral=True)
 
         except discord.Forbidden:
             await interaction.followup.send("Não tenho permissão para criar canais nesta categoria. Por favor, verifique minhas permissões e as permissões da categoria.", ephemeral=True)
         except Exception as e:
             logging.error(f"Erro ao criar ticket: {e}", exc_info=True)
-            # Aumenta o atraso antes do followup de erro também
-            await asyncio.sleep(1)
             await interaction.followup.send(f"Ocorreu um erro ao criar o ticket: {e}", ephemeral=True)
 
 # View para o botão de fechar ticket dentro do canal do ticket
@@ -871,7 +1291,6 @@ class CloseTicketView(ui.View):
     @ui.button(label="Fechar Ticket", style=discord.ButtonStyle.danger, custom_id="close_ticket_button")
     async def close_ticket(self, interaction: discord.Interaction, button: ui.Button):
         try:
-            await asyncio.sleep(0.1)
             await interaction.response.send_message("Tem certeza que deseja fechar este ticket? Isso o deletará permanentemente.", view=CloseTicketConfirmView(), ephemeral=True)
         except discord.NotFound:
             logging.error(f"Unknown interaction ao enviar confirmação de fechar ticket para o canal {interaction.channel_id}.")
@@ -886,74 +1305,44 @@ class CloseTicketConfirmView(ui.View):
     @ui.button(label="Confirmar Fechamento", style=discord.ButtonStyle.danger, custom_id="confirm_close_ticket")
     async def confirm_close(self, interaction: discord.Interaction, button: ui.Button):
         await interaction.response.defer(ephemeral=True)
-        await asyncio.sleep(1) # Aumenta o atraso após o deferimento antes do followup
 
         ticket_channel = interaction.channel
         guild_id = interaction.guild_id # Adiciona a definição de guild_id
         channel_id = ticket_channel.id
 
-        # Find the ticket in the JSON file by channel ID
-        tickets_filepath = _get_tickets_filepath(guild_id)
-        all_tickets = await _load_json_file(tickets_filepath, default_data={'tickets': []})
-        
-        ticket_info = next((ticket for ticket in all_tickets.get('tickets', []) if ticket.get('channel_id') == channel_id and ticket.get('status') == 'open'), None)
+        cog = interaction.client.get_cog("TicketSystem")
+        if cog is None:
+            logging.error("Cog 'TicketSystem' não encontrado para fechar ticket.")
+            await interaction.followup.send("O sistema de tickets não está disponível no momento.", ephemeral=True)
+            return
+
+        # Find the open ticket in the cog's in-memory index by channel ID
+        ticket_info = cog.get_ticket_for_channel(channel_id)
 
         if not ticket_info:
-            await interaction.followup.send("Este canal não é um ticket ativo ou já foi fechado.", ephemeral=True)
+            if channel_id in cog.closing_tickets:
+                await interaction.followup.send("Este ticket já está sendo fechado.", ephemeral=True)
+            else:
+                await interaction.followup.send("Este canal não é um ticket ativo ou já foi fechado.", ephemeral=True)
             return
 
         ticket_id = ticket_info['ticket_id']
-        user_id = ticket_info['user_id'] # Keep user_id for logging/transcript
 
-        # Fetch transcript channel ID from settings JSON
-        settings_filepath = _get_settings_filepath(guild_id)
-        settings = await _load_json_file(settings_filepath, default_data={})
-        transcript_channel_id = settings.get('transcript_channel_id')
+        # The channel is deleted later by a worker, so check the permission before closing the ticket
+        if not ticket_channel.permissions_for(interaction.guild.me).manage_channels:
+            logging.error(f"Não tenho permissão para deletar o canal do ticket {channel_id} na guild {guild_id}.")
+            await interaction.followup.send("Não tenho permissão para deletar este canal. Por favor, verifique minhas permissões.", ephemeral=True)
+            return
 
         try:
+            # Marks the ticket as 'closing' now; transcript and channel deletion run in the background
+            if not await cog.queue_ticket_close(ticket_channel, ticket_info, interaction.user.id):
+                await interaction.followup.send("Não foi possível fechar o ticket: erro ao atualizar o banco de dados.", ephemeral=True)
+                return
+            logging.info(f"Ticket {ticket_id} (Channel ID: {channel_id}) marcado como em fechamento no DB. Transcrição e exclusão do canal na fila.")
             await interaction.followup.send("Ticket fechado com sucesso! O canal será deletado em breve.", ephemeral=True)
-
-            if transcript_channel_id:
-                cog = interaction.client.get_cog("TicketSystem")
-                if cog:
-                    transcript_channel = interaction.guild.get_channel(transcript_channel_id)
-                    if isinstance(transcript_channel, discord.TextChannel):
-                         await cog._create_transcript(ticket_channel, transcript_channel, ticket_id)
-                    else:
-                         logging.warning(f"Canal de transcrição configurado para guild {guild_id} ({transcript_channel_id}) não é um canal de texto válido ou não encontrado.")
-                else:
-                    logging.error("Cog 'TicketSystem' não encontrado para criar transcrição.")
-
-            await ticket_channel.delete()
-            logging.info(f"Canal do ticket {channel_id} deletado com sucesso.")
-            
-            # Update ticket status in JSON
-            for ticket in all_tickets.get('tickets', []):
-                if ticket.get('ticket_id') == ticket_id:
-                    ticket['status'] = 'closed'
-                    ticket['closed_by_id'] = interaction.user.id
-                    ticket['closed_at'] = datetime.datetime.now().isoformat()
-                    break
-            await _save_json_file(tickets_filepath, all_tickets)
-            logging.info(f"Ticket {ticket_id} (Channel ID: {channel_id}) fechado e status atualizado no JSON.")
-
-        except discord.NotFound:
-            # If channel already deleted, just update JSON
-            for ticket in all_tickets.get('tickets', []):
-                if ticket.get('ticket_id') == ticket_id:
-                    ticket['status'] = 'closed'
-                    ticket['closed_by_id'] = interaction.user.id
-                    ticket['closed_at'] = datetime.datetime.now().isoformat()
-                    break
-            await _save_json_file(tickets_filepath, all_tickets)
-            logging.warning(f"Canal do ticket {channel_id} não encontrado (já deletado). Status do ticket {ticket_id} atualizado para 'closed' no JSON.")
-            await interaction.followup.send("Ticket já estava fechado ou canal inexistente. Status atualizado no registro.", ephemeral=True)
-        except discord.Forbidden:
-            logging.error(f"Não tenho permissão para deletar o canal do ticket {channel_id} na guild {guild_id}.")
-            await interaction.followup.send("Não tenho permissão para deletar este canal. Por favor, verifique minhas permissões.", ephemeral=True)
         except Exception as e:
             logging.error(f"Erro inesperado ao fechar o ticket {ticket_id} (Channel ID: {channel_id}): {e}", exc_info=True)
-            await asyncio.sleep(1) # Adiciona um atraso antes de enviar a mensagem de erro
             await interaction.followup.send(f"Ocorreu um erro inesperado ao fechar o ticket: {e}", ephemeral=True)
 
     @ui.button(label="Cancelar", style=discord.ButtonStyle.secondary, custom_id="cancel_close_ticket")
@@ -968,11 +1357,369 @@ class TicketSystem(commands.Cog):
 
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        self.db = bot.db_connection # Armazena a instância do gerenciador de DB
+        # Índices em memória dos tickets abertos; o DB só é consultado no cog_load e escrito nas mutações
+        self.open_tickets = {} # channel_id -> ticket
+        self.open_tickets_by_user = {} # (guild_id, user_id) -> ticket
+        # Fila de tickets fechados aguardando transcrição e exclusão do canal
+        self.close_queue = asyncio.Queue()
+        self.close_workers = []
+        self.close_retry_tasks = set() # Tarefas aguardando para recolocar na fila um fechamento que falhou
+        self.closing_tickets = {} # channel_id -> ticket com status 'closing' (transcrição e exclusão do canal pendentes)
+        self.resume_task = None
+        self.backfill_task = None # Indexação única das transcrições antigas (.txt)
+        # Fechamento automático de tickets inativos
+        self.last_activity = {} # channel_id -> horário (epoch) da última mensagem de um membro; atualizado pelo on_message
+        self.dirty_activity = set() # channel_id com last_activity ainda não salvo no DB (salvo a cada TICKET_ACTIVITY_FLUSH_SECONDS)
+        self.idle_warnings = {} # channel_id -> horário do aviso de inatividade
+        self.idle_heap = [] # Min-heap de (prazo, channel_id); entradas obsoletas são descartadas ao sair do heap
+        self.idle_deadlines = {} # channel_id -> prazo da próxima verificação; fonte da verdade para o heap
+        self._idle_wakeup = asyncio.Event()
+        self.idle_task = None
         # Registra a TicketPanelView para persistência global.
         # Ela não recebe guild_id aqui, pois isso é para o discord.py saber como reconstruir a View.
         self.bot.add_view(TicketPanelView(bot=self.bot))
         self.bot.add_view(CloseTicketView())
 
+    async def cog_load(self):
+        await _migrate_json_tickets(self.db)
+        self.backfill_task = self.bot.loop.create_task(_backfill_legacy_transcripts(self.db))
+        for ticket in await _list_open_ticket_records(self.db):
+            self._index_ticket(ticket)
+            # Estado de inatividade salvo no DB; nenhuma consulta ao histórico dos canais
+            self.last_activity[ticket['channel_id']] = self._initial_activity(ticket)
+            if ticket['idle_warned_at']:
+                self.idle_warnings[ticket['channel_id']] = ticket['idle_warned_at']
+        logger.info(f"{len(self.open_tickets)} ticket(s) aberto(s) carregado(s) no índice.")
+        self.closing_tickets = {ticket['channel_id']: ticket for ticket in await _list_closing_ticket_records(self.db)}
+        self.close_workers = [self.bot.loop.create_task(self._close_worker()) for _ in range(TRANSCRIPT_WORKER_COUNT)]
+        self.resume_task = self.bot.loop.create_task(self._resume_pending_closes())
+        self.idle_task = self.bot.loop.create_task(self._idle_scheduler())
+        self.activity_flush.start()
+
+    async def cog_unload(self):
+        if self.idle_task:
+            self.idle_task.cancel()
+        self.activity_flush.cancel()
+        await self._flush_activity()
+        if self.resume_task:
+            self.resume_task.cancel()
+        if self.backfill_task:
+            self.backfill_task.cancel()
+        # Give queued closes a chance to finish before stopping the workers
+        try:
+            await asyncio.wait_for(self.close_queue.join(), timeout=TRANSCRIPT_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"{self.close_queue.qsize()} fechamento(s) de ticket na fila não concluído(s) ao descarregar o cog.")
+        for worker in self.close_workers:
+            worker.cancel()
+        for task in self.close_retry_tasks:
+            task.cancel() # Ticket segue 'closing' e é retomado na próxima inicialização
+        await _flush_all_json_saves()
+
+    # --- Índice de tickets abertos ---
+
+    def _index_ticket(self, ticket: dict):
+        self.open_tickets[ticket['channel_id']] = ticket
+        self.open_tickets_by_user[(ticket['guild_id'], ticket['user_id'])] = ticket
+
+    def _unindex_ticket(self, channel_id: int):
+        self.last_activity.pop(channel_id, None)
+        self.dirty_activity.discard(channel_id)
+        self.idle_warnings.pop(channel_id, None)
+        self.idle_deadlines.pop(channel_id, None)
+        ticket = self.open_tickets.pop(channel_id, None)
+        if ticket is not None:
+            key = (ticket['guild_id'], ticket['user_id'])
+            if self.open_tickets_by_user.get(key) is ticket:
+                del self.open_tickets_by_user[key]
+        return ticket
+
+    def get_ticket_for_channel(self, channel_id: int):
+        """Returns the open ticket of a channel, or None."""
+        return self.open_tickets.get(channel_id)
+
+    def get_open_ticket_for_user(self, guild_id: int, user_id: int):
+        """Returns the user's open ticket in the guild, or None."""
+        return self.open_tickets_by_user.get((guild_id, user_id))
+
+    async def create_ticket(self, guild_id: int, channel_id: int, user_id: int):
+        """Registers a new open ticket in the DB and the index. Returns the ticket, or None on error."""
+        ticket = await _create_ticket_record(self.db, guild_id, channel_id, user_id)
+        if ticket is not None:
+            self._index_ticket(ticket)
+            self.last_activity[channel_id] = time.time()
+            self._schedule_idle_check(channel_id, time.time())
+        return ticket
+
+    async def close_ticket(self, channel_id: int, closed_by_id: int) -> bool:
+        """Records the ticket as closed. Called once its transcript and channel deletion are done."""
+        self._unindex_ticket(channel_id)
+        self.closing_tickets.pop(channel_id, None)
+        return await _close_ticket_record(self.db, channel_id, closed_by_id)
+
+    async def discard_ticket(self, channel_id: int) -> bool:
+        """Removes a ticket whose channel no longer exists."""
+        self._unindex_ticket(channel_id)
+        self.closing_tickets.pop(channel_id, None)
+        return await _delete_ticket_record(self.db, channel_id)
+
+    # --- Fechamento em segundo plano ---
+
+    async def queue_ticket_close(self, channel: discord.TextChannel, ticket: dict, closed_by_id: int) -> bool:
+        """
+        Marks the ticket as 'closing' and queues its transcript and channel deletion for the close workers;
+        the ticket is only recorded as closed once both are done. Returns False if the DB could not be updated.
+        """
+        if channel.id in self.closing_tickets:
+            return True # Already closing (e.g. the button and the idle check at the same time)
+        ticket = {**ticket, 'status': 'closing', 'closed_by_id': closed_by_id}
+        self.closing_tickets[channel.id] = ticket
+        if not await _mark_ticket_closing(self.db, channel.id, closed_by_id):
+            del self.closing_tickets[channel.id]
+            return False
+        self._unindex_ticket(channel.id)
+        await self._enqueue_close(channel, ticket)
+        return True
+
+    async def _enqueue_close(self, channel: discord.TextChannel, ticket: dict):
+        settings = await _get_settings(channel.guild.id)
+        transcript_channel = None
+        transcript_channel_id = settings.get('transcript_channel_id')
+        if transcript_channel_id:
+            transcript_channel = channel.guild.get_channel(transcript_channel_id)
+            if not isinstance(transcript_channel, discord.TextChannel):
+                logging.warning(f"Canal de transcrição configurado para guild {channel.guild.id} ({transcript_channel_id}) não é um canal de texto válido ou não encontrado.")
+                transcript_channel = None
+
+        self.close_queue.put_nowait({
+            'channel': channel, 'transcript_channel': transcript_channel, 'ticket': ticket,
+            'ticket_id': ticket['ticket_id'], 'closed_by_id': ticket['closed_by_id']
+        })
+
+    async def _resume_pending_closes(self):
+        """Re-queues the closes interrupted by a restart. Waits for the cache so the channels can be resolved."""
+        await self.bot.wait_until_ready()
+        for channel_id, ticket in list(self.closing_tickets.items()):
+            channel = self.bot.get_channel(channel_id)
+            if channel is None:
+                # Sem o canal não há histórico para transcrever; resta registrar o fechamento
+                logging.warning(f"Canal do ticket {ticket['ticket_id']} ({channel_id}) não existe mais; fechamento concluído sem transcrição.")
+                await self.close_ticket(channel_id, ticket['closed_by_id'])
+                continue
+            await self._enqueue_close(channel, ticket)
+        if self.closing_tickets:
+            logger.info(f"{len(self.closing_tickets)} fechamento(s) de ticket interrompido(s) retomado(s).")
+
+    async def _close_worker(self):
+        while True:
+            job = await self.close_queue.get()
+            try:
+                await self._process_close_job(job)
+            except Exception as e:
+                logging.error(f"Erro ao processar o fechamento do ticket {job['ticket_id']}: {e}", exc_info=True)
+            finally:
+                self.close_queue.task_done()
+
+    async def _process_close_job(self, job: dict):
+        channel = job['channel']
+        if self.bot.get_channel(channel.id) is None:
+            # Deletado enquanto o fechamento aguardava: não há mais histórico para transcrever
+            logging.warning(f"Canal do ticket {job['ticket_id']} ({channel.id}) não existe mais; fechamento concluído sem transcrição.")
+            await self.close_ticket(channel.id, job['closed_by_id'])
+            return
+
+        # Every closed ticket is archived and indexed; the upload only happens when a transcript channel is configured.
+        # Until both the archive and the deletion succeed the ticket stays 'closing' and the close is retried
+        transcript = await self._create_transcript(channel, job['ticket'], job['transcript_channel'])
+        if transcript is None:
+            logging.error(f"Transcrição do ticket {job['ticket_id']} falhou; o canal {channel.id} foi mantido.")
+            self._retry_close_job(job)
+            return
+
+        try:
+            await channel.delete(reason=f"Ticket {job['ticket_id']} fechado")
+            logging.info(f"Canal do ticket {channel.id} deletado com sucesso.")
+        except discord.NotFound:
+            logging.warning(f"Canal do ticket {channel.id} não encontrado (já deletado).")
+        except discord.HTTPException as e:
+            logging.error(f"Não foi possível deletar o canal do ticket {channel.id} na guild {channel.guild.id}: {e}")
+            # The retry archives the channel again (with any newer messages); drop this copy so /ticket search has no duplicates
+            await self._discard_transcript(*transcript)
+            self._retry_close_job(job)
+            return
+
+        if not await self.close_ticket(channel.id, job['closed_by_id']):
+            logging.error(f"Ticket {job['ticket_id']} processado, mas o status 'closed' não foi gravado no DB.")
+
+    def _retry_close_job(self, job: dict):
+        """Queues a failed close again after TICKET_CLOSE_RETRY_SECONDS, up to TICKET_CLOSE_MAX_ATTEMPTS times."""
+        attempts = job.get('attempts', 1)
+        if attempts >= TICKET_CLOSE_MAX_ATTEMPTS:
+            logging.error(f"Fechamento do ticket {job['ticket_id']} falhou {attempts} vezes; será retomado na próxima inicialização.")
+            return
+
+        async def retry():
+            await asyncio.sleep(TICKET_CLOSE_RETRY_SECONDS)
+            self.close_queue.put_nowait({**job, 'attempts': attempts + 1})
+
+        task = self.bot.loop.create_task(retry())
+        self.close_retry_tasks.add(task)
+        task.add_done_callback(self.close_retry_tasks.discard)
+        logging.info(f"Fechamento do ticket {job['ticket_id']} será tentado novamente em {TICKET_CLOSE_RETRY_SECONDS}s (tentativa {attempts + 1}/{TICKET_CLOSE_MAX_ATTEMPTS}).")
+
+    # --- Fechamento automático de tickets inativos ---
+
+    def _schedule_idle_check(self, channel_id: int, deadline: float):
+        """Agenda a próxima verificação de inatividade de um ticket."""
+        self.idle_deadlines[channel_id] = deadline
+        heapq.heappush(self.idle_heap, (deadline, channel_id))
+        # Compacta o heap se as entradas obsoletas dominarem
+        if len(self.idle_heap) > 2 * len(self.idle_deadlines) + 64:
+            self.idle_heap = [(until, cid) for cid, until in self.idle_deadlines.items()]
+            heapq.heapify(self.idle_heap)
+        if self.idle_heap[0] == (deadline, channel_id):
+            self._idle_wakeup.set() # Novo prazo mais próximo: acorda o agendador
+
+    def _initial_activity(self, ticket: dict) -> float:
+        """
+        Última atividade conhecida de um ticket na inicialização: a última mensagem de um membro salva no DB
+        (mensagens de bots não contam, assim como no on_message), ou a abertura do ticket.
+        """
+        if ticket['last_activity_at']:
+            return ticket['last_activity_at']
+        try:
+            return datetime.datetime.fromisoformat(ticket['created_at']).timestamp()
+        except (TypeError, ValueError):
+            return time.time()
+
+    async def _idle_scheduler(self):
+        """Dorme até o próximo prazo de inatividade e avisa/fecha os tickets vencidos, sem consultar o histórico dos canais."""
+        await self.bot.wait_until_ready()
+        now = time.time()
+        for channel_id in list(self.open_tickets):
+            self._schedule_idle_check(channel_id, now)
+
+        while True:
+            now = time.time()
+            due = self._pop_due_idle_checks(now)
+            for channel_id in due:
+                try:
+                    await self._check_idle_ticket(channel_id, now)
+                except Exception as e:
+                    logging.error(f"Erro ao verificar inatividade do ticket no canal {channel_id}: {e}", exc_info=True)
+            if due:
+                continue
+
+            timeout = self.idle_heap[0][0] - now if self.idle_heap else None
+            self._idle_wakeup.clear()
+            try:
+                await asyncio.wait_for(self._idle_wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _pop_due_idle_checks(self, now: float) -> list:
+        """Remove do heap as entradas obsoletas e as vencidas. Retorna os channel_id vencidos."""
+        due = []
+        while self.idle_heap:
+            deadline, channel_id = self.idle_heap[0]
+            if self.idle_deadlines.get(channel_id) != deadline:
+                heapq.heappop(self.idle_heap) # Obsoleta: ticket fechado ou prazo alterado
+                continue
+            if deadline > now:
+                break
+            heapq.heappop(self.idle_heap)
+            del self.idle_deadlines[channel_id]
+            due.append(channel_id)
+        return due
+
+    async def _check_idle_ticket(self, channel_id: int, now: float):
+        """
+        Recalcula o prazo de um ticket a partir da última atividade. Mensagens novas só adiam o prazo,
+        então o on_message apenas registra o horário e o ticket é reagendado aqui quando o prazo antigo vence.
+        """
+        ticket = self.open_tickets.get(channel_id)
+        if ticket is None:
+            return
+        settings = await _get_settings(ticket['guild_id'])
+        idle_hours = settings.get('idle_close_hours')
+        ticket = self.open_tickets.get(channel_id) # O ticket pode ter sido fechado durante a leitura das configurações
+        if not idle_hours or ticket is None:
+            return # Desativado: /ticket autoclose reagenda os tickets da guild
+
+        idle_seconds = idle_hours * 3600
+        warning_seconds = min(TICKET_IDLE_WARNING_HOURS * 3600, idle_seconds / 2)
+        last_activity = self.last_activity.get(channel_id, now)
+        warned_at = self.idle_warnings.get(channel_id)
+        if warned_at is not None and last_activity > warned_at:
+            del self.idle_warnings[channel_id] # Houve mensagem depois do aviso
+            warned_at = None
+
+        channel = self.bot.get_channel(channel_id)
+        if warned_at is None:
+            deadline = last_activity + idle_seconds - warning_seconds
+            if deadline > now:
+                self._schedule_idle_check(channel_id, deadline)
+                return
+            if channel is None:
+                await self._discard_missing_ticket(ticket)
+                return
+            self.idle_warnings[channel_id] = now
+            self._schedule_idle_check(channel_id, now + warning_seconds)
+            # Persisted so a restart does not send the warning again or extend the deadline
+            if not await _set_ticket_idle_warning(self.db, channel_id, now):
+                logging.error(f"Não foi possível salvar o aviso de inatividade do ticket {ticket['ticket_id']} ({channel_id}).")
+            try:
+                await channel.send(
+                    f"<@{ticket['user_id']}> Este ticket está inativo e será fechado automaticamente <t:{int(now + warning_seconds)}:R>. "
+                    "Envie uma mensagem para mantê-lo aberto."
+                )
+            except discord.HTTPException as e:
+                logging.warning(f"Não foi possível enviar o aviso de inatividade no ticket {ticket['ticket_id']} ({channel_id}): {e}")
+            return
+
+        deadline = max(last_activity + idle_seconds, warned_at + warning_seconds)
+        if deadline > now:
+            self._schedule_idle_check(channel_id, deadline)
+            return
+        if channel is None:
+            await self._discard_missing_ticket(ticket)
+            return
+        if not channel.permissions_for(channel.guild.me).manage_channels:
+            logging.error(f"Não tenho permissão para fechar automaticamente o ticket {ticket['ticket_id']} ({channel_id}) na guild {channel.guild.id}.")
+            return
+        if not await self.queue_ticket_close(channel, ticket, self.bot.user.id):
+            logging.error(f"Não foi possível fechar automaticamente o ticket {ticket['ticket_id']} ({channel_id}): erro ao atualizar o DB.")
+            return
+        logging.info(f"Ticket {ticket['ticket_id']} (Channel ID: {channel_id}) fechado automaticamente por inatividade ({idle_hours}h).")
+
+    async def _discard_missing_ticket(self, ticket: dict):
+        """Remove o ticket cujo canal foi deletado fora do bot, para que não fique aberto (e bloqueando o usuário) para sempre."""
+        logging.warning(f"Canal do ticket {ticket['ticket_id']} ({ticket['channel_id']}) não existe mais; removendo o ticket.")
+        await self.discard_ticket(ticket['channel_id'])
+
+    async def _flush_activity(self):
+        """Salva no DB, em lote, a última atividade dos tickets que receberam mensagens desde o último salvamento."""
+        channel_ids = [channel_id for channel_id in self.dirty_activity if channel_id in self.last_activity]
+        self.dirty_activity.clear()
+        if not channel_ids:
+            return
+        if not await _save_ticket_activity(self.db, [(self.last_activity[channel_id], channel_id) for channel_id in channel_ids]):
+            # Tenta novamente no próximo salvamento
+            self.dirty_activity.update(channel_ids)
+            logging.error(f"Falha ao salvar a última atividade de {len(channel_ids)} ticket(s).")
+
+    @tasks.loop(seconds=TICKET_ACTIVITY_FLUSH_SECONDS)
+    async def activity_flush(self):
+        await self._flush_activity()
+
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        # O(1): só registra o horário; o agendador recalcula o prazo quando o antigo vencer e o DB é atualizado em lote
+        if message.channel.id in self.open_tickets and not message.author.bot:
+            self.last_activity[message.channel.id] = time.time()
+            self.dirty_activity.add(message.channel.id)
+
     @commands.Cog.listener()
     async def on_ready(self):
         logging.info("Views persistentes de ticket garantidas.")
@@ -986,8 +1733,7 @@ class TicketSystem(commands.Cog):
             return
 
         guild_id = message.guild.id
-        settings_filepath = _get_settings_filepath(guild_id)
-        settings = await _load_json_file(settings_filepath, default_data={})
+        settings = await _get_settings(guild_id) # In memory after the guild's first lookup
 
         # Check if the deleted message is the configured ticket panel message
         panel_channel_id = settings.get('panel_channel_id')
@@ -996,45 +1742,114 @@ class TicketSystem(commands.Cog):
         if panel_channel_id is not None and panel_message_id is not None:
             if message.channel.id == panel_channel_id and message.id == panel_message_id:
                 # It's the ticket panel message, remove configuration
-                del settings['panel_channel_id']
-                del settings['panel_message_id']
-                await _save_json_file(settings_filepath, settings)
+                def mutate(settings: dict):
+                    settings.pop('panel_channel_id', None)
+                    settings.pop('panel_message_id', None)
+
+                await _update_settings(guild_id, mutate)
                 logger.info(f"Ticket panel message deleted in guild {guild_id}. Configuration removed from JSON.")
 
 
-    async def _create_transcript(self, channel: discord.TextChannel, transcript_channel: discord.TextChannel, ticket_id: str):
-        """Cria uma transcrição do canal do ticket e envia para o canal de transcrição."""
-        transcript_dir = "transcripts"
-        os.makedirs(transcript_dir, exist_ok=True)
+    async def _create_transcript(self, channel: discord.TextChannel, ticket: dict, transcript_channel: discord.TextChannel = None):
+        """
+        Cria a transcrição comprimida do canal do ticket, indexa o texto para /ticket search e envia para o canal de transcrição, se houver.
+        Retorna (transcript_id, arquivo), ou None se o arquivo não pôde ser gerado (o envio é opcional e não conta como falha).
+        """
+        await asyncio.to_thread(os.makedirs, TRANSCRIPT_DIR, exist_ok=True)
 
-        timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
-        filename = f"{transcript_dir}/ticket-{ticket_id}-{timestamp}.txt"
+        ticket_id = ticket['ticket_id']
+        closed_at = datetime.datetime.now()
+        filename = os.path.join(TRANSCRIPT_DIR, f"ticket-{ticket_id}-{closed_at.strftime('%Y%m%d-%H%M%S')}{TRANSCRIPT_EXTENSION}")
 
+        transcript_id = None
         try:
-            with open(filename, "w", encoding="utf-8") as f:
-                f.write(f"--- Transcrição do Ticket {ticket_id} ({channel.name}) ---\n")
-                # Fetch channel creation time if available, otherwise use current time as approximation
-                created_at_str = channel.created_at.strftime('%Y-%m-%d %H:%M:%S') if channel.created_at else 'N/A'
-                f.write(f"Aberto em: {created_at_str}\n")
-                f.write(f"Fechado em: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-
-                messages = [msg async for msg in channel.history(limit=None, oldest_first=True)]
-                for msg in messages:
-                    f.write(f"[{msg.created_at.strftime('%Y-%m-%d %H:%M:%S')}] {msg.author.display_name}: {msg.clean_content}\n")
-                    for attachment in msg.attachments:
-                        f.write(f"    Anexo: {attachment.url}\n")
-            
-            # transcript_channel is passed as an object now
-            await transcript_channel.send(
-                f"Transcrição do Ticket {ticket_id} ({channel.name})",
-                file=discord.File(filename)
-            )
-            logging.info(f"Transcrição do ticket {ticket_id} enviada para o canal {transcript_channel.name}.")
-            
+            transcript_id = await _create_transcript_record(self.db, channel.guild.id, ticket, channel.name, closed_at.isoformat(), filename)
+            if transcript_id is None:
+                logging.warning(f"Transcrição do ticket {ticket_id} não foi registrada no DB e não aparecerá em /ticket search.")
+
+            encoder = TranscriptEncoder({
+                "ticket_id": ticket_id,
+                "guild_id": channel.guild.id,
+                "channel": channel.name,
+                "user_id": ticket['user_id'],
+                "opened_at": _epoch_ms(channel.created_at or closed_at),
+                "closed_at": _epoch_ms(closed_at)
+            })
+
+            # History is streamed page by page into the gzip file (compressed in the worker thread);
+            # only one batch of messages is held in memory, and each batch is indexed as one block of plain text
+            f = await asyncio.to_thread(gzip.open, filename, "wt", encoding="utf-8")
+            try:
+                await asyncio.to_thread(f.write, encoder.header_line)
+                records = []
+                search_lines = [f"{channel.name}\n"]
+
+                async def write_batch():
+                    await asyncio.to_thread(f.write, "".join(records))
+                    if transcript_id is not None:
+                        await _index_transcript_chunk(self.db, transcript_id, channel.guild.id, ticket, "".join(search_lines))
+                    records.clear()
+                    search_lines.clear()
+
+                async for msg in channel.history(limit=None, oldest_first=True):
+                    records.append(encoder.encode(msg))
+                    search_lines.append(f"{msg.author.display_name}: {msg.clean_content}\n")
+                    if len(records) >= TRANSCRIPT_WRITE_BATCH:
+                        await write_batch()
+                if records:
+                    await write_batch()
+            finally:
+                await asyncio.to_thread(f.close)
         except Exception as e:
-            logging.error(f"Erro ao criar ou enviar transcrição para o ticket {ticket_id}: {e}", exc_info=True)
+            logging.error(f"Erro ao criar a transcrição do ticket {ticket_id}: {e}", exc_info=True)
+            # Remove the partial archive so a retry does not leave duplicates in /ticket search
+            await self._discard_transcript(transcript_id, filename)
+            return None
+
+        if transcript_channel is not None:
+            try:
+                # The compact archive is always sent; the readable HTML goes with it if both fit in one upload
+                paths = [filename]
+                html_path = await self._render_transcript(filename)
+                if html_path and os.path.getsize(filename) + os.path.getsize(html_path) <= channel.guild.filesize_limit:
+                    paths.append(html_path)
+                # discord.File streams the files from disk
+                await transcript_channel.send(
+                    f"Transcrição do Ticket {ticket_id} ({channel.name})",
+                    files=[discord.File(path) for path in paths]
+                )
+                logging.info(f"Transcrição do ticket {ticket_id} enviada para o canal {transcript_channel.name}.")
+            except Exception as e:
+                logging.error(f"Erro ao enviar a transcrição do ticket {ticket_id}: {e}", exc_info=True)
+        return transcript_id, filename
+
+    async def _discard_transcript(self, transcript_id, filename: str):
+        """Removes a transcript's record, indexed text, archive and HTML rendering."""
+        if transcript_id is not None and not await _delete_transcript_record(self.db, transcript_id):
+            logging.error(f"Transcrição {transcript_id} ({filename}) não pôde ser removida do DB.")
+        for path in (filename, _transcript_html_path(filename)):
+            try:
+                await asyncio.to_thread(os.remove, path)
+            except OSError:
+                pass
 
 
+    async def _render_transcript(self, archive_path: str):
+        """Returns the HTML rendering of a transcript archive, generating it on first use. None if it cannot be rendered."""
+        html_path = _transcript_html_path(archive_path)
+        if await asyncio.to_thread(os.path.exists, html_path):
+            return html_path
+        try:
+            await asyncio.to_thread(_render_transcript_html, archive_path, html_path)
+            return html_path
+        except Exception as e:
+            logging.error(f"Erro ao gerar a versão HTML da transcrição {archive_path}: {e}", exc_info=True)
+            try:
+                await asyncio.to_thread(os.remove, html_path)
+            except OSError:
+                pass
+            return None
+
     # --- Comandos de Barra para Configuração ---
 
     @app_commands.command(name="ticketconfig", description="Abre o painel de configuração do sistema de tickets.")
@@ -1049,9 +1864,7 @@ class TicketSystem(commands.Cog):
     async def set_ticket_channel(self, interaction: discord.Interaction, channel: discord.TextChannel):
         await interaction.response.defer(ephemeral=True)
 
-        # Fetch settings from JSON
-        settings_filepath = _get_settings_filepath(interaction.guild_id)
-        settings = await _load_json_file(settings_filepath, default_data={})
+        settings = await _get_settings(interaction.guild_id)
 
         panel_embed_data = settings.get('panel_embed')
 
@@ -1077,9 +1890,7 @@ class TicketSystem(commands.Cog):
             message = await channel.send(embed=panel_embed, view=TicketPanelView(bot=self.bot))
 
             # Save panel channel and message ID to JSON
-            settings['panel_channel_id'] = channel.id
-            settings['panel_message_id'] = message.id
-            await _save_json_file(settings_filepath, settings)
+            await _update_settings(interaction.guild_id, lambda settings: settings.update(panel_channel_id=channel.id, panel_message_id=message.id))
 
             await interaction.followup.send(f"Painel de tickets enviado e configurado para {channel.mention}!", ephemeral=True)
         except discord.Forbidden:
@@ -1095,10 +1906,7 @@ class TicketSystem(commands.Cog):
     async def set_ticket_category(self, interaction: discord.Interaction, category: discord.CategoryChannel):
         await interaction.response.defer(ephemeral=True)
         # Save category ID to JSON
-        settings_filepath = _get_settings_filepath(interaction.guild_id)
-        settings = await _load_json_file(settings_filepath, default_data={})
-        settings['category_id'] = category.id
-        await _save_json_file(settings_filepath, settings)
+        await _update_settings(interaction.guild_id, lambda settings: settings.update(category_id=category.id))
 
         await interaction.followup.send(f"Categoria de tickets definida para **{category.name}**.", ephemeral=True)
 
@@ -1108,10 +1916,7 @@ class TicketSystem(commands.Cog):
     async def set_ticket_role(self, interaction: discord.Interaction, role: discord.Role):
         await interaction.response.defer(ephemeral=True)
         # Save support role ID to JSON
-        settings_filepath = _get_settings_filepath(interaction.guild_id)
-        settings = await _load_json_file(settings_filepath, default_data={})
-        settings['support_role_id'] = role.id
-        await _save_json_file(settings_filepath, settings)
+        await _update_settings(interaction.guild_id, lambda settings: settings.update(support_role_id=role.id))
 
         await interaction.followup.send(f"Cargo de suporte para tickets definido para **{role.name}**.", ephemeral=True)
 
@@ -1121,10 +1926,7 @@ class TicketSystem(commands.Cog):
     async def set_ticket_transcripts_channel(self, interaction: discord.Interaction, channel: discord.TextChannel):
         await interaction.response.defer(ephemeral=True)
         # Save transcript channel ID to JSON
-        settings_filepath = _get_settings_filepath(interaction.guild_id)
-        settings = await _load_json_file(settings_filepath, default_data={})
-        settings['transcript_channel_id'] = channel.id
-        await _save_json_file(settings_filepath, settings)
+        await _update_settings(interaction.guild_id, lambda settings: settings.update(transcript_channel_id=channel.id))
 
         await interaction.followup.send(f"Canal de transcrições de tickets definido para **{channel.mention}**.", ephemeral=True)
 
@@ -1134,25 +1936,24 @@ class TicketSystem(commands.Cog):
         await interaction.response.defer(ephemeral=True, thinking=True)
 
         guild_id = interaction.guild_id
-        tickets_filepath = _get_tickets_filepath(guild_id)
-        all_tickets = await _load_json_file(tickets_filepath, default_data={'tickets': []})
-        tickets = all_tickets.get('tickets', [])
+        tickets = await _list_ticket_records(self.db, guild_id)
 
         if not tickets:
             await interaction.followup.send("Não há tickets registrados neste servidor.", ephemeral=True)
             return
 
         open_tickets_info = []
+        closing_tickets_info = []
         closed_tickets_info = []
 
         for ticket in tickets:
             ticket_id = ticket.get('ticket_id', 'N/A')
             user_id = ticket.get('user_id')
             channel_id = ticket.get('channel_id')
-            created_at_str = ticket.get('created_at', 'N/A')
+            created_at_str = ticket.get('created_at') or 'N/A'
             ticket_status = ticket.get('status', 'unknown')
             closed_by_id = ticket.get('closed_by_id')
-            closed_at_str = ticket.get('closed_at', 'N/A')
+            closed_at_str = ticket.get('closed_at') or 'N/A'
 
             user = self.bot.get_user(user_id) if user_id else f"ID: {user_id}"
             channel = self.bot.get_channel(channel_id) if channel_id else f"Canal ID: {channel_id} (deletado)"
@@ -1169,6 +1970,15 @@ class TicketSystem(commands.Cog):
                     f"**Canal:** {channel}\n"
                     f"**Aberto em:** {created_at_formatted}\n"
                 )
+            elif ticket_status == 'closing':
+                closing_by = self.bot.get_user(closed_by_id) if closed_by_id else f"ID: {closed_by_id}"
+                closing_tickets_info.append(
+                    f"**Ticket ID:** {ticket_id}\n"
+                    f"**Aberto por:** {user}\n"
+                    f"**Fechado por:** {closing_by}\n"
+                    f"**Canal:** {channel}\n"
+                    f"**Aberto em:** {created_at_formatted}\n"
+                )
             else: # status == 'closed'
                 closed_by = self.bot.get_user(closed_by_id) if closed_by_id else f"ID: {closed_by_id}"
                 try:
@@ -1198,6 +2008,13 @@ class TicketSystem(commands.Cog):
         else:
             embed.add_field(name="Tickets Abertos", value="Nenhum ticket aberto no momento.", inline=False)
 
+        if closing_tickets_info:
+            # Transcript or channel deletion still pending (failed closes are retried, and resumed on the next startup)
+            closing_tickets_value = "\n---\n".join(closing_tickets_info)
+            if len(closing_tickets_value) > 1024:
+                closing_tickets_value = closing_tickets_value[:1020] + "..."
+            embed.add_field(name="Tickets em Fechamento", value=closing_tickets_value, inline=False)
+
         if closed_tickets_info:
             current_closed_value = ""
             field_count = 0
@@ -1223,6 +2040,94 @@ class TicketSystem(commands.Cog):
 
         await interaction.followup.send(embed=embed, ephemeral=True)
 
+    @ticket_group.command(name="autoclose", description="Ativa ou desativa o fechamento automático de tickets inativos.")
+    @app_commands.describe(enabled="Fechar tickets inativos automaticamente?", idle_hours="Horas sem mensagens até o fechamento.")
+    @app_commands.choices(idle_hours=[app_commands.Choice(name=f"{hours}h", value=hours) for hours in TICKET_IDLE_CHOICES])
+    @app_commands.default_permissions(administrator=True)
+    async def ticket_autoclose(self, interaction: discord.Interaction, enabled: bool, idle_hours: app_commands.Choice[int] = None):
+        hours = (idle_hours.value if idle_hours else TICKET_IDLE_DEFAULT_HOURS) if enabled else None
+
+        def mutate(settings: dict):
+            if hours:
+                settings['idle_close_hours'] = hours
+            else:
+                settings.pop('idle_close_hours', None)
+
+        await _update_settings(interaction.guild_id, mutate)
+
+        # Reavalia agora os tickets abertos da guild com o novo prazo
+        now = time.time()
+        for channel_id, ticket in self.open_tickets.items():
+            if ticket['guild_id'] == interaction.guild_id:
+                self._schedule_idle_check(channel_id, now)
+
+        if not hours:
+            await interaction.response.send_message("Fechamento automático de tickets inativos desativado.", ephemeral=True)
+            return
+        warning_hours = min(TICKET_IDLE_WARNING_HOURS, hours / 2)
+        await interaction.response.send_message(
+            f"Tickets sem mensagens por **{hours}h** serão fechados automaticamente, com um aviso {warning_hours:g}h antes.",
+            ephemeral=True
+        )
+
+    @ticket_group.command(name="search", description="Pesquisa o texto das transcrições de tickets fechados.")
+    @app_commands.describe(query="Palavras a pesquisar (todas devem aparecer).", user="Mostrar apenas tickets abertos por este usuário.")
+    @app_commands.default_permissions(manage_channels=True)
+    async def ticket_search(self, interaction: discord.Interaction, query: str, user: discord.User = None):
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        results = await _search_transcripts(self.db, interaction.guild_id, query, user.id if user else None)
+        if not results:
+            await interaction.followup.send("Nenhuma transcrição encontrada para essa pesquisa.", ephemeral=True)
+            return
+
+        embed = discord.Embed(
+            title=f"Resultados da pesquisa: {query[:200]}",
+            color=discord.Color.purple()
+        )
+        for row in results:
+            try:
+                closed_at_formatted = datetime.datetime.fromisoformat(row['closed_at']).strftime("%d/%m/%Y %H:%M")
+            except ValueError:
+                closed_at_formatted = row['closed_at']
+            opener = self.bot.get_user(row['user_id']) or f"ID: {row['user_id']}"
+            embed.add_field(
+                name=f"Ticket {row['ticket_id']} ({row['channel_name']}) - {closed_at_formatted}",
+                value=f"**Aberto por:** {opener}\n{row['excerpt'][:900]}",
+                inline=False
+            )
+        embed.set_footer(text=f"{len(results)} ticket(s) encontrado(s), ordenados por relevância.")
+
+        await interaction.followup.send(embed=embed, ephemeral=True)
+
+    @ticket_group.command(name="transcript", description="Envia a transcrição legível (HTML) de um ticket fechado.")
+    @app_commands.describe(ticket_id="ID do ticket (como aparece em /ticket list ou /ticket search).")
+    @app_commands.default_permissions(manage_channels=True)
+    async def ticket_transcript(self, interaction: discord.Interaction, ticket_id: str):
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        record = await _get_latest_transcript_record(self.db, interaction.guild_id, ticket_id.strip())
+        if record is None or not await asyncio.to_thread(os.path.exists, record['file_path']):
+            await interaction.followup.send(f"Nenhuma transcrição encontrada para o ticket {ticket_id}.", ephemeral=True)
+            return
+
+        if record['file_path'].endswith(LEGACY_TRANSCRIPT_EXTENSION):
+            html_path = record['file_path'] # Transcrições antigas já são texto legível
+        else:
+            html_path = await self._render_transcript(record['file_path'])
+        if html_path is None:
+            await interaction.followup.send("Não foi possível gerar a versão legível desta transcrição.", ephemeral=True)
+            return
+        if os.path.getsize(html_path) > interaction.guild.filesize_limit:
+            await interaction.followup.send("A transcrição é grande demais para ser enviada pelo Discord.", ephemeral=True)
+            return
+
+        await interaction.followup.send(
+            f"Transcrição do Ticket {record['ticket_id']} ({record['channel_name']})",
+            file=discord.File(html_path),
+            ephemeral=True
+        )
+
 
 async def setup(bot):
     await bot.add_cog(TicketSystem(bot))
\ No newline at end of file
@@ -46,6 +46,20 @@ class DatabaseManager:
             logger.error(f"Erro ao executar query: {query} com params {params}. Erro: {e}", exc_info=True)
             return False
 
+    async def execute_many(self, query: str, params_list: list) -> bool:
+        """
+        Executes the same query for many parameter sets in a single transaction.
+        Returns True on success, False on error.
+        """
+        await self.connect() # Ensure connection is open
+        try:
+            await self.conn.executemany(query, params_list)
+            await self.conn.commit()
+            return True
+        except aiosqlite.Error as e:
+            logger.error(f"Erro ao executar query em lote: {query} com {len(params_list)} conjuntos de params. Erro: {e}", exc_info=True)
+            return False
+
     async def fetch_one(self, query: str, params: tuple = ()):
         """
         Fetches a single row from the database.
@@ -72,6 +86,18 @@ class DatabaseManager:
             logger.error(f"Erro ao buscar todas as linhas: {query} com params {params}. Erro: {e}", exc_info=True)
             return []
 
+async def ensure_columns(db_manager: DatabaseManager, table: str, columns: dict):
+    """
+    Adds the given columns ({name: declaration}) to an existing table if they are missing.
+    Used to migrate databases created before a column was introduced.
+    """
+    rows = await db_manager.fetch_all(f"PRAGMA table_info({table})")
+    existing = {row[1] for row in rows}
+    for name, declaration in columns.items():
+        if name not in existing:
+            await db_manager.execute_query(f"ALTER TABLE {table} ADD COLUMN {name} {declaration}")
+            logger.info(f"Coluna '{name}' adicionada à tabela '{table}'.")
+
 async def init_db() -> DatabaseManager:
     """
     Initializes the SQLite database connection, creates necessary tables,
@@ -123,7 +149,21 @@ async def init_db() -> DatabaseManager:
                 guild_id INTEGER NOT NULL,
                 reason TEXT,
                 locked_by_id INTEGER,
-                locked_until_timestamp TEXT
+                locked_until_timestamp TEXT,
+                previous_allow INTEGER,
+                previous_deny INTEGER,
+                scope TEXT DEFAULT 'channel'
+            )
+        """)
+        # Overwrite de @everyone antes do lockdown, como par allow/deny empacotado (NULL = lockdown antigo sem snapshot)
+        # scope: 'channel' (overwrite próprio), 'category' (overwrite da categoria) ou 'inherited' (canal ressincronizado com a categoria bloqueada; desbloqueado ressincronizando de novo)
+        await ensure_columns(db_manager, "locked_channels", {"previous_allow": "INTEGER", "previous_deny": "INTEGER", "scope": "TEXT DEFAULT 'channel'"})
+        await db_manager.execute_query("""
+            CREATE TABLE IF NOT EXISTS guild_lockdowns (
+                guild_id INTEGER PRIMARY KEY,
+                previous_permissions INTEGER NOT NULL,
+                reason TEXT,
+                locked_by_id INTEGER
             )
         """)
         await db_manager.execute_query("""
@@ -144,6 +184,24 @@ async def init_db() -> DatabaseManager:
                 message_id INTEGER
             )
         """)
+        await db_manager.execute_query("""
+            CREATE TABLE IF NOT EXISTS anti_raid_action_settings (
+                guild_id INTEGER PRIMARY KEY,
+                new_account_action TEXT DEFAULT 'kick',
+                quarantine_role_id INTEGER,
+                verification_channel_id INTEGER
+            )
+        """)
+        # raid_mode_action: aplica a ação de contas novas a toda entrada durante o modo raid (opt-in, desativado por padrão)
+        await ensure_columns(db_manager, "anti_raid_action_settings", {"raid_mode_action": "BOOLEAN DEFAULT FALSE"})
+        await db_manager.execute_query("""
+            CREATE TABLE IF NOT EXISTS anti_raid_state (
+                guild_id INTEGER PRIMARY KEY,
+                join_timestamps_json TEXT,
+                raid_mode_until REAL,
+                updated_at REAL
+            )
+        """)
         await db_manager.execute_query("""
             CREATE TABLE IF NOT EXISTS welcome_leave_settings (
                 guild_id INTEGER PRIMARY KEY,
@@ -184,7 +242,36 @@ async def init_db() -> DatabaseManager:
                 created_at TEXT NOT NULL,
                 status TEXT DEFAULT 'open',
                 closed_by_id INTEGER,
-                closed_at TEXT
+                closed_at TEXT,
+                legacy_ticket_id TEXT
+            )
+        """)
+        # status: 'open', 'closing' (transcrição e exclusão do canal pendentes; retomado na inicialização) ou 'closed'
+        # legacy_ticket_id: ID do ticket no antigo arquivo JSON (data/active_tickets), preservado na migração
+        # last_activity_at / idle_warned_at (epoch): estado do fechamento automático por inatividade, restaurado na inicialização
+        await ensure_columns(db_manager, "active_tickets", {"legacy_ticket_id": "TEXT", "last_activity_at": "REAL", "idle_warned_at": "REAL"})
+        # Busca do ticket aberto de um usuário; buscas por canal usam o índice da restrição UNIQUE de channel_id
+        await db_manager.execute_query("CREATE INDEX IF NOT EXISTS idx_active_tickets_guild_user_status ON active_tickets (guild_id, user_id, status)")
+        # Transcrições de tickets fechados (arquivo comprimido em transcripts/) e índice de busca FTS5 do texto, em blocos
+        await db_manager.execute_query("""
+            CREATE TABLE IF NOT EXISTS ticket_transcripts (
+                transcript_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                guild_id INTEGER NOT NULL,
+                ticket_id TEXT NOT NULL,
+                user_id INTEGER NOT NULL,
+                channel_name TEXT,
+                closed_at TEXT NOT NULL,
+                file_path TEXT UNIQUE NOT NULL
+            )
+        """)
+        await db_manager.execute_query("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS ticket_transcripts_fts USING fts5(
+                content,
+                transcript_id UNINDEXED,
+                guild_id UNINDEXED,
+                ticket_id UNINDEXED,
+                user_id UNINDEXED,
+                tokenize = 'unicode61 remove_diacritics 2'
             )
         """)
         await db_manager.execute_query("""
@@ -237,6 +324,14 @@ async def init_db() -> DatabaseManager:
                 anti_flood_config_json TEXT
             )
         """)
+        # Backups automáticos da estrutura do servidor
+        await db_manager.execute_query("""
+            CREATE TABLE IF NOT EXISTS backup_schedules (
+                guild_id INTEGER PRIMARY KEY,
+                interval_hours INTEGER NOT NULL DEFAULT 6,
+                last_backup_at REAL
+            )
+        """)
 
         logger.info("Tabelas verificadas/criadas com sucesso.")
         logger.info("Banco de dados inicializado com sucesso.")